@@ -0,0 +1,76 @@
+"""Compares the LIKE and FULLTEXT foreign key searches against a live database.
+
+Run from the repository root, with config.py pointing at the database:
+
+    python -m benchmarks.fk_search --table groups --columns name,description alpha beta "data set"
+
+For every query it prints the median time of each search, how many rows each returned and how
+many of the LIKE results the FULLTEXT search also found.
+"""
+from config import DB_PASSWORD, DB_USER, PRIMARY_KEYS
+from dbmod.fk import like_search
+from fk_fulltext import find_fulltext_index, fulltext_search
+from functions import get_db_connection
+import argparse
+import statistics
+import time
+
+
+def time_search(search, repeat):
+    """Runs a search `repeat` times and returns (median seconds, rows from the last run)."""
+    timings = []
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = search()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('queries', nargs='+', help="Search box queries to time.")
+    parser.add_argument('--table', required=True, help="Foreign table to search.")
+    parser.add_argument('--columns', required=True, help="Comma-separated search columns.")
+    parser.add_argument('--parser', default=None, help="FULLTEXT parser the index was built with, e.g. ngram.")
+    parser.add_argument('--limit', type=int, default=10, help="Rows per search, as in the search endpoint.")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per query and search mode.")
+    args = parser.parse_args()
+
+    search_columns = [col.strip() for col in args.columns.split(',') if col.strip()]
+    foreign_pk = PRIMARY_KEYS.get(args.table, 'id')
+    if isinstance(foreign_pk, list):
+        foreign_pk = foreign_pk[0]
+
+    connection = get_db_connection(DB_USER, DB_PASSWORD)
+    try:
+        if not find_fulltext_index(connection, args.table, search_columns):
+            print(f"No FULLTEXT index on {args.table} ({', '.join(search_columns)}). Run 'flask --app main fulltext-indexes --create' first.")
+            return
+
+        print(f"{'query':<24} {'like ms':>10} {'rows':>5} {'fulltext ms':>12} {'rows':>5} {'overlap':>8}")
+        for query in args.queries:
+            like_time, like_rows = time_search(
+                lambda: like_search(connection, args.table, search_columns, foreign_pk, query, args.limit), args.repeat
+            )
+            fulltext_time, fulltext_rows = time_search(
+                lambda: fulltext_search(connection, args.table, search_columns, foreign_pk, query, args.parser, args.limit),
+                args.repeat
+            )
+
+            if fulltext_rows is None:
+                print(f"{query:<24} {like_time * 1000:>10.2f} {len(like_rows):>5} {'(too short, falls back to LIKE)':>27}")
+                continue
+
+            fulltext_ids = {row[foreign_pk] for row in fulltext_rows}
+            overlap = sum(1 for row in like_rows if row[foreign_pk] in fulltext_ids)
+            print(
+                f"{query:<24} {like_time * 1000:>10.2f} {len(like_rows):>5} "
+                f"{fulltext_time * 1000:>12.2f} {len(fulltext_rows):>5} {overlap:>8}"
+            )
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
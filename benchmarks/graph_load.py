@@ -0,0 +1,103 @@
+"""Compares building the /graph graph row by row and in bulk on a synthetic edge table.
+
+Run from the repository root:
+
+    python -m benchmarks.graph_load --edges 1000000 --nodes 100000
+
+The table is generated in memory as the tuples a cursor would return, so no database is
+needed. The row-by-row loader gets each row as the dict a DictCursor makes and calls
+GraphSources.add_row, as build_graph used to; the bulk loader gets chunks of tuples and calls
+GraphSources.add_rows, as it does now. It prints the median build time of each, and from a
+separate run under tracemalloc, the memory the built graph holds and the peak while building.
+"""
+from config import GRAPH_LOAD_CHUNK_ROWS
+from graph import GraphSources
+import argparse
+import networkx as nx
+import random
+import statistics
+import time
+import tracemalloc
+
+COLUMNS = ['__key0', '__id1', '__id2', 'weight', 'name1', 'name2']
+
+GCONF = {
+    'weights': 'weight',
+    'attrs': {'type': 'synthetic'},
+    'node_id_generator_j1': lambda row: row['name1'],
+    'node_id_generator_j2': lambda row: row['name2'],
+}
+
+
+def synthetic_rows(edges, nodes, seed):
+    """Returns `edges` rows of random edges between `nodes` nodes, in COLUMNS order."""
+    rng = random.Random(seed)
+    rows = []
+    for key in range(edges):
+        id1, id2 = rng.randrange(nodes), rng.randrange(nodes)
+        rows.append((key, id1, id2, rng.randint(1, 10), f'node{id1}', f'node{id2}'))
+    return rows
+
+
+def load_row_by_row(rows):
+    G = nx.Graph()
+    sources = GraphSources({})
+    for row in rows:
+        sources.add_row(G, 0, GCONF, dict(zip(COLUMNS, row)), 1)
+    return G, sources
+
+
+def load_bulk(rows):
+    G = nx.Graph()
+    sources = GraphSources({})
+    nodes = {}
+    for start in range(0, len(rows), GRAPH_LOAD_CHUNK_ROWS):
+        sources.add_rows(G, 0, GCONF, COLUMNS, rows[start:start + GRAPH_LOAD_CHUNK_ROWS], nodes)
+    return G, sources
+
+
+def time_load(load, rows, repeat):
+    """Runs a loader `repeat` times and returns (median seconds, graph from the last run)."""
+    timings = []
+    G = None
+    for _ in range(repeat):
+        G = None  # let the previous graph go before timing the next build
+        start = time.perf_counter()
+        G, _ = load(rows)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), G
+
+
+def measure_memory(load, rows):
+    """Returns (bytes held by the built graph and its sources, peak bytes allocated while building)."""
+    tracemalloc.start()
+    try:
+        built = load(rows)
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del built
+    return held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--edges', type=int, default=1000000, help="Rows in the synthetic edge table.")
+    parser.add_argument('--nodes', type=int, default=100000, help="Distinct node ids the edges are drawn between.")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per loader.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed for the table.")
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.edges, args.nodes, args.seed)
+    print(f"{args.edges} rows, {args.nodes} node ids")
+    print(f"{'loader':<12} {'seconds':>8} {'nodes':>8} {'edges':>9} {'held MB':>8} {'peak MB':>8}")
+    for name, load in (('row by row', load_row_by_row), ('bulk', load_bulk)):
+        seconds, G = time_load(load, rows, args.repeat)
+        nodes, edges = G.number_of_nodes(), G.number_of_edges()
+        G = None
+        held, peak = measure_memory(load, rows)
+        print(f"{name:<12} {seconds:>8.2f} {nodes:>8} {edges:>9} {held / 2 ** 20:>8.1f} {peak / 2 ** 20:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+from collections import namedtuple
+
+# Kinds of change
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+# One committed write to a table.
+#   kind   - INSERT, UPDATE or DELETE
+#   table  - name of the table written to
+#   keys   - primary key values of the rows written, one list per row, in PRIMARY_KEYS order;
+#            None when they aren't known (e.g. ids generated by a multi-row insert)
+#   values - the column values written, one dict per row in the same order as keys, or None
+ChangeEvent = namedtuple('ChangeEvent', ['kind', 'table', 'keys', 'values'])
+
+_subscribers = []
+
+
+def subscribe(callback):
+    """Registers callback(event) to be called for every emitted event. Usable as a decorator.
+
+    Callbacks run synchronously in the request that made the write, so they should only
+    record the event and leave the actual work for later.
+    """
+    _subscribers.append(callback)
+    return callback
+
+
+def emit(kind, table, keys=None, values=None):
+    """Publishes a change to every subscriber. Call only after the write has been committed."""
+    event = ChangeEvent(kind, table, keys, values)
+    for callback in list(_subscribers):
+        try:
+            callback(event)
+        except Exception as e:
+            # A broken subscriber must not turn a successful write into an error page
+            print(f"Error handling change event for {table}: {e}")
+    return event
@@ -6,6 +6,21 @@ DB_PASSWORD = 'your_password' # You can set a default password if you want
 DB_NAME = 'db_name_here'
 DB_PORT = 3306
 
+# --- CONNECTION POOL ---
+# Connections are pooled per set of login credentials.
+POOL_MAX_SIZE = 10 # Maximum open connections per user
+POOL_IDLE_TIMEOUT = 300 # Seconds an unused connection is kept before it is closed
+POOL_ACQUIRE_TIMEOUT = 10 # Seconds to wait for a free connection before giving up
+
+# --- SCHEMA CACHE ---
+# Table schemas are cached for the whole process. Once an entry is older than this many
+# seconds it is revalidated against a checksum of INFORMATION_SCHEMA, so DDL changes are
+# picked up automatically. DDL this app runs itself (FULLTEXT and contributor table creation)
+# calls functions.invalidate_table_schema() to reload at once, but only in the process that
+# ran it: the flask commands run in their own process, so a running server sees their changes,
+# like any other DDL, within this many seconds.
+SCHEMA_CACHE_TTL = 60
+
 # --- DYNAMIC TABLE CONFIGURATION ---
 # IMPORTANT: Specify which tables you want to show and their primary keys here.
 TABLES_TO_SHOW = ['users', 'groups', 'databank'] # Add your table names here
@@ -17,6 +32,26 @@ PRIMARY_KEYS = {
 
 DEFAULT_TABLE = TABLES_TO_SHOW[0] if TABLES_TO_SHOW else None
 
+# Rows are paged through in primary key order. The table view loads PAGE_SIZE_DEFAULT rows
+# at a time; clients may ask for more per page, up to PAGE_SIZE_MAX.
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+
+# Number of rows pulled from the server-side cursor per chunk when exporting a table
+EXPORT_CHUNK_ROWS = 1000
+
+# Number of rows inserted and committed together when bulk importing a CSV or JSON file
+IMPORT_BATCH_SIZE = 1000
+
+# Number of options listed per page in the searchable junction pickers of the expanded view
+JUNCTION_OPTIONS_PAGE_SIZE = 20
+
+# The expanded view queries the related rows of its relationships concurrently, on up to this
+# many connections: the one the request holds plus as many more from the user's pool as are
+# free at that moment, so busy pools fall back to fewer. Set to 1 to run them one after another
+# on a single connection.
+JUNCTION_QUERY_WORKERS = 4
+
 # Configuration for column widths
 # Only 'description' has a fixed width. All other columns will be flexible.
 COLUMN_WIDTHS = {
@@ -31,7 +66,9 @@ MANY_TO_MANY_CONFIG = {
         'fk_self': 'uid',
         'fk_other': 'gid',
         'other_table': 'groups',
-        'other_display_column': 'name'
+        'other_display_column': 'name',
+        # Optional: columns of other_table the expanded view's picker searches (default: other_display_column)
+        # 'search_columns': ['name', 'description']
     },
     # Add more relationships here as needed
     # 'users': {
@@ -45,7 +82,12 @@ MANY_TO_MANY_CONFIG = {
 
 WRITE_ONLY_CONFIG = {
     'databank': {
-        'contributor_column': 'contributor_usernames'
+        'contributor_column': 'contributor_usernames',
+        # Optional: keep contributors in a normalized, indexed side table so rows can be filtered
+        # by user without a LIKE '%user%' scan. After setting it, create and fill the table with
+        #   flask --app main backfill-contributors
+        # before restarting the app.
+        # 'contributor_table': 'databank_contributors'
     },
 }
 
@@ -67,13 +109,22 @@ VISIBLE_COLUMNS = {
     'users': ['id', 'username', 'email', 'gender'],
 }
 
+# 'search_mode' picks how the search box for a foreign key finds matches:
+#   'like'  - (default) a LIKE '%q%' query over the search columns on every keystroke
+#   'index' - an in-memory trigram index, built on first use and kept up to date by writes
+#             made through this process (see FK_SEARCH_INDEX_MAX_AGE). Tables over
+#             FK_SEARCH_INDEX_MAX_ROWS fall back to 'like'.
+#   'fulltext' - MATCH ... AGAINST on a FULLTEXT index over exactly the search columns, best
+#             matches first. Set 'fulltext_parser': 'ngram' for CJK text or substring-style
+#             matching. List or create the indexes with 'flask --app main fulltext-indexes [--create]'.
 FOREIGN_KEY_CONFIG = {
     'users': {
         'group_id': {
             'foreign_table': 'groups',
             'foreign_key': 'id',
             'search_columns': ['name', 'description'],
-            'display_columns': ['name', 'description', 'creation_date']
+            'display_columns': ['name', 'description', 'creation_date'],
+            'search_mode': 'index'
         }
     },
     'databank': {
@@ -84,4 +135,111 @@ FOREIGN_KEY_CONFIG = {
             'display_columns': ['username', 'email', 'gender']
         }
     }
-}
\ No newline at end of file
+}
+
+# Bounds for the in-memory foreign key search indexes ('search_mode': 'index')
+FK_SEARCH_INDEX_MAX_ROWS = 200000 # Per index; larger tables are searched with SQL instead
+FK_SEARCH_INDEX_MAX_INDEXES = 8 # Least recently used indexes are dropped beyond this
+# Indexes are per process and kept up to date by the writes made through that process only. With
+# several worker processes (e.g. gunicorn -w 4), or writes from outside the app, an index is
+# rebuilt on its first use after this many seconds, which bounds how stale its results get.
+# 0 never rebuilds, for a single process that makes every write.
+FK_SEARCH_INDEX_MAX_AGE = 60
+
+# Shortest word the FULLTEXT indexes hold ('search_mode': 'fulltext'). Match your server's
+# innodb_ft_min_token_size, or ngram_token_size for the ngram parser. Shorter queries use LIKE.
+FK_FULLTEXT_MIN_TOKEN_SIZE = 3
+
+# Number of built graphs kept for /graph, one per user and set of SQL filters (min, superignore,
+# only_one, only_both, ignore_ttype). Least recently used graphs are dropped beyond this. Writes
+# made through this app to a table a graph reads from are applied to it by the next /graph
+# request, as a new version that shares the unchanged nodes and edges with the old one; arrays
+# and layers cached for the old version are patched or reused rather than rebuilt.
+GRAPH_CACHE_MAX_ENTRIES = 16
+# Writes made by other worker processes, or outside this app, never reach a cached graph, so a
+# graph is rebuilt on its first use after this many seconds, which bounds how stale it gets.
+# 0 never rebuilds, for a single process that makes every write.
+GRAPH_CACHE_MAX_AGE = 60
+
+# How /graph answers src/dist, ring and src/target queries on the cached graph:
+#   'networkx' - (default) on a networkx copy of the whole graph
+#   'csr'      - on NumPy arrays (compressed sparse rows) built once per graph version, copying
+#                only the nodes and edges of the result. Same output, less time and memory on
+#                large graphs. Needs numpy, which the networkx backend doesn't.
+GRAPH_BACKEND = 'networkx'
+
+# Limits for /graph path queries (src and target). Enumeration stops after GRAPH_MAX_PATHS paths
+# or GRAPH_PATHS_TIME_BUDGET seconds, and the page is marked as truncated. Requests may lower
+# both with max_paths= and time_budget=. Pass k= to get the k shortest simple paths (by weight
+# with no_ignore_weights, otherwise by hop count) instead of every path up to cutoff.
+GRAPH_MAX_PATHS = 10000
+GRAPH_PATHS_TIME_BUDGET = 10
+
+# Number of distance maps kept for /graph ring queries and /graph/layers, one per graph version,
+# source node and weighting. Each holds every node reachable from its source.
+GRAPH_LAYER_CACHE_MAX_ENTRIES = 64
+
+# When True, /graph embeds the graph in the page as before. Otherwise the page loads it from
+# /graph/data, a compact, compressed (gzip, or brotli if installed) JSON format with an ETag.
+GRAPH_INLINE_DATA = False
+
+# Graphs with at least this many nodes are laid out on the server for the force-directed layouts
+# (cose, fcose) and shown with fixed positions, instead of running the layout in the browser.
+# layout=server asks for a server-side layout whatever the size. Needs numpy; without it graphs
+# are always laid out in the browser.
+GRAPH_SERVER_LAYOUT_MIN_NODES = 1000
+# Iterations of the server-side force-directed layout, and of the shorter run that refines the
+# previous positions after the graph changed
+GRAPH_LAYOUT_ITERATIONS = 50
+GRAPH_LAYOUT_WARM_ITERATIONS = 15
+# Above this many nodes, node repulsion in the layout is approximated on a grid instead of
+# computed between every pair of nodes
+GRAPH_LAYOUT_EXACT_MAX_NODES = 1000
+# Number of (user, /graph args) layouts kept to be reused or warm started from
+GRAPH_LAYOUT_CACHE_MAX_ENTRIES = 32
+
+# With src and dist, /graph loads only the edges within dist hops of src, expanding one hop at a
+# time in SQL, unless the whole graph is cached already. This needs a 'node_id_parser' in every
+# GRAPH_CONFIGS entry, the inverse of its node_id_generator lambdas: it takes a node name and
+# returns the id in that config's foreign table, or None for names that aren't from it, e.g.
+#   'node_id_parser': lambda name: int(name[1:]) if name.startswith('p') else None,
+# If a config in use has none, the whole graph is loaded, as when this is False.
+GRAPH_NEIGHBORHOOD_LOADING = True
+
+# Number of edge rows pulled from the server-side cursor, and added to the graph, per chunk when
+# /graph builds its graph. The node_id_generator_j1/j2 lambdas of GRAPH_CONFIGS get each row as
+# a dict keyed as by a DictCursor, where a column name selected twice gets its table prefixed the
+# second time (e.g. 'name' and 't2.name' for t1.name and t2.name). They run once per node id
+# rather than once per row, so each may only read its own node's columns: t1's for j1, t2's
+# for j2.
+GRAPH_LOAD_CHUNK_ROWS = 10000
+
+# Background graph jobs (POST /graph/jobs with the /graph args, then poll /graph/jobs/<id>).
+# When it loads its data from /graph/data, graph.html runs path queries (src and target), or any
+# query with job=1, as jobs it shows progress for and can cancel. Jobs run on GRAPH_JOB_WORKERS threads, path searches in them may
+# run for GRAPH_JOB_PATHS_TIME_BUDGET seconds, and the last GRAPH_JOB_MAX_ENTRIES finished
+# jobs are kept for their results.
+GRAPH_JOB_WORKERS = 4
+GRAPH_JOB_PATHS_TIME_BUDGET = 300
+GRAPH_JOB_MAX_ENTRIES = 100
+
+# Processes that long simple path searches (src and target) are split across, by the first hop
+# out of src; 0 or 1 searches in the request's thread. Only used with GRAPH_BACKEND = 'csr';
+# with the networkx backend searches always run in the request's thread. Searches with a cutoff
+# below GRAPH_PARALLEL_MIN_CUTOFF are quick enough not to be worth the hand-off.
+GRAPH_PATH_WORKERS = 0
+GRAPH_PARALLEL_MIN_CUTOFF = 5
+
+# Graph analytics, computed in the background once per cached graph version and added to the
+# node data /graph serves: 'cliques' (ids of the maximal cliques of at least
+# GRAPH_ANALYTICS_MIN_CLIQUE_SIZE nodes the node is in, at most GRAPH_ANALYTICS_MAX_CLIQUES
+# cliques in all), 'community' (Louvain, or label propagation above
+# GRAPH_ANALYTICS_LOUVAIN_MAX_NODES nodes) and 'betweenness' (estimated from
+# GRAPH_ANALYTICS_BETWEENNESS_SAMPLES sampled sources). They run in a separate worker process,
+# one graph at a time. Until they're ready, nodes have no cliques and no other analytics, and
+# /graph/data sends no ETag.
+GRAPH_ANALYTICS = True
+GRAPH_ANALYTICS_MIN_CLIQUE_SIZE = 3
+GRAPH_ANALYTICS_MAX_CLIQUES = 10000
+GRAPH_ANALYTICS_LOUVAIN_MAX_NODES = 50000
+GRAPH_ANALYTICS_BETWEENNESS_SAMPLES = 100
@@ -0,0 +1,216 @@
+from config import DB_PASSWORD, DB_USER, WRITE_ONLY_CONFIG
+from functions import (
+    IN_CLAUSE_CHUNK_SIZE, build_keyset_condition, build_rows_match, get_db_connection, get_primary_key_columns,
+    invalidate_table_schema
+)
+import click
+
+# Rows copied per transaction when backfilling a contributor table
+BACKFILL_BATCH_SIZE = 1000
+
+
+def get_contributor_table(table_name):
+    """Returns the name of the normalized contributor table for a write-only table, or None if it has none."""
+    return WRITE_ONLY_CONFIG.get(table_name, {}).get('contributor_table')
+
+
+def parse_contributors(contributors):
+    """Splits a comma-separated contributor column value into usernames, owner first."""
+    if not contributors:
+        return []
+    # A name listed twice only counts once, at its first position
+    return list(dict.fromkeys(c.strip() for c in contributors.split(',') if c.strip()))
+
+
+def delete_contributors(cursor, table_name, pk_values_list):
+    """Removes the contributor table entries for the given rows. No-op if the table has no contributor table."""
+    contributor_table = get_contributor_table(table_name)
+    if not contributor_table or not pk_values_list:
+        return
+
+    pk_columns = get_primary_key_columns(table_name)
+    for start in range(0, len(pk_values_list), IN_CLAUSE_CHUNK_SIZE):
+        chunk = pk_values_list[start:start + IN_CLAUSE_CHUNK_SIZE]
+        sql = f"DELETE FROM `{contributor_table}` WHERE {build_rows_match(pk_columns, len(chunk))}"
+        cursor.execute(sql, tuple(value for pk_values in chunk for value in pk_values))
+
+
+def sync_contributors(cursor, table_name, rows):
+    """Rewrites the contributor table entries for rows given as (pk_values, contributors) pairs.
+
+    Must run on the same connection and transaction as the write to the main table, so both
+    commit or roll back together. No-op if the table has no contributor table.
+    """
+    contributor_table = get_contributor_table(table_name)
+    if not contributor_table or not rows:
+        return
+
+    delete_contributors(cursor, table_name, [pk_values for pk_values, _ in rows])
+
+    entries = [
+        (*pk_values, username, position)
+        for pk_values, contributors in rows
+        for position, username in enumerate(parse_contributors(contributors))
+    ]
+    if entries:
+        pk_columns = get_primary_key_columns(table_name)
+        cols = ', '.join(f'`{col}`' for col in pk_columns + ['username', 'position'])
+        placeholders = ', '.join(['%s'] * (len(pk_columns) + 2))
+        cursor.executemany(f"INSERT INTO `{contributor_table}` ({cols}) VALUES ({placeholders})", entries)
+
+
+def resync_contributors(cursor, table_name, pk_values_list):
+    """Re-reads the contributor column of the given rows and rewrites their contributor table entries to match.
+
+    Used after updates that may or may not have matched, so the side table follows what was actually written.
+    """
+    contributor_table = get_contributor_table(table_name)
+    if not contributor_table or not pk_values_list:
+        return
+
+    pk_columns = get_primary_key_columns(table_name)
+    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+    cols_sql = ', '.join(f'`{col}`' for col in pk_columns + [contributor_column])
+
+    rows = []
+    for start in range(0, len(pk_values_list), IN_CLAUSE_CHUNK_SIZE):
+        chunk = pk_values_list[start:start + IN_CLAUSE_CHUNK_SIZE]
+        sql = f"SELECT {cols_sql} FROM `{table_name}` WHERE {build_rows_match(pk_columns, len(chunk))}"
+        cursor.execute(sql, tuple(value for pk_values in chunk for value in pk_values))
+        rows.extend(([row[col] for col in pk_columns], row[contributor_column]) for row in cursor.fetchall())
+
+    delete_contributors(cursor, table_name, pk_values_list)
+    sync_contributors(cursor, table_name, rows)
+
+
+def insert_with_contributors(cursor, table_name, sql, rows):
+    """Runs an INSERT for a list of cleaned row dicts and mirrors their contributors into the contributor table.
+
+    Rows are sent with one executemany call, except when the contributor table is enabled and the
+    primary key is generated by the database: then each row is inserted on its own to learn its id.
+    Returns the primary key values of the inserted rows, or None if the database generated them
+    and they weren't read back.
+    """
+    params_list = [list(cleaned_data.values()) for cleaned_data in rows]
+    contributor_table = get_contributor_table(table_name)
+    pk_columns = get_primary_key_columns(table_name)
+    has_keys = all(col in cleaned_data for cleaned_data in rows for col in pk_columns)
+
+    if not contributor_table:
+        if len(params_list) == 1:
+            cursor.execute(sql, params_list[0])
+            if not has_keys:
+                return [[cursor.lastrowid]]
+        else:
+            cursor.executemany(sql, params_list)
+            if not has_keys:
+                return None
+        return [[cleaned_data[col] for col in pk_columns] for cleaned_data in rows]
+
+    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+
+    if has_keys:
+        cursor.executemany(sql, params_list)
+        inserted_keys = [[cleaned_data[col] for col in pk_columns] for cleaned_data in rows]
+    else:
+        inserted_keys = []
+        for params in params_list:
+            cursor.execute(sql, params)
+            inserted_keys.append([cursor.lastrowid])
+
+    sync_contributors(cursor, table_name, [
+        (pk_values, cleaned_data.get(contributor_column))
+        for pk_values, cleaned_data in zip(inserted_keys, rows)
+    ])
+    return inserted_keys
+
+
+def create_contributor_table(connection, table_name):
+    """Creates the contributor table for a write-only table if it doesn't exist yet.
+
+    The table holds one row per (row, contributor) with the main table's primary key columns,
+    and is indexed by username first so membership filters are index lookups.
+    """
+    contributor_table = get_contributor_table(table_name)
+    pk_columns = get_primary_key_columns(table_name)
+
+    with connection.cursor() as cursor:
+        # DESCRIBE directly rather than get_table_schema, which leaves out HIDDEN_COLUMNS
+        cursor.execute(f"DESCRIBE `{table_name}`")
+        column_types = {col['Field']: col['Type'] for col in cursor.fetchall()}
+
+        pk_defs = ', '.join(f"`{col}` {column_types[col]} NOT NULL" for col in pk_columns)
+        pk_cols = ', '.join(f"`{col}`" for col in pk_columns)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS `{contributor_table}` (
+                {pk_defs},
+                `username` VARCHAR(255) NOT NULL,
+                `position` INT NOT NULL,
+                PRIMARY KEY ({pk_cols}, `username`),
+                KEY `idx_username` (`username`, {pk_cols})
+            )
+        """)
+    invalidate_table_schema(contributor_table)
+
+
+def backfill_contributor_table(connection, table_name):
+    """Rebuilds a contributor table from the comma-separated contributor column of the main table.
+
+    Rows are rewritten batch by batch, each batch replacing the entries of its rows, so a live
+    table keeps answering membership filters while this runs. Entries of rows no longer in the
+    main table are deleted at the end.
+    """
+    contributor_table = get_contributor_table(table_name)
+    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+    pk_columns = get_primary_key_columns(table_name)
+    cols_sql = ', '.join(f'`{col}`' for col in pk_columns + [contributor_column])
+    order_sql = ', '.join(f'`{col}`' for col in pk_columns)
+
+    with connection.cursor() as cursor:
+        copied = 0
+        after = None
+        while True:
+            sql = f"SELECT {cols_sql} FROM `{table_name}`"
+            params = []
+            if after is not None:
+                keyset_sql, params = build_keyset_condition(pk_columns, after)
+                sql += f" WHERE {keyset_sql}"
+            sql += f" ORDER BY {order_sql} LIMIT %s"
+            cursor.execute(sql, tuple(params + [BACKFILL_BATCH_SIZE]))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            sync_contributors(cursor, table_name, [
+                ([row[col] for col in pk_columns], row[contributor_column]) for row in rows
+            ])
+            connection.commit()
+
+            copied += len(rows)
+            after = [rows[-1][col] for col in pk_columns]
+
+        match_sql = ' AND '.join(f"t.`{col}` = `{contributor_table}`.`{col}`" for col in pk_columns)
+        cursor.execute(f"DELETE FROM `{contributor_table}` WHERE NOT EXISTS (SELECT 1 FROM `{table_name}` t WHERE {match_sql})")
+        connection.commit()
+
+    return copied
+
+
+@click.command('backfill-contributors')
+@click.option('--table', 'tables', multiple=True, help="Only backfill these tables (default: every table with a contributor_table).")
+@click.option('--user', default=DB_USER, help="Database user to run the migration as.")
+@click.option('--password', default=DB_PASSWORD, help="Password for the database user.")
+def backfill_contributors_command(tables, user, password):
+    """Creates and fills the normalized contributor tables configured in WRITE_ONLY_CONFIG."""
+    tables = tables or [name for name in WRITE_ONLY_CONFIG if get_contributor_table(name)]
+    connection = get_db_connection(user, password)
+    try:
+        for table_name in tables:
+            if not get_contributor_table(table_name):
+                click.echo(f"Skipping {table_name}: no contributor_table configured.")
+                continue
+            create_contributor_table(connection, table_name)
+            copied = backfill_contributor_table(connection, table_name)
+            click.echo(f"Backfilled {get_contributor_table(table_name)} from {copied} rows of {table_name}.")
+    finally:
+        connection.close()
@@ -1,15 +1,41 @@
-from config import PRIMARY_KEYS
+from config import PRIMARY_KEYS, TABLES_TO_SHOW
 from flask import Blueprint, request, session
-from functions import get_db_connection
+from functions import get_fk_search_config, get_foreign_table_display_texts, get_table_schema, pooled_connection
+import fk_fulltext
+import fk_index
 
 fk = Blueprint('fk', __name__)
 
+
+def like_search(connection, table_name, search_columns, foreign_pk, query, limit=10):
+    """Finds rows whose search columns contain the query, with a LIKE '%q%' scan."""
+    with connection.cursor() as cursor:
+        # Build search conditions
+        search_conditions = []
+        search_params = []
+
+        for col in search_columns:
+            search_conditions.append(f"`{col}` LIKE %s")
+            search_params.append(f"%{query}%")
+
+        # Get all columns for display
+        all_columns = search_columns.copy()
+        if foreign_pk not in all_columns:
+            all_columns.insert(0, foreign_pk)
+
+        columns_sql = ', '.join([f'`{col}`' for col in all_columns])
+        where_clause = ' OR '.join(search_conditions)
+
+        sql = f"SELECT {columns_sql} FROM `{table_name}` WHERE {where_clause} LIMIT {int(limit)}"
+        cursor.execute(sql, tuple(search_params))
+        return cursor.fetchall()
+
+
 @fk.route('/search_foreign_key/<string:table_name>')
 def search_foreign_key(table_name):
     """Search for foreign key options based on query."""
     from flask import jsonify
 
-    connection = None
     if 'db_user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
@@ -19,61 +45,57 @@ def search_foreign_key(table_name):
     if not query:
         return jsonify({'results': []})
 
-    try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            search_columns = [col.strip() for col in search_columns_param.split(',') if col.strip()]
+    search_columns = [col.strip() for col in search_columns_param.split(',') if col.strip()]
 
-            if not search_columns:
-                return jsonify({'results': []})
+    if not search_columns:
+        return jsonify({'results': []})
 
-            # Get the primary key of the foreign table
-            foreign_pk = PRIMARY_KEYS.get(table_name, 'id')
-            if isinstance(foreign_pk, list):
-                foreign_pk = foreign_pk[0]  # Use first column of composite key
+    # Get the primary key of the foreign table
+    foreign_pk = PRIMARY_KEYS.get(table_name, 'id')
+    if isinstance(foreign_pk, list):
+        foreign_pk = foreign_pk[0]  # Use first column of composite key
 
-            # Build search conditions
-            search_conditions = []
-            search_params = []
+    user = session['db_user']
+    password = session['db_password']
 
+    try:
+        results = None
+        search_config = get_fk_search_config(table_name, search_columns)
+        search_mode = search_config.get('search_mode', 'like')
+
+        if search_mode == 'index':
+            # Answered in memory; returns None when the table can't be indexed
+            results = fk_index.search(lambda: pooled_connection(user, password), user, table_name, search_columns, query)
+
+        if results is None:
+            with pooled_connection(user, password) as connection:
+                if search_mode == 'fulltext':
+                    # Returns None for queries too short for the index, which LIKE still handles
+                    results = fk_fulltext.fulltext_search(
+                        connection, table_name, search_columns, foreign_pk, query, search_config.get('fulltext_parser')
+                    )
+                if results is None:
+                    results = like_search(connection, table_name, search_columns, foreign_pk, query)
+
+        # Format results
+        formatted_results = []
+        for row in results:
+            # Create display string
+            display_parts = []
             for col in search_columns:
-                search_conditions.append(f"`{col}` LIKE %s")
-                search_params.append(f"%{query}%")
-
-            # Get all columns for display
-            all_columns = search_columns.copy()
-            if foreign_pk not in all_columns:
-                all_columns.insert(0, foreign_pk)
-
-            columns_sql = ', '.join([f'`{col}`' for col in all_columns])
-            where_clause = ' OR '.join(search_conditions)
-
-            sql = f"SELECT {columns_sql} FROM `{table_name}` WHERE {where_clause} LIMIT 10"
-            cursor.execute(sql, tuple(search_params))
-            results = cursor.fetchall()
+                if row.get(col):
+                    display_parts.append(f"{col}: {row[col]}")
 
-            # Format results
-            formatted_results = []
-            for row in results:
-                # Create display string
-                display_parts = []
-                for col in search_columns:
-                    if row.get(col):
-                        display_parts.append(f"{col}: {row[col]}")
-
-                formatted_results.append({
-                    'id': row[foreign_pk],
-                    'display': ' | '.join(display_parts) if display_parts else f"ID: {row[foreign_pk]}"
-                })
+            formatted_results.append({
+                'id': row[foreign_pk],
+                'display': ' | '.join(display_parts) if display_parts else f"ID: {row[foreign_pk]}"
+            })
 
-            return jsonify({'results': formatted_results})
+        return jsonify({'results': formatted_results})
 
     except Exception as e:
         print(f"Error searching foreign key: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if connection:
-            connection.close()
 
 
 @fk.route('/get_foreign_key_display/<string:table_name>/<string:record_id>')
@@ -81,41 +103,90 @@ def get_foreign_key_display(table_name, record_id):
     """Get display information for a specific foreign key record."""
     from flask import jsonify
 
-    connection = None
     if 'db_user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            # Get the primary key of the foreign table
-            foreign_pk = PRIMARY_KEYS.get(table_name, 'id')
-            if isinstance(foreign_pk, list):
-                foreign_pk = foreign_pk[0]  # Use first column of composite key
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                # Get the primary key of the foreign table
+                foreign_pk = PRIMARY_KEYS.get(table_name, 'id')
+                if isinstance(foreign_pk, list):
+                    foreign_pk = foreign_pk[0]  # Use first column of composite key
 
-            # Get all columns to build display
-            cursor.execute(f"SELECT * FROM `{table_name}` WHERE `{foreign_pk}` = %s", (record_id,))
-            row = cursor.fetchone()
+                # Get all columns to build display
+                cursor.execute(f"SELECT * FROM `{table_name}` WHERE `{foreign_pk}` = %s", (record_id,))
+                row = cursor.fetchone()
 
-            if not row:
-                return jsonify({'success': False, 'error': 'Record not found'})
+                if not row:
+                    return jsonify({'success': False, 'error': 'Record not found'})
 
-            # Create a simple display string with key information
-            display_parts = []
-            for key, value in row.items():
-                if key != foreign_pk and value is not None:
-                    display_parts.append(f"{key}: {value}")
+                # Create a simple display string with key information
+                display_parts = []
+                for key, value in row.items():
+                    if key != foreign_pk and value is not None:
+                        display_parts.append(f"{key}: {value}")
 
-            display = ' | '.join(display_parts[:3]) if display_parts else f"Record ID: {record_id}"
+                display = ' | '.join(display_parts[:3]) if display_parts else f"Record ID: {record_id}"
 
-            return jsonify({
-                'success': True,
-                'display': display
-            })
+                return jsonify({
+                    'success': True,
+                    'display': display
+                })
 
     except Exception as e:
         print(f"Error getting foreign key display: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if connection:
-            connection.close()
\ No newline at end of file
+
+
+@fk.route('/get_foreign_key_displays', methods=['POST'])
+def get_foreign_key_displays():
+    """Get display text for many foreign key records at once.
+
+    Expects JSON of the form {"tables": {"<foreign table>": ["<id>", ...], ...}} and returns
+    {"success": true, "displays": {"<foreign table>": {"<id>": "<display>" | null, ...}, ...}}.
+    Ids of a foreign key column can instead be sent as {"columns": {"<table>": {"<column>":
+    ["<id>", ...]}}}, and come back under "column_displays" in the same shape, labelled with
+    that foreign key's display columns rather than those of the first one pointing at its table.
+    Each table or column is resolved with one IN (...) query.
+    """
+    from flask import jsonify
+
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    tables = payload.get('tables', {})
+    if not isinstance(tables, dict) or not all(isinstance(ids, list) for ids in tables.values()):
+        return jsonify({'error': "Expected 'tables' to map table names to lists of ids."}), 400
+    columns = payload.get('columns', {})
+    if not isinstance(columns, dict) or not all(
+        isinstance(table_columns, dict) and all(isinstance(ids, list) for ids in table_columns.values())
+        for table_columns in columns.values()
+    ):
+        return jsonify({'error': "Expected 'columns' to map table names to column names to lists of ids."}), 400
+
+    try:
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            displays = {
+                table_name: get_foreign_table_display_texts(connection, table_name, ids)
+                for table_name, ids in tables.items() if ids
+            }
+            column_displays = {}
+            for table_name, table_columns in columns.items():
+                if table_name not in TABLES_TO_SHOW:
+                    return jsonify({'error': f"Table '{table_name}' is not configured to be shown."}), 404
+                schema = get_table_schema(connection, table_name)
+                column_displays[table_name] = {}
+                for column, ids in table_columns.items():
+                    if not schema.get(column, {}).get('is_foreign_key'):
+                        return jsonify({'error': f"'{table_name}.{column}' is not a foreign key."}), 400
+                    if ids:
+                        column_displays[table_name][column] = get_foreign_table_display_texts(
+                            connection, schema[column]['foreign_table'], ids, table_name, column
+                        )
+        return jsonify({'success': True, 'displays': displays, 'column_displays': column_displays})
+
+    except Exception as e:
+        print(f"Error getting foreign key displays: {e}")
+        return jsonify({'error': str(e)}), 500
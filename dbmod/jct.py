@@ -1,11 +1,23 @@
-from config import MANY_TO_MANY_CONFIG, PRIMARY_KEYS
+from config import JUNCTION_OPTIONS_PAGE_SIZE, MANY_TO_MANY_CONFIG, PRIMARY_KEYS
 from flask import Blueprint, redirect, request, session, url_for, jsonify
-from functions import get_db_connection
+from functions import (
+    build_keyset_condition, clamp_page_size, decode_page_cursor, encode_page_cursor, get_contributor_filter,
+    get_primary_key_columns, pooled_connection
+)
+import changefeed
 jct = Blueprint('jct', __name__)
 
+
+def junction_event_keys(junction_table, values):
+    """Returns the primary key of a junction row as change event keys, or None if `values` doesn't cover it."""
+    pk_columns = get_primary_key_columns(junction_table)
+    if all(values.get(col) not in (None, '') for col in pk_columns):
+        return [[values[col] for col in pk_columns]]
+    return None
+
+
 @jct.route('/<string:table_name>/add_junction_entry', methods=['POST'])
 def add_junction_entry(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
@@ -25,41 +37,39 @@ def add_junction_entry(table_name):
         return redirect(url_for('dbview.index', table_name=table_name, error="Junction configuration not found."))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            main_id = request.form[config['fk_self']]
-            other_id = request.form[config['fk_other']]
-
-            # Collect extra column data
-            extra_data = {}
-            for col in config.get('extra_columns', []):
-                value = request.form.get(f"extra_{col}")
-                if value:
-                    extra_data[col] = value
-
-            # Build insert statement
-            all_columns = [config['fk_self'], config['fk_other']] + list(extra_data.keys())
-            all_values = [main_id, other_id] + list(extra_data.values())
-
-            cols = ', '.join(f'`{col}`' for col in all_columns)
-            placeholders = ', '.join(['%s'] * len(all_values))
-
-            sql = f"INSERT INTO `{config['junction_table']}` ({cols}) VALUES ({placeholders})"
-            cursor.execute(sql, tuple(all_values))
-        connection.commit()
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                main_id = request.form[config['fk_self']]
+                other_id = request.form[config['fk_other']]
+
+                # Collect extra column data
+                extra_data = {}
+                for col in config.get('extra_columns', []):
+                    value = request.form.get(f"extra_{col}")
+                    if value:
+                        extra_data[col] = value
+
+                # Build insert statement
+                all_columns = [config['fk_self'], config['fk_other']] + list(extra_data.keys())
+                all_values = [main_id, other_id] + list(extra_data.values())
+
+                cols = ', '.join(f'`{col}`' for col in all_columns)
+                placeholders = ', '.join(['%s'] * len(all_values))
+
+                sql = f"INSERT INTO `{config['junction_table']}` ({cols}) VALUES ({placeholders})"
+                cursor.execute(sql, tuple(all_values))
+            connection.commit()
+            row_values = dict(zip(all_columns, all_values))
+            changefeed.emit(changefeed.INSERT, config['junction_table'], junction_event_keys(config['junction_table'], row_values), [row_values])
     except Exception as e:
         print(f"Error adding junction entry: {e}")
         return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id))
 
 
 @jct.route('/<string:table_name>/remove_junction_entry', methods=['POST'])
 def remove_junction_entry(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
@@ -79,46 +89,45 @@ def remove_junction_entry(table_name):
         return redirect(url_for('dbview.index', table_name=table_name, error="Junction configuration not found."))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            main_id = request.form[config['fk_self']]
-
-            # Handle deletion by junction primary key if available
-            junction_pk = config.get('junction_primary_key', [config['fk_self'], config['fk_other']])
-
-            where_clauses = []
-            where_values = []
-
-            for pk_col in junction_pk:
-                value = request.form.get(pk_col)
-                if value:
-                    where_clauses.append(f"`{pk_col}` = %s")
-                    where_values.append(value)
-
-            if where_clauses:
-                where_clause = ' AND '.join(where_clauses)
-                sql = f"DELETE FROM `{config['junction_table']}` WHERE {where_clause}"
-                cursor.execute(sql, tuple(where_values))
-            else:
-                # Fallback to old method
-                other_id = request.form[config['fk_other']]
-                sql = f"DELETE FROM `{config['junction_table']}` WHERE `{config['fk_self']}` = %s AND `{config['fk_other']}` = %s"
-                cursor.execute(sql, (main_id, other_id))
-
-        connection.commit()
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                main_id = request.form[config['fk_self']]
+
+                # Handle deletion by junction primary key if available
+                junction_pk = config.get('junction_primary_key', [config['fk_self'], config['fk_other']])
+
+                where_clauses = []
+                where_values = []
+
+                for pk_col in junction_pk:
+                    value = request.form.get(pk_col)
+                    if value:
+                        where_clauses.append(f"`{pk_col}` = %s")
+                        where_values.append(value)
+
+                if where_clauses:
+                    where_clause = ' AND '.join(where_clauses)
+                    sql = f"DELETE FROM `{config['junction_table']}` WHERE {where_clause}"
+                    cursor.execute(sql, tuple(where_values))
+                    row_values = {col: request.form.get(col) for col in junction_pk}
+                else:
+                    # Fallback to old method
+                    other_id = request.form[config['fk_other']]
+                    sql = f"DELETE FROM `{config['junction_table']}` WHERE `{config['fk_self']}` = %s AND `{config['fk_other']}` = %s"
+                    cursor.execute(sql, (main_id, other_id))
+                    row_values = {config['fk_self']: main_id, config['fk_other']: other_id}
+
+            connection.commit()
+            changefeed.emit(changefeed.DELETE, config['junction_table'], junction_event_keys(config['junction_table'], row_values))
     except Exception as e:
         print(f"Error removing junction entry: {e}")
         return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id))
 
 
 @jct.route('/<string:table_name>/update_junction_entry', methods=['POST'])
 def update_junction_entry(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
@@ -138,46 +147,45 @@ def update_junction_entry(table_name):
         return redirect(url_for('dbview.index', table_name=table_name, error="Junction configuration not found."))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            main_id = request.form[config['fk_self']]
-
-            # Get the junction primary key values for WHERE clause
-            junction_pk = config.get('junction_primary_key', [config['fk_self'], config['fk_other']])
-
-            where_clauses = []
-            where_values = []
-
-            for pk_col in junction_pk:
-                value = request.form.get(f"original_{pk_col}")  # Use original values for WHERE
-                if value:
-                    where_clauses.append(f"`{pk_col}` = %s")
-                    where_values.append(value)
-
-            # Collect extra column updates
-            update_data = {}
-            for col in config.get('extra_columns', []):
-                value = request.form.get(f"extra_{col}")
-                if value is not None:  # Allow empty strings
-                    update_data[col] = value
-
-            if update_data and where_clauses:
-                set_clauses = [f"`{col}` = %s" for col in update_data.keys()]
-                set_clause = ', '.join(set_clauses)
-                where_clause = ' AND '.join(where_clauses)
-
-                update_values = list(update_data.values()) + where_values
-
-                sql = f"UPDATE `{config['junction_table']}` SET {set_clause} WHERE {where_clause}"
-                cursor.execute(sql, tuple(update_values))
-
-        connection.commit()
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                main_id = request.form[config['fk_self']]
+
+                # Get the junction primary key values for WHERE clause
+                junction_pk = config.get('junction_primary_key', [config['fk_self'], config['fk_other']])
+
+                where_clauses = []
+                where_values = []
+
+                for pk_col in junction_pk:
+                    value = request.form.get(f"original_{pk_col}")  # Use original values for WHERE
+                    if value:
+                        where_clauses.append(f"`{pk_col}` = %s")
+                        where_values.append(value)
+
+                # Collect extra column updates
+                update_data = {}
+                for col in config.get('extra_columns', []):
+                    value = request.form.get(f"extra_{col}")
+                    if value is not None:  # Allow empty strings
+                        update_data[col] = value
+
+                if update_data and where_clauses:
+                    set_clauses = [f"`{col}` = %s" for col in update_data.keys()]
+                    set_clause = ', '.join(set_clauses)
+                    where_clause = ' AND '.join(where_clauses)
+
+                    update_values = list(update_data.values()) + where_values
+
+                    sql = f"UPDATE `{config['junction_table']}` SET {set_clause} WHERE {where_clause}"
+                    cursor.execute(sql, tuple(update_values))
+
+            connection.commit()
+            original_values = {col: request.form.get(f"original_{col}") for col in junction_pk}
+            changefeed.emit(changefeed.UPDATE, config['junction_table'], junction_event_keys(config['junction_table'], original_values), [update_data])
     except Exception as e:
         print(f"Error updating junction entry: {e}")
         return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=main_id))
 
@@ -186,7 +194,6 @@ def update_junction_entry(table_name):
 def verify_junction_id(table_name, main_id, junction_id):
     """Verifies if a junction ID exists and returns information about it."""
 
-    connection = None
     if 'db_user' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
 
@@ -195,49 +202,146 @@ def verify_junction_id(table_name, main_id, junction_id):
         return jsonify({'error': 'No many-to-many config found'}), 400
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            other_table = config['other_table']
-            other_display_column = config['other_display_column']
-            junction_table = config['junction_table']
-            fk_self = config['fk_self']
-            fk_other = config['fk_other']
-            other_pk = PRIMARY_KEYS.get(other_table, 'id')
-
-            # Handle composite primary keys for the other table
-            if isinstance(other_pk, list):
-                # For composite keys, we'd need to handle this differently
-                # For now, assume single primary key for the other table
-                other_pk = other_pk[0]
-
-            # Check if the ID exists in the other table
-            check_sql = f"SELECT `{other_pk}`, `{other_display_column}` FROM `{other_table}` WHERE `{other_pk}` = %s"
-            cursor.execute(check_sql, (junction_id,))
-            other_record = cursor.fetchone()
-
-            if not other_record:
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                other_table = config['other_table']
+                other_display_column = config['other_display_column']
+                junction_table = config['junction_table']
+                fk_self = config['fk_self']
+                fk_other = config['fk_other']
+                other_pk = PRIMARY_KEYS.get(other_table, 'id')
+
+                # Handle composite primary keys for the other table
+                if isinstance(other_pk, list):
+                    # For composite keys, we'd need to handle this differently
+                    # For now, assume single primary key for the other table
+                    other_pk = other_pk[0]
+
+                # Check if the ID exists in the other table
+                check_sql = f"SELECT `{other_pk}`, `{other_display_column}` FROM `{other_table}` WHERE `{other_pk}` = %s"
+                cursor.execute(check_sql, (junction_id,))
+                other_record = cursor.fetchone()
+
+                if not other_record:
+                    return jsonify({
+                        'exists': False,
+                        'already_linked': False,
+                        'display_name': None
+                    })
+
+                # Check if this relationship already exists
+                junction_check_sql = f"SELECT COUNT(*) as count FROM `{junction_table}` WHERE `{fk_self}` = %s AND `{fk_other}` = %s"
+                cursor.execute(junction_check_sql, (main_id, junction_id))
+                junction_result = cursor.fetchone()
+
+                already_linked = junction_result['count'] > 0
+
                 return jsonify({
-                    'exists': False,
-                    'already_linked': False,
-                    'display_name': None
+                    'exists': True,
+                    'already_linked': already_linked,
+                    'display_name': other_record[other_display_column]
                 })
 
-            # Check if this relationship already exists
-            junction_check_sql = f"SELECT COUNT(*) as count FROM `{junction_table}` WHERE `{fk_self}` = %s AND `{fk_other}` = %s"
-            cursor.execute(junction_check_sql, (main_id, junction_id))
-            junction_result = cursor.fetchone()
+    except Exception as e:
+        print(f"Error verifying junction ID: {e.with_traceback(e.__traceback__)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def find_junction_config(table_name, junction_name):
+    """Returns the MANY_TO_MANY_CONFIG entry of table_name with the given relationship name, or None."""
+    junction_configs = MANY_TO_MANY_CONFIG.get(table_name, [])
+    if isinstance(junction_configs, dict):
+        junction_configs = [junction_configs]
+
+    for jc in junction_configs:
+        if jc.get('name', jc['other_table']) == junction_name:
+            return jc
+    return None
 
-            already_linked = junction_result['count'] > 0
 
-            return jsonify({
-                'exists': True,
-                'already_linked': already_linked,
-                'display_name': other_record[other_display_column]
-            })
+@jct.route('/junction_options/<string:table_name>/<string:junction_name>')
+def junction_options(table_name, junction_name):
+    """Returns one page of the rows that can be linked to a row through a junction table.
 
+    Rows are filtered by the optional query `q` over the relationship's search columns (its
+    display column by default) and, for write-only tables, to the user's own rows. With
+    `main_id`, each option says whether it is already linked to that row. Pages are keyed
+    on the other table's primary key; pass `next_cursor` back as `after` for the next one.
+    """
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    config = find_junction_config(table_name, junction_name)
+    if not config:
+        return jsonify({'error': 'Junction configuration not found.'}), 404
+
+    other_table = config['other_table']
+    other_display_column = config['other_display_column']
+    other_pk = PRIMARY_KEYS.get(other_table, 'id')
+    if isinstance(other_pk, list):
+        other_pk = other_pk[0]  # Use first column for composite keys
+
+    query = request.args.get('q', '').strip()
+    main_id = request.args.get('main_id')
+    page_size = clamp_page_size(request.args.get('page_size', JUNCTION_OPTIONS_PAGE_SIZE, type=int))
+
+    conditions = []
+    params = []
+
+    contributor_sql, contributor_params = get_contributor_filter(other_table, session['db_user'], 't')
+    if contributor_sql:
+        conditions.append(contributor_sql)
+        params.extend(contributor_params)
+
+    if query:
+        search_columns = config.get('search_columns', [other_display_column])
+        conditions.append('(' + ' OR '.join(f"t.`{col}` LIKE %s" for col in search_columns) + ')')
+        params.extend(f"%{query}%" for _ in search_columns)
+
+    if request.args.get('after'):
+        try:
+            after = decode_page_cursor(request.args['after'], 1)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        keyset_sql, keyset_params = build_keyset_condition([other_pk], after, 't')
+        conditions.append(keyset_sql)
+        params.extend(keyset_params)
+
+    select_columns = [f"t.`{other_pk}` AS `id`", f"t.`{other_display_column}` AS `display`"]
+    select_params = []
+    if main_id:
+        # Flag existing links in the same query instead of one verify request per option
+        select_columns.append(
+            f"EXISTS (SELECT 1 FROM `{config['junction_table']}` AS j "
+            f"WHERE j.`{config['fk_self']}` = %s AND j.`{config['fk_other']}` = t.`{other_pk}`) AS `linked`"
+        )
+        select_params.append(main_id)
+
+    sql = f"SELECT {', '.join(select_columns)} FROM `{other_table}` AS t"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    # One extra row tells whether there is a next page
+    sql += f" ORDER BY t.`{other_pk}` LIMIT %s"
+
+    try:
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, tuple(select_params + params + [page_size + 1]))
+                rows = cursor.fetchall()
     except Exception as e:
-        print(f"Error verifying junction ID: {e.with_traceback(e.__traceback__)}")
+        print(f"Error loading junction options: {e}")
         return jsonify({'error': str(e)}), 500
-    finally:
-        if connection:
-            connection.close()
\ No newline at end of file
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_page_cursor([rows[-1]['id']])
+
+    return jsonify({
+        'results': [{
+            'id': row['id'],
+            'display': row['display'] if row['display'] is not None else f"ID: {row['id']}",
+            'linked': bool(row.get('linked'))
+        } for row in rows],
+        'next_cursor': next_cursor
+    })
@@ -1,333 +1,602 @@
-from config import DUPLICATE_KEY_CONFIG, PRIMARY_KEYS, READ_ONLY_COLUMNS, WRITE_ONLY_CONFIG
-from functions import get_db_connection, get_table_schema, is_composite_pk
-from flask import Blueprint, redirect, request, session, url_for
+from config import DUPLICATE_KEY_CONFIG, IMPORT_BATCH_SIZE, PRIMARY_KEYS, READ_ONLY_COLUMNS, WRITE_ONLY_CONFIG
+from contributors import delete_contributors, insert_with_contributors, resync_contributors, sync_contributors
+from functions import (
+    IN_CLAUSE_CHUNK_SIZE, build_rows_match, clean_insert_data, get_contributor_filter, get_primary_key_columns,
+    get_table_schema, is_composite_pk, pooled_connection
+)
+import changefeed
+from flask import Blueprint, jsonify, redirect, request, session, url_for
+import csv
+import io
+import json
 
 row = Blueprint('row', __name__)
 
 
 @row.route('/<string:table_name>/add_row', methods=['POST'])
 def add_row(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            data = request.form.to_dict()
-            schema = get_table_schema(connection, table_name)
-            primary_key_config = PRIMARY_KEYS.get(table_name)
-
-            cleaned_data = {}
-            for key, value in data.items():
-                is_auto_inc = schema.get(key, {}).get('is_auto_increment', False)
-
-                if value != '':
-                    cleaned_data[key] = value
-
-            # Add contributor username if the table is write-only
-            if table_name in WRITE_ONLY_CONFIG:
-                contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-                cleaned_data[contributor_column] = session['db_user']
-
-            if isinstance(primary_key_config, list):
-                # Composite key: The primary key fields are often not auto-incrementing
-                # and are included in the form, so we don't need to do anything.
-                pass
-            else:
-                # Single key: Remove auto-incrementing primary key if it exists
-                primary_key = primary_key_config
-                if primary_key and schema.get(primary_key, {}).get('is_auto_increment'):
-                    if primary_key in cleaned_data:
-                        del cleaned_data[primary_key]
-
-            if not cleaned_data:
-                return redirect(url_for('dbview.index', table_name=table_name, error="No valid data provided to add."))
-
-            cols = ', '.join(f'`{key}`' for key in cleaned_data.keys())
-            placeholders = ', '.join(['%s'] * len(cleaned_data))
-            sql = f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})"
-
-            try:
-                cursor.execute(sql, list(cleaned_data.values()))
-                connection.commit()
-
-                # On successful creation, redirect to main table view
-                return redirect(url_for('dbview.index', table_name=table_name))
-
-            except Exception as insert_error:
-                # Check if it's a duplicate key error and we have duplicate key config
-                if "Duplicate entry" in str(insert_error) and table_name in WRITE_ONLY_CONFIG and table_name in DUPLICATE_KEY_CONFIG:
-                    # Try to add the user as a contributor to the existing row using configured duplicate keys
-                    try:
-                        contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-                        duplicate_keys = DUPLICATE_KEY_CONFIG[table_name]
-
-                        # Build search conditions using only the configured duplicate key fields
-                        search_conditions = []
-                        search_params = []
-
-                        for key in duplicate_keys:
-                            if key in cleaned_data:
-                                search_conditions.append(f"`{key}` = %s")
-                                search_params.append(cleaned_data[key])
-                            else:
-                                # If a configured key is missing from the form data, we can't match
-                                print(f"Warning: Configured duplicate key '{key}' not found in form data")
-                                raise insert_error
-
-                        if search_conditions:
-                            where_clause = ' AND '.join(search_conditions)
-                            find_sql = f"SELECT * FROM `{table_name}` WHERE {where_clause}"
-                            cursor.execute(find_sql, tuple(search_params))
-                            existing_row = cursor.fetchone()
-
-                            if existing_row:
-                                # Get current contributors
-                                current_contributors = existing_row.get(contributor_column, '')
-                                if current_contributors:
-                                    contributors_list = [c.strip() for c in current_contributors.split(',')]
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                data = request.form.to_dict()
+                schema = get_table_schema(connection, table_name)
+                primary_key_config = PRIMARY_KEYS.get(table_name)
+
+                cleaned_data = clean_insert_data(table_name, schema, data, session['db_user'])
+
+                if not cleaned_data:
+                    return redirect(url_for('dbview.index', table_name=table_name, error="No valid data provided to add."))
+
+                cols = ', '.join(f'`{key}`' for key in cleaned_data.keys())
+                placeholders = ', '.join(['%s'] * len(cleaned_data))
+                sql = f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})"
+
+                try:
+                    inserted_keys = insert_with_contributors(cursor, table_name, sql, [cleaned_data])
+                    connection.commit()
+                    changefeed.emit(changefeed.INSERT, table_name, inserted_keys, [cleaned_data])
+
+                    # On successful creation, redirect to main table view
+                    return redirect(url_for('dbview.index', table_name=table_name))
+
+                except Exception as insert_error:
+                    # Check if it's a duplicate key error and we have duplicate key config
+                    if "Duplicate entry" in str(insert_error) and table_name in WRITE_ONLY_CONFIG and table_name in DUPLICATE_KEY_CONFIG:
+                        # Try to add the user as a contributor to the existing row using configured duplicate keys
+                        try:
+                            contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+                            duplicate_keys = DUPLICATE_KEY_CONFIG[table_name]
+
+                            # Build search conditions using only the configured duplicate key fields
+                            search_conditions = []
+                            search_params = []
+
+                            for key in duplicate_keys:
+                                if key in cleaned_data:
+                                    search_conditions.append(f"`{key}` = %s")
+                                    search_params.append(cleaned_data[key])
                                 else:
-                                    contributors_list = []
-
-                                # Add current user if not already present
-                                if session['db_user'] not in contributors_list:
-                                    contributors_list.append(session['db_user'])
-                                    new_contributors_str = ','.join(contributors_list)
-
-                                    # Update the existing row
-                                    if isinstance(primary_key_config, list):
-                                        pk_conditions = []
-                                        pk_params = []
-                                        for pk_col in primary_key_config:
-                                            pk_conditions.append(f"`{pk_col}` = %s")
-                                            pk_params.append(existing_row[pk_col])
-                                        pk_where_clause = ' AND '.join(pk_conditions)
-                                        update_sql = f"UPDATE `{table_name}` SET `{contributor_column}` = %s WHERE {pk_where_clause}"
-                                        cursor.execute(update_sql, tuple([new_contributors_str] + pk_params))
-                                        row_id_path = '/'.join(str(existing_row[pk]) for pk in primary_key_config)
+                                    # If a configured key is missing from the form data, we can't match
+                                    print(f"Warning: Configured duplicate key '{key}' not found in form data")
+                                    raise insert_error
+
+                            if search_conditions:
+                                where_clause = ' AND '.join(search_conditions)
+                                find_sql = f"SELECT * FROM `{table_name}` WHERE {where_clause}"
+                                cursor.execute(find_sql, tuple(search_params))
+                                existing_row = cursor.fetchone()
+
+                                if existing_row:
+                                    # Get current contributors
+                                    current_contributors = existing_row.get(contributor_column, '')
+                                    if current_contributors:
+                                        contributors_list = [c.strip() for c in current_contributors.split(',')]
                                     else:
-                                        update_sql = f"UPDATE `{table_name}` SET `{contributor_column}` = %s WHERE `{primary_key_config}` = %s"
-                                        cursor.execute(update_sql, (new_contributors_str, existing_row[primary_key_config]))
-                                        row_id_path = str(existing_row[primary_key_config])
-
-                                    connection.commit()
-                                    return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=row_id_path))
-                                else:
-                                    # User is already a contributor, just redirect to expanded view
-                                    if isinstance(primary_key_config, list):
-                                        row_id_path = '/'.join(str(existing_row[pk]) for pk in primary_key_config)
+                                        contributors_list = []
+
+                                    # Add current user if not already present
+                                    if session['db_user'] not in contributors_list:
+                                        contributors_list.append(session['db_user'])
+                                        new_contributors_str = ','.join(contributors_list)
+
+                                        # Update the existing row
+                                        if isinstance(primary_key_config, list):
+                                            pk_conditions = []
+                                            pk_params = []
+                                            for pk_col in primary_key_config:
+                                                pk_conditions.append(f"`{pk_col}` = %s")
+                                                pk_params.append(existing_row[pk_col])
+                                            pk_where_clause = ' AND '.join(pk_conditions)
+                                            update_sql = f"UPDATE `{table_name}` SET `{contributor_column}` = %s WHERE {pk_where_clause}"
+                                            cursor.execute(update_sql, tuple([new_contributors_str] + pk_params))
+                                            sync_contributors(cursor, table_name, [(pk_params, new_contributors_str)])
+                                            row_id_path = '/'.join(str(existing_row[pk]) for pk in primary_key_config)
+                                            existing_keys = [pk_params]
+                                        else:
+                                            update_sql = f"UPDATE `{table_name}` SET `{contributor_column}` = %s WHERE `{primary_key_config}` = %s"
+                                            cursor.execute(update_sql, (new_contributors_str, existing_row[primary_key_config]))
+                                            sync_contributors(cursor, table_name, [([existing_row[primary_key_config]], new_contributors_str)])
+                                            row_id_path = str(existing_row[primary_key_config])
+                                            existing_keys = [[existing_row[primary_key_config]]]
+
+                                        connection.commit()
+                                        changefeed.emit(changefeed.UPDATE, table_name, existing_keys, [{contributor_column: new_contributors_str}])
+                                        return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=row_id_path))
                                     else:
-                                        row_id_path = str(existing_row[primary_key_config])
-                                    return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=row_id_path))
+                                        # User is already a contributor, just redirect to expanded view
+                                        if isinstance(primary_key_config, list):
+                                            row_id_path = '/'.join(str(existing_row[pk]) for pk in primary_key_config)
+                                        else:
+                                            row_id_path = str(existing_row[primary_key_config])
+                                        return redirect(url_for('dbview.expanded_view', table_name=table_name, row_id=row_id_path))
+                                else:
+                                    # No matching row found with configured keys, this shouldn't happen with a duplicate error
+                                    print(f"Warning: Duplicate error but no matching row found for keys: {duplicate_keys}")
+                                    raise insert_error
                             else:
-                                # No matching row found with configured keys, this shouldn't happen with a duplicate error
-                                print(f"Warning: Duplicate error but no matching row found for keys: {duplicate_keys}")
+                                # No valid search conditions could be built
                                 raise insert_error
-                        else:
-                            # No valid search conditions could be built
-                            raise insert_error
 
-                    except Exception as contributor_error:
-                        print(f"Error adding as contributor: {contributor_error}")
-                        # Fall through to regular error handling
+                        except Exception as contributor_error:
+                            print(f"Error adding as contributor: {contributor_error}")
+                            # Fall through to regular error handling
 
-                # If we get here, it's a different kind of error or table not configured for duplicate handling
-                raise insert_error
+                    # If we get here, it's a different kind of error or table not configured for duplicate handling
+                    raise insert_error
 
     except Exception as e:
         print(f"Error adding row: {e}")
         return redirect(url_for('dbview.index', table_name=table_name, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.index', table_name=table_name))
 
 
+def insert_rows_in_batches(connection, table_name, schema, records, user, batch_size=IMPORT_BATCH_SIZE):
+    """Inserts an iterable of row dicts with batched executemany calls, committing every batch_size rows.
+
+    Each record goes through the same cleaning as add_row. If a batch fails as a whole, it is rolled
+    back and replayed row by row so the failing rows can be reported individually.
+    Returns (inserted_count, errors) where errors is a list of {'row': n, 'error': message}.
+    """
+    inserted = 0
+    errors = []
+    batch = []
+
+    def flush(batch):
+        if not batch:
+            return 0
+
+        # executemany needs one statement shape, so group rows by their column set
+        groups = {}
+        for row_number, cleaned_data in batch:
+            groups.setdefault(tuple(cleaned_data.keys()), []).append((row_number, cleaned_data))
+
+        try:
+            inserted_keys = []
+            inserted_rows = []
+            with connection.cursor() as cursor:
+                for columns, group in groups.items():
+                    cols = ', '.join(f'`{col}`' for col in columns)
+                    placeholders = ', '.join(['%s'] * len(columns))
+                    sql = f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})"
+                    rows = [cleaned_data for _, cleaned_data in group]
+                    keys = insert_with_contributors(cursor, table_name, sql, rows)
+                    inserted_keys = None if keys is None or inserted_keys is None else inserted_keys + keys
+                    inserted_rows += rows
+            connection.commit()
+            changefeed.emit(changefeed.INSERT, table_name, inserted_keys, inserted_rows)
+            return len(batch)
+        except Exception as batch_error:
+            print(f"Error importing batch, retrying row by row: {batch_error}")
+            connection.rollback()
+
+        batch_inserted = 0
+        inserted_keys = []
+        inserted_rows = []
+        with connection.cursor() as cursor:
+            for row_number, cleaned_data in batch:
+                cols = ', '.join(f'`{col}`' for col in cleaned_data.keys())
+                placeholders = ', '.join(['%s'] * len(cleaned_data))
+                sql = f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})"
+                try:
+                    inserted_keys += insert_with_contributors(cursor, table_name, sql, [cleaned_data])
+                    inserted_rows.append(cleaned_data)
+                    batch_inserted += 1
+                except Exception as row_error:
+                    errors.append({'row': row_number, 'error': str(row_error)})
+        connection.commit()
+        if inserted_rows:
+            changefeed.emit(changefeed.INSERT, table_name, inserted_keys, inserted_rows)
+        return batch_inserted
+
+    for row_number, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            errors.append({'row': row_number, 'error': "Row is not an object."})
+            continue
+
+        unknown_columns = [key for key in record if key not in schema]
+        if unknown_columns:
+            errors.append({'row': row_number, 'error': f"Unknown columns: {', '.join(unknown_columns)}"})
+            continue
+
+        cleaned_data = clean_insert_data(table_name, schema, record, user)
+        if not cleaned_data:
+            errors.append({'row': row_number, 'error': "No valid data provided to add."})
+            continue
+
+        batch.append((row_number, cleaned_data))
+        if len(batch) >= batch_size:
+            inserted += flush(batch)
+            batch = []
+
+    inserted += flush(batch)
+    return inserted, errors
+
+
+@row.route('/<string:table_name>/import_rows', methods=['POST'])
+def import_rows(table_name):
+    """Bulk-inserts rows from an uploaded CSV file or JSON array and returns a per-row error report."""
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'No file uploaded.'}), 400
+
+    import_format = request.form.get('format') or ('json' if upload.filename.lower().endswith('.json') else 'csv')
+    batch_size = max(request.form.get('batch_size', IMPORT_BATCH_SIZE, type=int), 1)
+
+    try:
+        if import_format == 'json':
+            records = json.load(upload.stream)
+            if not isinstance(records, list):
+                return jsonify({'error': 'JSON imports must be an array of objects.'}), 400
+        elif import_format == 'csv':
+            # Read lazily so large files never have to be held in memory as rows
+            records = csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline=''))
+        else:
+            return jsonify({'error': f"Unsupported import format '{import_format}'."}), 400
+
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            schema = get_table_schema(connection, table_name)
+            inserted, errors = insert_rows_in_batches(connection, table_name, schema, records, session['db_user'], batch_size)
+    except Exception as e:
+        print(f"Error importing rows: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'inserted': inserted, 'errors': errors})
+
+
+def build_row_operation(table_name, schema, operation, user):
+    """Turns one batch operation into (kind, sql, params, pk_params, row_data), applying the same rules as the single-row endpoints.
+
+    `row_data` is the cleaned data for adds and the updated columns for updates. `pk_params` is None for adds.
+
+    Raises ValueError for operations that add_row, update_row or delete_row would have rejected.
+    """
+    kind = operation.get('op') if isinstance(operation, dict) else None
+    data = operation.get('data') if isinstance(operation, dict) else None
+    if kind not in ('add', 'update', 'delete') or not isinstance(data, dict):
+        raise ValueError("Each operation needs an 'op' of add, update or delete and a 'data' object.")
+
+    primary_key_config = PRIMARY_KEYS.get(table_name)
+    pk_columns = primary_key_config if isinstance(primary_key_config, list) else [primary_key_config]
+
+    if kind == 'add':
+        cleaned_data = clean_insert_data(table_name, schema, data, user)
+        if not cleaned_data:
+            raise ValueError("No valid data provided to add.")
+        cols = ', '.join(f'`{key}`' for key in cleaned_data.keys())
+        placeholders = ', '.join(['%s'] * len(cleaned_data))
+        return kind, f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})", list(cleaned_data.values()), None, cleaned_data
+
+    missing = [col for col in pk_columns if data.get(col) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing primary key for {kind}. Expected key: '{', '.join(missing)}'.")
+    pk_params = [data[col] for col in pk_columns]
+    where_clause = ' AND '.join(f"`{col}` = %s" for col in pk_columns)
+
+    if kind == 'update':
+        read_only_cols = READ_ONLY_COLUMNS.get(table_name, [])
+        updatable_data = {}
+        for key, value in data.items():
+            if key not in pk_columns and key not in read_only_cols:
+                updatable_data[key] = value if value != '' else None
+
+        if not updatable_data:
+            raise ValueError("No updatable data provided.")
+
+        set_clause = ', '.join(f'`{key}` = %s' for key in updatable_data.keys())
+        sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
+        values = list(updatable_data.values()) + pk_params
+
+        # Add write-only filtering if applicable
+        contributor_sql, contributor_params = get_contributor_filter(table_name, user)
+        if contributor_sql:
+            sql += f" AND {contributor_sql}"
+            values += contributor_params
+        return kind, sql, values, pk_params, updatable_data
+
+    return kind, f"DELETE FROM `{table_name}` WHERE {where_clause}", pk_params, pk_params, None
+
+
+def check_delete_ownership(cursor, table_name, pk_params_list, user):
+    """Verifies the user owns (is the first contributor of) every row about to be deleted from a write-only table."""
+    primary_key_config = PRIMARY_KEYS.get(table_name)
+    pk_columns = primary_key_config if isinstance(primary_key_config, list) else [primary_key_config]
+    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+
+    owners = {}
+    for start in range(0, len(pk_params_list), IN_CLAUSE_CHUNK_SIZE):
+        chunk = pk_params_list[start:start + IN_CLAUSE_CHUNK_SIZE]
+        cols_sql = ', '.join(f'`{col}`' for col in pk_columns + [contributor_column])
+        sql = f"SELECT {cols_sql} FROM `{table_name}` WHERE {build_rows_match(pk_columns, len(chunk))}"
+        cursor.execute(sql, tuple(value for pk_params in chunk for value in pk_params))
+        for existing_row in cursor.fetchall():
+            key = tuple(str(existing_row[col]) for col in pk_columns)
+            owners[key] = existing_row[contributor_column]
+
+    for pk_params in pk_params_list:
+        key = tuple(str(value) for value in pk_params)
+        if key not in owners:
+            raise ValueError(f"Row not found: {'/'.join(key)}")
+        contributors = owners[key]
+        if not contributors:
+            raise ValueError(f"No contributors found for this row: {'/'.join(key)}")
+        contributors_list = [c.strip() for c in contributors.split(',')]
+        if contributors_list[0] != user:
+            raise ValueError(f"Only the owner can delete this row: {'/'.join(key)}")
+
+
+@row.route('/<string:table_name>/batch_rows', methods=['POST'])
+def batch_rows(table_name):
+    """Applies a list of add, update and delete operations to a table in a single transaction.
+
+    Expects JSON of the form {"operations": [{"op": "add" | "update" | "delete", "data": {...}}, ...]}.
+    Consecutive operations that produce the same statement are sent as one executemany call.
+    Either every operation is applied or, on the first failure, none are.
+    """
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    payload = request.get_json(silent=True) or {}
+    operations = payload.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': "Expected a non-empty 'operations' list."}), 400
+
+    user = session['db_user']
+
+    try:
+        with pooled_connection(user, session['db_password']) as connection:
+            schema = get_table_schema(connection, table_name)
+
+            # Group consecutive operations with the same statement shape, keeping their order
+            groups = []
+            for index, operation in enumerate(operations):
+                try:
+                    kind, sql, params, pk_params, row_data = build_row_operation(table_name, schema, operation, user)
+                except ValueError as e:
+                    return jsonify({'error': str(e), 'operation': index}), 400
+                if groups and groups[-1]['sql'] == sql:
+                    group = groups[-1]
+                else:
+                    group = {'kind': kind, 'sql': sql, 'params': [], 'keys': [], 'rows': [], 'indexes': []}
+                    groups.append(group)
+                group['params'].append(params)
+                group['keys'].append(pk_params)
+                group['rows'].append(row_data)
+                group['indexes'].append(index)
+
+            try:
+                events = []  # (kind, keys, values) per group, emitted once the batch has committed
+                with connection.cursor() as cursor:
+                    for group in groups:
+                        if group['kind'] == 'delete' and table_name in WRITE_ONLY_CONFIG:
+                            # Checked per group so rows added earlier in the batch are visible
+                            check_delete_ownership(cursor, table_name, group['keys'], user)
+
+                        if group['kind'] == 'add':
+                            keys = insert_with_contributors(cursor, table_name, group['sql'], group['rows'])
+                            events.append((changefeed.INSERT, keys, group['rows']))
+                        elif len(group['params']) == 1:
+                            cursor.execute(group['sql'], group['params'][0])
+                        else:
+                            cursor.executemany(group['sql'], group['params'])
+
+                        # Keep the normalized contributor table in step with the main table
+                        if group['kind'] == 'delete':
+                            delete_contributors(cursor, table_name, group['keys'])
+                        elif group['kind'] == 'update' and table_name in WRITE_ONLY_CONFIG:
+                            contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+                            if contributor_column in group['rows'][0]:
+                                resync_contributors(cursor, table_name, group['keys'])
+
+                        if group['kind'] == 'update':
+                            events.append((changefeed.UPDATE, group['keys'], group['rows']))
+                        elif group['kind'] == 'delete':
+                            events.append((changefeed.DELETE, group['keys'], None))
+                connection.commit()
+                for kind, keys, values in events:
+                    changefeed.emit(kind, table_name, keys, values)
+            except Exception as e:
+                connection.rollback()
+                print(f"Error applying batch operations: {e}")
+                return jsonify({'error': str(e), 'operations': group['indexes']}), 400
+
+    except Exception as e:
+        print(f"Error applying batch operations: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({'success': True, 'applied': len(operations), 'statements': len(groups)})
+
+
 @row.route('/<string:table_name>/update_row', methods=['POST'])
 def update_row(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            data = request.form.to_dict()
-            schema = get_table_schema(connection, table_name)
-            primary_key_config = PRIMARY_KEYS.get(table_name)
-
-            read_only_cols = READ_ONLY_COLUMNS.get(table_name, [])
-
-            # Separate the primary key(s) from the updatable data
-            updatable_data = {}
-            pk_values = {}
-
-            if isinstance(primary_key_config, list):
-                # Composite key
-                for key, value in data.items():
-                    if key in primary_key_config:
-                        pk_values[key] = value
-                    elif key not in read_only_cols:
-                        updatable_data[key] = value if value != '' else None
-            else:
-                # Single key
-                primary_key = primary_key_config
-                pk_values[primary_key] = data.pop(primary_key)
-                for key, value in data.items():
-                    if key not in read_only_cols:
-                        updatable_data[key] = value if value != '' else None
-
-            if not updatable_data:
-                 return redirect(url_for('dbview.index', table_name=table_name, error="No updatable data provided."))
-
-            set_clause = ', '.join(f'`{key}` = %s' for key in updatable_data.keys())
-
-            # Add write-only filtering if applicable
-            if table_name in WRITE_ONLY_CONFIG:
-                contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                data = request.form.to_dict()
+                schema = get_table_schema(connection, table_name)
+                primary_key_config = PRIMARY_KEYS.get(table_name)
+
+                read_only_cols = READ_ONLY_COLUMNS.get(table_name, [])
+
+                # Separate the primary key(s) from the updatable data
+                updatable_data = {}
+                pk_values = {}
 
                 if isinstance(primary_key_config, list):
-                    where_clauses = [f"`{col}` = %s" for col in primary_key_config]
-                    where_clauses.append(f"`{contributor_column}` LIKE %s")
-                    where_clause = ' AND '.join(where_clauses)
-                    sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
-                    values = list(updatable_data.values()) + [pk_values[col] for col in primary_key_config] + [f"%{session['db_user']}%"]
+                    # Composite key
+                    for key, value in data.items():
+                        if key in primary_key_config:
+                            pk_values[key] = value
+                        elif key not in read_only_cols:
+                            updatable_data[key] = value if value != '' else None
                 else:
-                    where_clause = f"`{primary_key_config}` = %s AND `{contributor_column}` LIKE %s"
-                    sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
-                    values = list(updatable_data.values()) + [pk_values[primary_key_config], f"%{session['db_user']}%"]
-            else:
-                if isinstance(primary_key_config, list):
-                    where_clauses = [f"`{col}` = %s" for col in primary_key_config]
-                    where_clause = ' AND '.join(where_clauses)
-                    sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
-                    values = list(updatable_data.values()) + [pk_values[col] for col in primary_key_config]
+                    # Single key
+                    primary_key = primary_key_config
+                    pk_values[primary_key] = data.pop(primary_key)
+                    for key, value in data.items():
+                        if key not in read_only_cols:
+                            updatable_data[key] = value if value != '' else None
+
+                if not updatable_data:
+                     return redirect(url_for('dbview.index', table_name=table_name, error="No updatable data provided."))
+
+                set_clause = ', '.join(f'`{key}` = %s' for key in updatable_data.keys())
+
+                # Add write-only filtering if applicable
+                if table_name in WRITE_ONLY_CONFIG:
+                    contributor_sql, contributor_params = get_contributor_filter(table_name, session['db_user'])
+
+                    if isinstance(primary_key_config, list):
+                        where_clauses = [f"`{col}` = %s" for col in primary_key_config]
+                        where_clauses.append(contributor_sql)
+                        where_clause = ' AND '.join(where_clauses)
+                        sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
+                        values = list(updatable_data.values()) + [pk_values[col] for col in primary_key_config] + contributor_params
+                    else:
+                        where_clause = f"`{primary_key_config}` = %s AND {contributor_sql}"
+                        sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
+                        values = list(updatable_data.values()) + [pk_values[primary_key_config]] + contributor_params
                 else:
-                    where_clause = f"`{primary_key_config}` = %s"
-                    sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
-                    values = list(updatable_data.values())
-                    values.append(pk_values[primary_key_config])
-
-            cursor.execute(sql, values)
-        connection.commit()
+                    if isinstance(primary_key_config, list):
+                        where_clauses = [f"`{col}` = %s" for col in primary_key_config]
+                        where_clause = ' AND '.join(where_clauses)
+                        sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
+                        values = list(updatable_data.values()) + [pk_values[col] for col in primary_key_config]
+                    else:
+                        where_clause = f"`{primary_key_config}` = %s"
+                        sql = f"UPDATE `{table_name}` SET {set_clause} WHERE {where_clause}"
+                        values = list(updatable_data.values())
+                        values.append(pk_values[primary_key_config])
+
+                cursor.execute(sql, values)
+
+                # Keep the normalized contributor table in step if the contributor list was edited
+                if table_name in WRITE_ONLY_CONFIG and WRITE_ONLY_CONFIG[table_name]['contributor_column'] in updatable_data:
+                    pk_columns = primary_key_config if isinstance(primary_key_config, list) else [primary_key_config]
+                    resync_contributors(cursor, table_name, [[pk_values[col] for col in pk_columns]])
+            connection.commit()
+            changefeed.emit(changefeed.UPDATE, table_name, [[pk_values[col] for col in get_primary_key_columns(table_name)]], [updatable_data])
     except Exception as e:
         print(f"Error updating row: {e}")
         return redirect(url_for('dbview.index', table_name=table_name, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.index', table_name=table_name))
 
 
 @row.route('/<string:table_name>/delete_row', methods=['POST'])
 def delete_row(table_name):
-    connection = None
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        with connection.cursor() as cursor:
-            primary_key_config = PRIMARY_KEYS.get(table_name)
-
-            # Check if the table is write-only and enforce owner-only deletion
-            if table_name in WRITE_ONLY_CONFIG:
-                contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-
-                if is_composite_pk(table_name):
-                    # Handle composite primary key
-                    where_clauses = []
-                    values = []
-                    for pk_col in primary_key_config:
-                        row_id = request.form.get(pk_col)
-                        if not row_id:
-                            return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing part of composite key for deletion. Expected key: '{pk_col}'"))
-                        where_clauses.append(f"`{pk_col}` = %s")
-                        values.append(row_id)
-
-                    # First, check if the row exists and get the current contributors
-                    where_clause = ' AND '.join(where_clauses)
-                    check_sql = f"SELECT `{contributor_column}` FROM `{table_name}` WHERE {where_clause}"
-                    cursor.execute(check_sql, tuple(values))
-                    row = cursor.fetchone()
-
-                    if not row:
-                        return redirect(url_for('dbview.index', table_name=table_name, error="Row not found."))
-
-                    # Check if current user is the owner (first contributor)
-                    contributors = row[contributor_column]
-                    if contributors:
-                        contributors_list = [c.strip() for c in contributors.split(',')]
-                        if not contributors_list or contributors_list[0] != session['db_user']:
-                            return redirect(url_for('dbview.index', table_name=table_name, error="Only the owner can delete this row."))
-                    else:
-                        return redirect(url_for('dbview.index', table_name=table_name, error="No contributors found for this row."))
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            with connection.cursor() as cursor:
+                primary_key_config = PRIMARY_KEYS.get(table_name)
+
+                # Check if the table is write-only and enforce owner-only deletion
+                if table_name in WRITE_ONLY_CONFIG:
+                    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+
+                    if is_composite_pk(table_name):
+                        # Handle composite primary key
+                        where_clauses = []
+                        values = []
+                        for pk_col in primary_key_config:
+                            row_id = request.form.get(pk_col)
+                            if not row_id:
+                                return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing part of composite key for deletion. Expected key: '{pk_col}'"))
+                            where_clauses.append(f"`{pk_col}` = %s")
+                            values.append(row_id)
+
+                        # First, check if the row exists and get the current contributors
+                        where_clause = ' AND '.join(where_clauses)
+                        check_sql = f"SELECT `{contributor_column}` FROM `{table_name}` WHERE {where_clause}"
+                        cursor.execute(check_sql, tuple(values))
+                        row = cursor.fetchone()
+
+                        if not row:
+                            return redirect(url_for('dbview.index', table_name=table_name, error="Row not found."))
+
+                        # Check if current user is the owner (first contributor)
+                        contributors = row[contributor_column]
+                        if contributors:
+                            contributors_list = [c.strip() for c in contributors.split(',')]
+                            if not contributors_list or contributors_list[0] != session['db_user']:
+                                return redirect(url_for('dbview.index', table_name=table_name, error="Only the owner can delete this row."))
+                        else:
+                            return redirect(url_for('dbview.index', table_name=table_name, error="No contributors found for this row."))
 
-                    # If we get here, user is the owner - proceed with deletion
-                    sql = f"DELETE FROM `{table_name}` WHERE {where_clause}"
-                    cursor.execute(sql, tuple(values))
+                        # If we get here, user is the owner - proceed with deletion
+                        sql = f"DELETE FROM `{table_name}` WHERE {where_clause}"
+                        cursor.execute(sql, tuple(values))
+                        delete_contributors(cursor, table_name, [values])
 
-                else:
-                    # Handle single primary key
-                    primary_key = primary_key_config
-                    row_id = request.form.get(primary_key)
-                    if not row_id:
-                        return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing primary key for deletion. Expected key: '{primary_key}'."))
-
-                    # First, check if the row exists and get the current contributors
-                    check_sql = f"SELECT `{contributor_column}` FROM `{table_name}` WHERE `{primary_key}` = %s"
-                    cursor.execute(check_sql, (row_id,))
-                    row = cursor.fetchone()
-
-                    if not row:
-                        return redirect(url_for('dbview.index', table_name=table_name, error="Row not found."))
-
-                    # Check if current user is the owner (first contributor)
-                    contributors = row[contributor_column]
-                    if contributors:
-                        contributors_list = [c.strip() for c in contributors.split(',')]
-                        if not contributors_list or contributors_list[0] != session['db_user']:
-                            return redirect(url_for('dbview.index', table_name=table_name, error="Only the owner can delete this row."))
                     else:
-                        return redirect(url_for('dbview.index', table_name=table_name, error="No contributors found for this row."))
-
-                    # If we get here, user is the owner - proceed with deletion
-                    sql = f"DELETE FROM `{table_name}` WHERE `{primary_key}` = %s"
-                    cursor.execute(sql, (row_id,))
-            else:
-                # Non-write-only tables - use original logic (no ownership restrictions)
-                if is_composite_pk(table_name):
-                    # Handle composite primary key
-                    where_clauses = []
-                    values = []
-                    for pk_col in primary_key_config:
-                        row_id = request.form.get(pk_col)
+                        # Handle single primary key
+                        primary_key = primary_key_config
+                        row_id = request.form.get(primary_key)
                         if not row_id:
-                            return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing part of composite key for deletion. Expected key: '{pk_col}'"))
-                        where_clauses.append(f"`{pk_col}` = %s")
-                        values.append(row_id)
+                            return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing primary key for deletion. Expected key: '{primary_key}'."))
+
+                        # First, check if the row exists and get the current contributors
+                        check_sql = f"SELECT `{contributor_column}` FROM `{table_name}` WHERE `{primary_key}` = %s"
+                        cursor.execute(check_sql, (row_id,))
+                        row = cursor.fetchone()
+
+                        if not row:
+                            return redirect(url_for('dbview.index', table_name=table_name, error="Row not found."))
+
+                        # Check if current user is the owner (first contributor)
+                        contributors = row[contributor_column]
+                        if contributors:
+                            contributors_list = [c.strip() for c in contributors.split(',')]
+                            if not contributors_list or contributors_list[0] != session['db_user']:
+                                return redirect(url_for('dbview.index', table_name=table_name, error="Only the owner can delete this row."))
+                        else:
+                            return redirect(url_for('dbview.index', table_name=table_name, error="No contributors found for this row."))
 
-                    sql = f"DELETE FROM `{table_name}` WHERE {' AND '.join(where_clauses)}"
-                    cursor.execute(sql, tuple(values))
+                        # If we get here, user is the owner - proceed with deletion
+                        sql = f"DELETE FROM `{table_name}` WHERE `{primary_key}` = %s"
+                        cursor.execute(sql, (row_id,))
+                        delete_contributors(cursor, table_name, [[row_id]])
                 else:
-                    # Handle single primary key
-                    primary_key = primary_key_config
-                    row_id = request.form.get(primary_key)
-                    if not row_id:
-                        return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing primary key for deletion. Expected key: '{primary_key}'."))
+                    # Non-write-only tables - use original logic (no ownership restrictions)
+                    if is_composite_pk(table_name):
+                        # Handle composite primary key
+                        where_clauses = []
+                        values = []
+                        for pk_col in primary_key_config:
+                            row_id = request.form.get(pk_col)
+                            if not row_id:
+                                return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing part of composite key for deletion. Expected key: '{pk_col}'"))
+                            where_clauses.append(f"`{pk_col}` = %s")
+                            values.append(row_id)
+
+                        sql = f"DELETE FROM `{table_name}` WHERE {' AND '.join(where_clauses)}"
+                        cursor.execute(sql, tuple(values))
+                    else:
+                        # Handle single primary key
+                        primary_key = primary_key_config
+                        row_id = request.form.get(primary_key)
+                        if not row_id:
+                            return redirect(url_for('dbview.index', table_name=table_name, error=f"Error: Missing primary key for deletion. Expected key: '{primary_key}'."))
 
-                    sql = f"DELETE FROM `{table_name}` WHERE `{primary_key}` = %s"
-                    cursor.execute(sql, (row_id,))
+                        sql = f"DELETE FROM `{table_name}` WHERE `{primary_key}` = %s"
+                        cursor.execute(sql, (row_id,))
 
-        connection.commit()
+            connection.commit()
+            changefeed.emit(changefeed.DELETE, table_name, [[request.form.get(col) for col in get_primary_key_columns(table_name)]])
     except Exception as e:
         print(f"Error deleting row: {e}")
         return redirect(url_for('dbview.index', table_name=table_name, error=str(e)))
-    finally:
-        if connection:
-            connection.close()
 
     return redirect(url_for('dbview.index', table_name=table_name))
\ No newline at end of file
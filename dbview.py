@@ -1,20 +1,104 @@
-from config import COLUMN_WIDTHS, MANY_TO_MANY_CONFIG, PRIMARY_KEYS, READ_ONLY_COLUMNS, TABLES_TO_SHOW, VISIBLE_COLUMNS, WRITE_ONLY_CONFIG
-from functions import get_db_connection, get_foreign_key_display_text, get_table_schema
-from flask import Blueprint, redirect, render_template, request, send_file, session, url_for
+from config import COLUMN_WIDTHS, EXPORT_CHUNK_ROWS, JUNCTION_QUERY_WORKERS, MANY_TO_MANY_CONFIG, PRIMARY_KEYS, READ_ONLY_COLUMNS, TABLES_TO_SHOW, WRITE_ONLY_CONFIG
+from functions import (
+    build_keyset_condition, clamp_page_size, decode_page_cursor, encode_page_cursor, format_server_timing,
+    get_connection_pool, get_contributor_filter, get_foreign_key_display_texts, get_primary_key_columns,
+    get_table_schema, get_visible_columns, pooled_connection
+)
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, jsonify, make_response, redirect, render_template, request, send_file, session, url_for
 import networkx as nx
+import pymysql
+import csv
+import io
 import json
+import queue
+import time
 
 dbview = Blueprint('dbview', __name__)
 
+
+def load_table_page(connection, table_name, schema, user, after=None, page_size=None):
+    """Fetches one page of a table in primary key order, plus foreign key display data for it.
+
+    `after` holds the primary key values of the last row of the previous page (keyset paging),
+    so each page is an index range scan no matter how deep into the table it is.
+    Returns (columns_to_display, data, fk_display_data, next_cursor).
+    """
+    page_size = clamp_page_size(page_size)
+    pk_columns = get_primary_key_columns(table_name)
+    fk_display_data = {}
+
+    with connection.cursor() as cursor:
+        # Use configured visible columns or all schema columns (which leave out HIDDEN_COLUMNS).
+        # The primary key is always fetched since row links and the next cursor are built from it
+        columns_to_display = get_visible_columns(table_name, schema)
+        select_columns = columns_to_display + [pk for pk in pk_columns if pk not in columns_to_display]
+        cols_sql = ', '.join([f'`{col}`' for col in select_columns])
+
+        where_clauses = []
+        params = []
+
+        # If write-only, filter rows by contributor
+        contributor_sql, contributor_params = get_contributor_filter(table_name, user)
+        if contributor_sql:
+            where_clauses.append(contributor_sql)
+            params.extend(contributor_params)
+
+        if after is not None:
+            keyset_sql, keyset_params = build_keyset_condition(pk_columns, after)
+            where_clauses.append(keyset_sql)
+            params.extend(keyset_params)
+
+        sql = f"SELECT {cols_sql} FROM `{table_name}`"
+        if where_clauses:
+            sql += " WHERE " + " AND ".join(where_clauses)
+        sql += " ORDER BY " + ", ".join(f"`{pk}`" for pk in pk_columns) + " LIMIT %s"
+
+        # Fetch one extra row to find out whether there is a next page
+        cursor.execute(sql, tuple(params + [page_size + 1]))
+        data = cursor.fetchall()
+
+    next_cursor = None
+    if len(data) > page_size:
+        data = data[:page_size]
+        next_cursor = encode_page_cursor([data[-1][pk] for pk in pk_columns])
+
+    # Get foreign key display data for each row
+    if data:
+        fk_columns = [col for col in columns_to_display if schema[col].get('is_foreign_key')]
+
+        # Resolve every distinct value of each foreign key column in bulk
+        display_texts = {
+            col: get_foreign_key_display_texts(
+                connection, table_name, col,
+                [row[col] for row in data if row[col] is not None]
+            )
+            for col in fk_columns
+        }
+
+        for row in data:
+            # Create row identifier
+            row_id = '/'.join(str(row[pk]) for pk in pk_columns)
+
+            fk_display_data[row_id] = {}
+
+            # Get display text for each foreign key column in this row
+            for col in fk_columns:
+                if row[col] is not None:
+                    fk_display_data[row_id][col] = display_texts[col][row[col]]
+
+    return columns_to_display, data, fk_display_data, next_cursor
+
+
 @dbview.route('/<string:table_name>')
 def index(table_name):
     """Displays the main database table view."""
-    connection = None
     data = []
     columns_to_display = []
     schema = {}
     error = None
     fk_display_data = {}
+    next_cursor = None
 
     if table_name not in TABLES_TO_SHOW:
         error = f"Error: Table '{table_name}' is not configured to be shown."
@@ -25,66 +109,27 @@ def index(table_name):
 
     error = request.args.get('error')
 
-    try:
-        connection = get_db_connection(
-            session['db_user'],
-            session['db_password']
-        )
-
-        schema = get_table_schema(connection, table_name)
-
-        with connection.cursor() as cursor:
-            visible_cols_config = VISIBLE_COLUMNS.get(table_name)
-
-            # Use configured visible columns or all columns if not specified
-            if visible_cols_config:
-                columns_to_display = [col for col in visible_cols_config if col in schema]
-                cols_sql = ', '.join([f'`{col}`' for col in columns_to_display])
-            else:
-                columns_to_display = [col for col in schema.keys()]
-                cols_sql = '*'
+    after = None
+    if request.args.get('after'):
+        try:
+            after = decode_page_cursor(request.args['after'], len(get_primary_key_columns(table_name)))
+        except ValueError as e:
+            error = str(e)
 
-            # Check if the table is write-only
-            is_write_only = table_name in WRITE_ONLY_CONFIG
-
-            sql = f"SELECT {cols_sql} FROM `{table_name}`"
-
-            # If write-only, filter rows by contributor
-            if is_write_only:
-                contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-                sql += f" WHERE `{contributor_column}` LIKE %s"
-                cursor.execute(sql, (f"%{session['db_user']}%",))
-            else:
-                cursor.execute(sql)
-
-            data = cursor.fetchall()
-
-            # Get foreign key display data for each row
-            if data:
-                primary_key_config = PRIMARY_KEYS.get(table_name)
-                for row in data:
-                    # Create row identifier
-                    if isinstance(primary_key_config, list):
-                        row_id = '/'.join(str(row[pk]) for pk in primary_key_config)
-                    else:
-                        row_id = str(row[primary_key_config])
-
-                    fk_display_data[row_id] = {}
-
-                    # Get display text for each foreign key column in this row
-                    for col in columns_to_display:
-                        if schema[col].get('is_foreign_key') and row[col] is not None:
-                            display_text = get_foreign_key_display_text(connection, table_name, col, row[col])
-                            fk_display_data[row_id][col] = display_text
+    try:
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            schema = get_table_schema(connection, table_name)
+            columns_to_display, data, fk_display_data, next_cursor = load_table_page(
+                connection, table_name, schema, session['db_user'],
+                after=after,
+                page_size=request.args.get('page_size', type=int)
+            )
 
     except Exception as e:
         error = f"Error connecting to or querying the database: {e}"
         print(error)
         session.clear()
         return redirect(url_for('base_routes.login', error=error))
-    finally:
-        if connection:
-            connection.close()
 
     return render_template(
         'index.html',
@@ -99,34 +144,344 @@ def index(table_name):
         many_to_many_config=MANY_TO_MANY_CONFIG.get(table_name),
         write_only_config=WRITE_ONLY_CONFIG.get(table_name),
         read_only_columns=READ_ONLY_COLUMNS.get(table_name, []),
-        fk_display_data=fk_display_data
+        fk_display_data=fk_display_data,
+        next_cursor=next_cursor,
+        page_size=request.args.get('page_size', type=int)
+    )
+
+
+@dbview.route('/table_rows/<string:table_name>')
+def table_rows(table_name):
+    """Returns one page of rows as JSON, so the table view can load more rows incrementally."""
+    if table_name not in TABLES_TO_SHOW:
+        return jsonify({'error': f"Table '{table_name}' is not configured to be shown."}), 404
+
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    after = None
+    if request.args.get('after'):
+        try:
+            after = decode_page_cursor(request.args['after'], len(get_primary_key_columns(table_name)))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    try:
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            schema = get_table_schema(connection, table_name)
+            columns_to_display, data, fk_display_data, next_cursor = load_table_page(
+                connection, table_name, schema, session['db_user'],
+                after=after,
+                page_size=request.args.get('page_size', type=int)
+            )
+    except Exception as e:
+        print(f"Error loading table rows: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    sent_columns = columns_to_display + [pk for pk in get_primary_key_columns(table_name) if pk not in columns_to_display]
+    return jsonify({
+        'columns': columns_to_display,
+        'primary_key': PRIMARY_KEYS.get(table_name),
+        # Values are sent the way the template renders them, so appended rows look the same
+        'rows': [{col: None if row[col] is None else str(row[col]) for col in sent_columns} for row in data],
+        'fk_display_data': fk_display_data,
+        'next_cursor': next_cursor
+    })
+
+
+@dbview.route('/export/<string:table_name>')
+def export_table(table_name):
+    """Streams a table as CSV or NDJSON through a server-side cursor, so memory use stays flat."""
+    if table_name not in TABLES_TO_SHOW:
+        return f"Error: Table '{table_name}' is not configured to be shown.", 404
+
+    if 'db_user' not in session:
+        return redirect(url_for('base_routes.login'))
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return f"Error: Unsupported export format '{export_format}'.", 400
+
+    user = session['db_user']
+    password = session['db_password']
+
+    # Resolve the schema before streaming starts, so failures produce a proper error response
+    try:
+        with pooled_connection(user, password) as connection:
+            schema = get_table_schema(connection, table_name)
+    except Exception as e:
+        print(f"Error exporting table: {e}")
+        return f"Error: {e}", 500
+
+    # Columns are always listed explicitly so HIDDEN_COLUMNS never leak through a SELECT *
+    columns = get_visible_columns(table_name, schema)
+    sql = f"SELECT {', '.join(f'`{col}`' for col in columns)} FROM `{table_name}`"
+    contributor_sql, params = get_contributor_filter(table_name, user)
+    if contributor_sql:
+        sql += f" WHERE {contributor_sql}"
+
+    def generate():
+        # If the client disconnects, the generator is closed mid-stream and pooled_connection
+        # discards the connection rather than draining the rest of the result set
+        with pooled_connection(user, password) as connection:
+            cursor = connection.cursor(pymysql.cursors.SSCursor)
+            cursor.execute(sql, tuple(params))
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if export_format == 'csv':
+                writer.writerow(columns)
+
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                for row in rows:
+                    if export_format == 'csv':
+                        writer.writerow(row)
+                    else:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=str) + '\n')
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+
+            if buffer.tell():
+                yield buffer.getvalue()
+            cursor.close()
+
+    if export_format == 'csv':
+        mimetype = 'text/csv'
+    else:
+        mimetype = 'application/x-ndjson'
+
+    return Response(
+        generate(),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{table_name}.{export_format}"'}
+    )
+
+
+def build_related_rows_query(table_name, junction_data):
+    """Builds the (sql, column_aliases) listing the related rows of one show_multiple_rows relationship."""
+    config = junction_data['config']
+    fk_self = config['fk_self']
+    fk_other = config['fk_other']
+    other_table = config['other_table']
+    other_display_column = config['other_display_column']
+    other_pk = get_primary_key_columns(other_table)[0]  # Use first column for composite keys
+
+    # Fetch all junction table rows with related table data
+    junction_columns = [f"j.`{col}`" for col in [fk_self, fk_other] + config.get('extra_columns', [])]
+    other_columns = [f"t2.`{other_pk}` as other_pk", f"t2.`{other_display_column}` as other_display"]
+
+    # Add more columns from other table for self-references
+    if other_table == table_name:
+        # For self-references, get more detail columns
+        other_detail_columns = [col for col in junction_data['other_table_schema'].keys()
+                              if col not in [other_pk, other_display_column]][:3]  # Limit to 3 extra columns
+        for col in other_detail_columns:
+            other_columns.append(f"t2.`{col}` as other_{col}")
+
+    return (
+        f"SELECT {', '.join(junction_columns + other_columns)} "
+        f"FROM `{config['junction_table']}` AS j "
+        f"JOIN `{other_table}` AS t2 ON j.`{fk_other}` = t2.`{other_pk}` "
+        f"WHERE j.`{fk_self}` = %s"
     )
 
 
+def related_items_signature(junction_data):
+    """Returns the (type, collation) of the columns a relationship's related items query selects, or None if unknown."""
+    config = junction_data['config']
+    schema = junction_data['other_table_schema']
+    columns = [get_primary_key_columns(config['other_table'])[0], config['other_display_column']]
+    if any(col not in schema for col in columns):
+        return None
+    return tuple((schema[col]['type'], schema[col].get('collation')) for col in columns)
+
+
+def build_related_items_query(junction_datas):
+    """Builds one UNION ALL query listing the related items of several simple relationships.
+
+    Each branch is tagged with the position of its relationship in `junction_datas`, and the
+    columns are aliased to common names so the branches line up. The relationships must have
+    the same related_items_signature, as MySQL converts columns of different types to a common
+    one and rejects differing collations.
+    """
+    branches = []
+    for position, junction_data in enumerate(junction_datas):
+        config = junction_data['config']
+        other_pk = get_primary_key_columns(config['other_table'])[0]
+        branches.append(
+            f"SELECT {position} AS `__relationship`, t2.`{other_pk}` AS `__other_pk`, "
+            f"t2.`{config['other_display_column']}` AS `__other_display` "
+            f"FROM `{config['junction_table']}` AS j "
+            f"JOIN `{config['other_table']}` AS t2 ON j.`{config['fk_other']}` = t2.`{other_pk}` "
+            f"WHERE j.`{config['fk_self']}` = %s"
+        )
+    return ' UNION ALL '.join(branches)
+
+
+def load_junction_rows(connection, user, password, table_name, all_junction_data, main_pk_value):
+    """Fills in junction_data['rows'] for every relationship of a row and returns the summed query time.
+
+    Relationships that only list the other table's display column share a UNION ALL query with
+    those whose columns have the same types and collations. Those with show_multiple_rows have
+    their own column lists and get one query each. When that
+    leaves more than one query, they run concurrently on `connection` and up to
+    JUNCTION_QUERY_WORKERS - 1 more pooled connections, as many as are free right away, so a
+    request already holding `connection` never waits on the pool for more.
+    """
+    simple = [jd for jd in all_junction_data if not jd['config'].get('show_multiple_rows', False)]
+    detailed = [jd for jd in all_junction_data if jd['config'].get('show_multiple_rows', False)]
+
+    groups = {}  # related_items_signature, or position when unknown -> simple relationships
+    for position, junction_data in enumerate(simple):
+        signature = related_items_signature(junction_data)
+        groups.setdefault(position if signature is None else signature, []).append(junction_data)
+
+    queries = []  # (sql, params, junction_datas the rows belong to, whether rows are tagged by relationship)
+    for group in groups.values():
+        queries.append((build_related_items_query(group), [main_pk_value] * len(group), group, True))
+    for junction_data in detailed:
+        queries.append((build_related_rows_query(table_name, junction_data), [main_pk_value], [junction_data], False))
+
+    def run_query(query_connection, sql, params):
+        started = time.perf_counter()
+        with query_connection.cursor() as cursor:
+            cursor.execute(sql, tuple(params))
+            rows = cursor.fetchall()
+        return rows, time.perf_counter() - started
+
+    extra = []  # connections borrowed for this call besides `connection`
+    if len(queries) > 1 and JUNCTION_QUERY_WORKERS > 1:
+        pool = get_connection_pool(user, password)
+        while len(extra) < min(JUNCTION_QUERY_WORKERS, len(queries)) - 1:
+            extra_connection = pool.try_acquire()
+            if extra_connection is None:
+                break
+            extra.append(extra_connection)
+
+    if extra:
+        # One worker per connection, each taking a free connection for every query it runs
+        free = queue.Queue()
+        for query_connection in [connection] + extra:
+            free.put(query_connection)
+
+        def run_on_free(query):
+            query_connection = free.get()
+            try:
+                return run_query(query_connection, query[0], query[1])
+            finally:
+                free.put(query_connection)
+
+        failed = True
+        try:
+            with ThreadPoolExecutor(max_workers=len(extra) + 1) as executor:
+                results = list(executor.map(run_on_free, queries))
+            failed = False
+        finally:
+            for query_connection in extra:
+                pool.release(query_connection, discard=failed)
+    else:
+        results = [run_query(connection, sql, params) for sql, params, _, _ in queries]
+
+    for (sql, params, junction_datas, tagged), (rows, _) in zip(queries, results):
+        if tagged:
+            # Split the tagged rows back out, keyed by the real column names like a per-relationship query
+            for junction_data in junction_datas:
+                junction_data['rows'] = []
+            for row in rows:
+                junction_data = junction_datas[row['__relationship']]
+                other_pk = get_primary_key_columns(junction_data['config']['other_table'])[0]
+                junction_data['rows'].append({
+                    other_pk: row['__other_pk'],
+                    junction_data['config']['other_display_column']: row['__other_display']
+                })
+        else:
+            junction_datas[0]['rows'] = rows
+
+    return sum(seconds for _, seconds in results)
+
+
 @dbview.route('/<string:table_name>/<path:row_id>')
 def expanded_view(table_name, row_id):
-    connection = None
     error = request.args.get('error')
     row_data = None
     all_junction_data = []  # Changed to support multiple junction configurations
+    timings = []  # (name, seconds, description) for the Server-Timing header
 
     if 'db_user' not in session:
         return redirect(url_for('base_routes.login'))
 
+    started = time.perf_counter()
     try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-        schema = get_table_schema(connection, table_name)
-
-        with connection.cursor() as cursor:
-            # 1. Fetch the main row data with proper permission checking
-            primary_key_config = PRIMARY_KEYS.get(table_name)
-
-            # Handle composite vs single primary key
-            if isinstance(primary_key_config, list):
-                # Composite primary key - parse the row_id parameter
-                pk_parts = row_id.split('/')
-                if len(pk_parts) != len(primary_key_config):
-                    error = f"Invalid composite primary key format. Expected {len(primary_key_config)} parts, got {len(pk_parts)}"
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            schema = get_table_schema(connection, table_name)
+
+            with connection.cursor() as cursor:
+                # 1. Fetch the main row data with proper permission checking
+                primary_key_config = PRIMARY_KEYS.get(table_name)
+
+                # Handle composite vs single primary key
+                if isinstance(primary_key_config, list):
+                    # Composite primary key - parse the row_id parameter
+                    pk_parts = row_id.split('/')
+                    if len(pk_parts) != len(primary_key_config):
+                        error = f"Invalid composite primary key format. Expected {len(primary_key_config)} parts, got {len(pk_parts)}"
+                        return render_template(
+                            'expanded_view.html',
+                            table_name=table_name,
+                            row_data=None,
+                            schema=schema,
+                            error=error,
+                            primary_key=primary_key_config,
+                            all_junction_data=[],
+                            tables=TABLES_TO_SHOW,
+                            write_only_config=WRITE_ONLY_CONFIG.get(table_name)
+                        )
+
+                    # Build WHERE clause for composite key
+                    where_clauses = [f"`{col}` = %s" for col in primary_key_config]
+                    pk_values = pk_parts
+
+                    # CRITICAL: Check if the table is write-only and apply proper filtering
+                    contributor_sql, contributor_params = get_contributor_filter(table_name, session['db_user'])
+                    if contributor_sql:
+                        where_clauses.append(contributor_sql)
+                        pk_values.extend(contributor_params)
+
+                    where_clause = ' AND '.join(where_clauses)
+                    sql = f"SELECT * FROM `{table_name}` WHERE {where_clause}"
+                    cursor.execute(sql, tuple(pk_values))
+
+                    # For junction table operations, we need the first primary key value
+                    main_pk_value = pk_parts[0]
+
+                else:
+                    # Single primary key
+                    primary_key = primary_key_config
+
+                    # CRITICAL: Check if the table is write-only and apply proper filtering
+                    contributor_sql, contributor_params = get_contributor_filter(table_name, session['db_user'])
+
+                    if contributor_sql:
+                        sql = f"SELECT * FROM `{table_name}` WHERE `{primary_key}` = %s AND {contributor_sql}"
+                        cursor.execute(sql, (row_id, *contributor_params))
+                    else:
+                        sql = f"SELECT * FROM `{table_name}` WHERE `{primary_key}` = %s"
+                        cursor.execute(sql, (row_id,))
+
+                    main_pk_value = row_id
+
+                row_data = cursor.fetchone()
+
+                # CRITICAL: If no row found, this means either the row doesn't exist OR user has no permission
+                if not row_data:
+                    if table_name in WRITE_ONLY_CONFIG:
+                        error = "Access denied: You don't have permission to view this row, or it doesn't exist."
+                    else:
+                        error = "Row not found."
                     return render_template(
                         'expanded_view.html',
                         table_name=table_name,
@@ -139,154 +494,49 @@ def expanded_view(table_name, row_id):
                         write_only_config=WRITE_ONLY_CONFIG.get(table_name)
                     )
 
-                # Build WHERE clause for composite key
-                where_clauses = [f"`{col}` = %s" for col in primary_key_config]
-                pk_values = pk_parts
-
-                # CRITICAL: Check if the table is write-only and apply proper filtering
-                is_write_only = table_name in WRITE_ONLY_CONFIG
-                if is_write_only:
-                    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-                    where_clauses.append(f"`{contributor_column}` LIKE %s")
-                    pk_values.append(f"%{session['db_user']}%")
-
-                where_clause = ' AND '.join(where_clauses)
-                sql = f"SELECT * FROM `{table_name}` WHERE {where_clause}"
-                cursor.execute(sql, tuple(pk_values))
-
-                # For junction table operations, we need the first primary key value
-                main_pk_value = pk_parts[0]
-
-            else:
-                # Single primary key
-                primary_key = primary_key_config
-
-                # CRITICAL: Check if the table is write-only and apply proper filtering
-                is_write_only = table_name in WRITE_ONLY_CONFIG
-
-                if is_write_only:
-                    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
-                    sql = f"SELECT * FROM `{table_name}` WHERE `{primary_key}` = %s AND `{contributor_column}` LIKE %s"
-                    cursor.execute(sql, (row_id, f"%{session['db_user']}%"))
-                else:
-                    sql = f"SELECT * FROM `{table_name}` WHERE `{primary_key}` = %s"
-                    cursor.execute(sql, (row_id,))
-
-                main_pk_value = row_id
-
-            row_data = cursor.fetchone()
-
-            # CRITICAL: If no row found, this means either the row doesn't exist OR user has no permission
-            if not row_data:
-                if table_name in WRITE_ONLY_CONFIG:
-                    error = "Access denied: You don't have permission to view this row, or it doesn't exist."
-                else:
-                    error = "Row not found."
-                return render_template(
-                    'expanded_view.html',
-                    table_name=table_name,
-                    row_data=None,
-                    schema=schema,
-                    error=error,
-                    primary_key=primary_key_config,
-                    all_junction_data=[],
-                    tables=TABLES_TO_SHOW,
-                    write_only_config=WRITE_ONLY_CONFIG.get(table_name)
-                )
-
-            # 2. Handle multiple junction table configurations
-            junction_configs = MANY_TO_MANY_CONFIG.get(table_name, [])
-
-            # Support both old single config format and new list format
-            if isinstance(junction_configs, dict):
-                junction_configs = [junction_configs]
-
-            for config in junction_configs:
-                junction_table = config['junction_table']
-                fk_self = config['fk_self']
-                fk_other = config['fk_other']
-                other_table = config['other_table']
-                other_display_column = config['other_display_column']
-                extra_columns = config.get('extra_columns', [])
-                show_multiple_rows = config.get('show_multiple_rows', False)
-                junction_pk = config.get('junction_primary_key', [fk_self, fk_other])
-                relationship_name = config.get('name', other_table)
-
-                other_pk = PRIMARY_KEYS.get(other_table)
-                if isinstance(other_pk, list):
-                    other_pk = other_pk[0]  # Use first column for composite keys
-
-                junction_data = {
-                    'config': config,
-                    'relationship_name': relationship_name,
-                    'rows': [],
-                    'all_other_options': [],
-                    'junction_schema': {},
-                    'other_table_schema': {}
-                }
-
-                # Get schema for junction table
-                junction_data['junction_schema'] = get_table_schema(connection, junction_table)
-                junction_data['other_table_schema'] = get_table_schema(connection, other_table)
-
-                if show_multiple_rows:
-                    # Fetch all junction table rows with related table data
-                    junction_columns = [f"j.`{col}`" for col in [fk_self, fk_other] + extra_columns]
-                    other_columns = [f"t2.`{other_pk}` as other_pk", f"t2.`{other_display_column}` as other_display"]
-
-                    # Add more columns from other table for self-references
-                    if other_table == table_name:
-                        # For self-references, get more detail columns
-                        other_detail_columns = [col for col in junction_data['other_table_schema'].keys()
-                                              if col not in [other_pk, other_display_column]][:3]  # Limit to 3 extra columns
-                        for col in other_detail_columns:
-                            other_columns.append(f"t2.`{col}` as other_{col}")
-
-                    all_columns = junction_columns + other_columns
-
-                    sql_junction = (
-                        f"SELECT {', '.join(all_columns)} "
-                        f"FROM `{junction_table}` AS j "
-                        f"JOIN `{other_table}` AS t2 ON j.{fk_other} = t2.{other_pk} "
-                        f"WHERE j.{fk_self} = %s"
-                    )
-                    cursor.execute(sql_junction, (main_pk_value,))
-                    junction_data['rows'] = cursor.fetchall()
-                else:
-                    # Original behavior - just show related items
-                    sql_related = (
-                        f"SELECT t2.{other_pk}, t2.{other_display_column} "
-                        f"FROM `{junction_table}` AS j "
-                        f"JOIN `{other_table}` AS t2 ON j.{fk_other} = t2.{other_pk} "
-                        f"WHERE j.{fk_self} = %s"
-                    )
-                    cursor.execute(sql_related, (main_pk_value,))
-                    junction_data['rows'] = cursor.fetchall()
-
-                # Fetch all possible items for the dropdown (with permission filtering)
-                if other_table in WRITE_ONLY_CONFIG:
-                    other_contributor_column = WRITE_ONLY_CONFIG[other_table]['contributor_column']
-                    sql_all_options = (
-                        f"SELECT {other_pk}, {other_display_column} FROM `{other_table}` "
-                        f"WHERE `{other_contributor_column}` LIKE %s"
-                    )
-                    cursor.execute(sql_all_options, (f"%{session['db_user']}%",))
-                else:
-                    sql_all_options = f"SELECT {other_pk}, {other_display_column} FROM `{other_table}`"
-                    cursor.execute(sql_all_options)
-                junction_data['all_other_options'] = cursor.fetchall()
-
-                all_junction_data.append(junction_data)
+                # 2. Handle multiple junction table configurations
+                junction_configs = MANY_TO_MANY_CONFIG.get(table_name, [])
+
+                # Support both old single config format and new list format
+                if isinstance(junction_configs, dict):
+                    junction_configs = [junction_configs]
+
+                for config in junction_configs:
+                    junction_table = config['junction_table']
+                    other_table = config['other_table']
+                    relationship_name = config.get('name', other_table)
+
+                    junction_data = {
+                        'config': config,
+                        'relationship_name': relationship_name,
+                        'rows': [],
+                        'junction_schema': {},
+                        'other_table_schema': {}
+                    }
+
+                    # Get schema for junction table
+                    junction_data['junction_schema'] = get_table_schema(connection, junction_table)
+                    junction_data['other_table_schema'] = get_table_schema(connection, other_table)
+                    all_junction_data.append(junction_data)
+
+            timings.append(('row', time.perf_counter() - started, 'Main row and schemas'))
+
+            # 3. Fetch the related rows of every relationship
+            started = time.perf_counter()
+            query_seconds = load_junction_rows(
+                connection, session['db_user'], session['db_password'], table_name, all_junction_data, main_pk_value
+            )
+            timings.append(('junctions', time.perf_counter() - started, 'Related rows'))
+            # The time of the (already consolidated) queries added up, which is what running them one
+            # after another would take; the gap to 'junctions' is what running them concurrently saved
+            timings.append(('junctions-queries-sum', query_seconds, 'Related row queries, summed'))
 
     except Exception as e:
         error = f"Error: {e}"
         print(error)
 
-    finally:
-        if connection:
-            connection.close()
-
-    return render_template(
+    started = time.perf_counter()
+    response = make_response(render_template(
         'expanded_view.html',
         table_name=table_name,
         row_data=row_data,
@@ -297,4 +547,9 @@ def expanded_view(table_name, row_id):
         tables=TABLES_TO_SHOW,
         write_only_config=WRITE_ONLY_CONFIG.get(table_name),
         row_id_param=row_id
-    )
\ No newline at end of file
+    ))
+    timings.append(('render', time.perf_counter() - started, 'Template'))
+
+    # Shown per request in the browser's network panel
+    response.headers['Server-Timing'] = format_server_timing(timings)
+    return response
\ No newline at end of file
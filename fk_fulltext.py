@@ -0,0 +1,124 @@
+from config import DB_PASSWORD, DB_USER, FK_FULLTEXT_MIN_TOKEN_SIZE, FOREIGN_KEY_CONFIG
+from functions import get_db_connection, invalidate_table_schema
+import click
+import pymysql
+import re
+
+# MySQL error raised when no FULLTEXT index covers exactly the MATCH() column list
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+
+def get_fulltext_configs():
+    """Returns the distinct (foreign_table, search_columns, parser) combinations configured with 'search_mode': 'fulltext'."""
+    configs = []
+    for table_config in FOREIGN_KEY_CONFIG.values():
+        for fk_config in table_config.values():
+            if fk_config.get('search_mode') != 'fulltext':
+                continue
+            entry = (fk_config['foreign_table'], tuple(fk_config.get('search_columns', [])), fk_config.get('fulltext_parser'))
+            if entry not in configs:
+                configs.append(entry)
+    return configs
+
+
+def build_boolean_query(query, parser=None):
+    """Turns a search box query into a BOOLEAN MODE search string, or None if it is too short to match.
+
+    With the default parser every word must appear, as a prefix so partly typed words still match.
+    The ngram parser can't do prefix matches, so the query is searched as a phrase of ngrams instead.
+    Words shorter than FK_FULLTEXT_MIN_TOKEN_SIZE are not indexed, so they are dropped.
+    """
+    # Strip the boolean operators so user input is only ever searched for, never interpreted
+    words = [word for word in re.sub(r'[+\-<>()~*"@]', ' ', query).split() if len(word) >= FK_FULLTEXT_MIN_TOKEN_SIZE]
+    if not words:
+        return None
+    if parser == 'ngram':
+        return '"' + ' '.join(words) + '"'
+    return ' '.join(f'+{word}*' for word in words)
+
+
+def fulltext_search(connection, table_name, search_columns, foreign_pk, query, parser=None, limit=10):
+    """Finds rows matching the query with MATCH ... AGAINST, best matches first.
+
+    Returns None when the query is too short for the FULLTEXT index or the index is missing,
+    so the caller can fall back to the LIKE search.
+    """
+    boolean_query = build_boolean_query(query, parser)
+    if boolean_query is None:
+        return None
+
+    all_columns = search_columns.copy()
+    if foreign_pk not in all_columns:
+        all_columns.insert(0, foreign_pk)
+
+    columns_sql = ', '.join([f'`{col}`' for col in all_columns])
+    match_sql = f"MATCH({', '.join(f'`{col}`' for col in search_columns)}) AGAINST (%s IN BOOLEAN MODE)"
+    sql = (
+        f"SELECT {columns_sql}, {match_sql} AS `__relevance` FROM `{table_name}` "
+        f"WHERE {match_sql} ORDER BY `__relevance` DESC LIMIT {int(limit)}"
+    )
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, (boolean_query, boolean_query))
+            return cursor.fetchall()
+    except pymysql.MySQLError as e:
+        if e.args and e.args[0] == ER_FT_MATCHING_KEY_NOT_FOUND:
+            print(f"No FULLTEXT index on {table_name} ({', '.join(search_columns)}), using LIKE search. Run 'flask --app main fulltext-indexes --create'.")
+            return None
+        raise
+
+
+def find_fulltext_index(connection, table_name, search_columns):
+    """Returns the name of a FULLTEXT index over exactly these columns, or None if there is none."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT INDEX_NAME, COLUMN_NAME
+            FROM INFORMATION_SCHEMA.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = %s
+            AND INDEX_TYPE = 'FULLTEXT'
+        """, (table_name,))
+        indexes = {}
+        for row in cursor.fetchall():
+            indexes.setdefault(row['INDEX_NAME'], set()).add(row['COLUMN_NAME'])
+
+    # MATCH() needs an index on exactly its column list, in any order
+    for index_name, columns in indexes.items():
+        if columns == set(search_columns):
+            return index_name
+    return None
+
+
+def create_fulltext_index(connection, table_name, search_columns, parser=None):
+    """Adds a FULLTEXT index over the search columns and returns its name."""
+    index_name = 'ft_' + '_'.join(search_columns)
+    columns_sql = ', '.join(f'`{col}`' for col in search_columns)
+    parser_sql = f" WITH PARSER {parser}" if parser else ''
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD FULLTEXT INDEX `{index_name}` ({columns_sql}){parser_sql}")
+    connection.commit()
+    invalidate_table_schema(table_name)
+    return index_name
+
+
+@click.command('fulltext-indexes')
+@click.option('--create', is_flag=True, help="Create the missing indexes instead of only listing them.")
+@click.option('--user', default=DB_USER, help="Database user to connect as.")
+@click.option('--password', default=DB_PASSWORD, help="Password for the database user.")
+def fulltext_indexes_command(create, user, password):
+    """Reports, and optionally creates, the FULLTEXT indexes needed by foreign keys with 'search_mode': 'fulltext'."""
+    connection = get_db_connection(user, password)
+    try:
+        for table_name, search_columns, parser in get_fulltext_configs():
+            columns = ', '.join(search_columns)
+            index_name = find_fulltext_index(connection, table_name, search_columns)
+            if index_name:
+                click.echo(f"{table_name} ({columns}): ok, index {index_name}")
+            elif create:
+                index_name = create_fulltext_index(connection, table_name, list(search_columns), parser)
+                click.echo(f"{table_name} ({columns}): created index {index_name}")
+            else:
+                click.echo(f"{table_name} ({columns}): MISSING")
+    finally:
+        connection.close()
@@ -0,0 +1,229 @@
+from config import FK_SEARCH_INDEX_MAX_AGE, FK_SEARCH_INDEX_MAX_INDEXES, FK_SEARCH_INDEX_MAX_ROWS
+from functions import IN_CLAUSE_CHUNK_SIZE, get_primary_key_columns
+from collections import OrderedDict
+import changefeed
+import threading
+import time
+
+
+def trigrams(text):
+    """Returns the set of 3-character substrings of an already lowercased string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def short_grams(text):
+    """Returns the set of 1- and 2-character substrings of an already lowercased string."""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SearchIndex:
+    """In-memory trigram index over the search columns of one foreign key table.
+
+    Matches the semantics of the SQL search it replaces: a row matches when any search column
+    contains the query as a case-insensitive substring. Trigram postings narrow the candidates,
+    which are then verified against the stored values. Queries of one or two characters are
+    answered from lists of the slots containing each such substring, which need no verifying.
+    """
+
+    def __init__(self, table_name, search_columns):
+        self.table_name = table_name
+        self.search_columns = list(search_columns)
+        self.pk = get_primary_key_columns(table_name)[0]
+        self.lock = threading.RLock()
+        self.ready = False
+        self.too_large = False
+        self.dirty_ids = set()
+        self.verified_users = set()
+        self._reset()
+
+    def _reset(self):
+        self.slot_ids = []  # slot -> primary key value, None for freed slots
+        self.slot_values = []  # slot -> tuple of raw search column values
+        self.slot_by_id = {}  # str(primary key) -> slot, so '5' from a form finds 5 from the database
+        self.postings = {}  # trigram -> set of slots
+        # 1- or 2-character substring -> slots containing it, in slot order. Slots are never
+        # reused, so these are only appended to; freed slots are skipped when read
+        self.short_postings = {}
+        self.built_at = time.monotonic()
+
+    def _columns_sql(self):
+        return ', '.join(f'`{col}`' for col in [self.pk] + [c for c in self.search_columns if c != self.pk])
+
+    def _add(self, row):
+        pk_value = row[self.pk]
+        values = tuple(row[col] for col in self.search_columns)
+        slot = len(self.slot_ids)
+        self.slot_ids.append(pk_value)
+        self.slot_values.append(values)
+        self.slot_by_id[str(pk_value)] = slot
+        grams = set()
+        for value in values:
+            if value is not None:
+                for gram in trigrams(str(value).lower()):
+                    self.postings.setdefault(gram, set()).add(slot)
+                grams |= short_grams(str(value).lower())
+        for gram in grams:
+            self.short_postings.setdefault(gram, []).append(slot)
+
+    def _remove(self, pk_value):
+        slot = self.slot_by_id.pop(str(pk_value), None)
+        if slot is None:
+            return
+        for value in self.slot_values[slot]:
+            if value is not None:
+                for gram in trigrams(str(value).lower()):
+                    posting = self.postings.get(gram)
+                    if posting is not None:
+                        posting.discard(slot)
+                        if not posting:
+                            del self.postings[gram]
+        self.slot_ids[slot] = None
+        self.slot_values[slot] = ()
+
+    def build(self, connection):
+        """Loads every row of the table. Tables over FK_SEARCH_INDEX_MAX_ROWS are flagged and left to SQL."""
+        with self.lock:
+            self._reset()
+            self.dirty_ids.clear()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT {self._columns_sql()} FROM `{self.table_name}` ORDER BY `{self.pk}` LIMIT %s",
+                    (FK_SEARCH_INDEX_MAX_ROWS + 1,)
+                )
+                rows = cursor.fetchall()
+            if len(rows) > FK_SEARCH_INDEX_MAX_ROWS:
+                self.too_large = True
+                return
+            for row in rows:
+                self._add(row)
+            self.built_at = time.monotonic()
+            self.ready = True
+
+    def refresh_dirty(self, connection):
+        """Re-reads rows written since the last search and updates their postings."""
+        with self.lock:
+            dirty = list(self.dirty_ids)
+            self.dirty_ids.clear()
+            with connection.cursor() as cursor:
+                for start in range(0, len(dirty), IN_CLAUSE_CHUNK_SIZE):
+                    chunk = dirty[start:start + IN_CLAUSE_CHUNK_SIZE]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(
+                        f"SELECT {self._columns_sql()} FROM `{self.table_name}` WHERE `{self.pk}` IN ({placeholders})",
+                        tuple(chunk)
+                    )
+                    rows = cursor.fetchall()
+                    for pk_value in chunk:
+                        self._remove(pk_value)
+                    for row in rows:
+                        self._remove(row[self.pk])
+                        self._add(row)
+
+            # Freed slots aren't reused; rebuild from scratch once they dominate or the table outgrew the limit
+            live = len(self.slot_by_id)
+            if len(self.slot_ids) > 2 * live + 1000 or live > FK_SEARCH_INDEX_MAX_ROWS:
+                self.ready = False
+
+    def search(self, query, limit=10):
+        """Returns up to `limit` matching rows as dicts of the primary key and search columns.
+
+        Rows come back in slot order, which is primary key order as of the last build with rows
+        written since then at the end.
+        """
+        needle = query.lower()
+        with self.lock:
+            if len(needle) >= 3:
+                postings = sorted((self.postings.get(gram, set()) for gram in trigrams(needle)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+                slots = sorted(candidates)
+            elif needle:
+                slots = self.short_postings.get(needle, [])
+            else:
+                slots = range(len(self.slot_ids))
+
+            results = []
+            for slot in slots:
+                if self.slot_ids[slot] is None:
+                    continue  # freed by a write
+                values = self.slot_values[slot]
+                if 0 < len(needle) < 3 or any(value is not None and needle in str(value).lower() for value in values):
+                    row = dict(zip(self.search_columns, values))
+                    row[self.pk] = self.slot_ids[slot]
+                    results.append(row)
+                    if len(results) >= limit:
+                        break
+            return results
+
+
+_indexes = OrderedDict()  # (table_name, search_columns) -> SearchIndex, least recently used first
+_indexes_lock = threading.Lock()
+
+def get_search_index(table_name, search_columns):
+    """Returns the (possibly not yet built) index for a table and column list, evicting the least recently used."""
+    key = (table_name, tuple(search_columns))
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = SearchIndex(table_name, search_columns)
+            while len(_indexes) > FK_SEARCH_INDEX_MAX_INDEXES:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(key)
+        return index
+
+
+def search(connection_factory, user, table_name, search_columns, query, limit=10):
+    """Answers a foreign key search from the in-memory index, touching MySQL only when it must.
+
+    `connection_factory` is a context manager factory, called only to build the index, to pick up
+    rows written since the last search, or to confirm once that `user` may read the table.
+    Returns None if the table is too large to index, so the caller can fall back to SQL.
+    """
+    # Composite keys aren't unique on their first column, which is all the search endpoint returns
+    if len(get_primary_key_columns(table_name)) > 1:
+        return None
+
+    index = get_search_index(table_name, search_columns)
+    if index.too_large:
+        return None
+    # Writes through other worker processes never reach this one's change feed, so rebuild
+    # indexes now and then to pick those up
+    if index.ready and FK_SEARCH_INDEX_MAX_AGE and time.monotonic() - index.built_at > FK_SEARCH_INDEX_MAX_AGE:
+        with index.lock:
+            index.ready = False
+
+    if not index.ready or index.dirty_ids or user not in index.verified_users:
+        with connection_factory() as connection:
+            if user not in index.verified_users:
+                # The index is shared by every user, so make sure this one may read the table at all
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT 1 FROM `{table_name}` LIMIT 0")
+                index.verified_users.add(user)
+            if index.dirty_ids:
+                index.refresh_dirty(connection)
+            if not index.ready:
+                index.build(connection)
+                if index.too_large:
+                    return None
+
+    return index.search(query, limit)
+
+
+def note_write(table_name, pk_values_list=None):
+    """Tells the indexes for a table that rows changed. Unknown keys (None) force a rebuild on next use."""
+    with _indexes_lock:
+        indexes = [index for (name, _), index in _indexes.items() if name == table_name]
+
+    for index in indexes:
+        with index.lock:
+            if pk_values_list is None:
+                index.ready = False
+                index.too_large = False
+            else:
+                index.dirty_ids.update(pk_values[0] for pk_values in pk_values_list)
+
+
+@changefeed.subscribe
+def on_change(event):
+    """Marks the rows of a committed write for re-reading by the indexes of their table."""
+    note_write(event.table, event.keys)
@@ -1,6 +1,12 @@
 import pymysql
+from pymysql.constants import SERVER_STATUS
 from config import *
+from contextlib import contextmanager
+import base64
+import json
 import re
+import threading
+import time
 
 def get_db_connection(user, password):
     """Establishes and returns a connection to the MySQL database."""
@@ -13,10 +19,192 @@ def get_db_connection(user, password):
         cursorclass=pymysql.cursors.DictCursor
     )
 
+
+def close_quietly(connection):
+    """Closes a connection, ignoring errors from connections that are already dead."""
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of connections for one set of credentials."""
+
+    def __init__(self, user, password, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.user = user
+        self.password = password
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = []  # (connection, released_at) pairs, most recently released last
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def _evict_idle(self):
+        """Closes connections that have been idle for longer than idle_timeout. Caller holds the lock."""
+        cutoff = time.monotonic() - self.idle_timeout
+        keep = []
+        for connection, released_at in self._idle:
+            if released_at < cutoff:
+                close_quietly(connection)
+            else:
+                keep.append((connection, released_at))
+        self._idle = keep
+
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        """Hands out a live connection, waiting up to `timeout` seconds if the pool is exhausted."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    connection = self._idle.pop()[0]
+                    break
+                if self._in_use < self.max_size:
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Timed out waiting for a database connection for '{self.user}'.")
+                self._condition.wait(remaining)
+            self._in_use += 1
+
+        try:
+            if connection is not None:
+                # Make sure the server hasn't dropped the connection while it sat idle
+                try:
+                    connection.ping(reconnect=False)
+                except Exception:
+                    close_quietly(connection)
+                    connection = None
+            if connection is None:
+                connection = get_db_connection(self.user, self.password)
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+        return connection
+
+    def try_acquire(self):
+        """Like acquire, but returns None at once instead of waiting when the pool is exhausted."""
+        try:
+            return self.acquire(timeout=0)
+        except TimeoutError:
+            return None
+
+    def release(self, connection, discard=False):
+        """Returns a connection to the pool, or closes it if it is broken or `discard` is set."""
+        if not discard:
+            try:
+                # Never hand an open transaction (or its stale snapshot) to the next request
+                if connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._condition:
+            self._in_use -= 1
+            if discard or not connection.open:
+                close_quietly(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(user, password):
+    """Returns the process-wide pool for the given credentials, creating it on first use."""
+    key = (user, password)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(user, password)
+        return pool
+
+
+@contextmanager
+def pooled_connection(user, password):
+    """Context manager that borrows a pooled connection and gives it back afterwards.
+
+    If the block raises, the connection is closed instead of being returned, since its
+    state (open transaction, unread results) can't be trusted.
+    """
+    pool = get_connection_pool(user, password)
+    connection = pool.acquire()
+    try:
+        yield connection
+    except BaseException:
+        pool.release(connection, discard=True)
+        raise
+    pool.release(connection)
+
+# table_name -> {'columns': columns_info, 'fingerprint': ..., 'checked_at': ...}
+_schema_cache = {}
+_schema_cache_lock = threading.Lock()
+
 def get_table_schema(connection, table_name):
+    """Returns column information for the specified table from the process-wide schema cache.
+
+    Within SCHEMA_CACHE_TTL seconds of the last check a hit costs no SQL at all. After that the
+    entry is revalidated with a single checksum query and only reloaded if the DDL changed.
+    """
+    with _schema_cache_lock:
+        entry = _schema_cache.get(table_name)
+        if entry and time.monotonic() - entry['checked_at'] < SCHEMA_CACHE_TTL:
+            return entry['columns']
+
+    fingerprint = get_schema_fingerprint(connection, table_name)
+    if entry and entry['fingerprint'] == fingerprint:
+        with _schema_cache_lock:
+            # Unless it was invalidated or reloaded meanwhile, restart the entry's TTL
+            if _schema_cache.get(table_name) is entry:
+                _schema_cache[table_name] = dict(entry, checked_at=time.monotonic())
+        return entry['columns']
+
+    columns_info = load_table_schema(connection, table_name)
+    with _schema_cache_lock:
+        _schema_cache[table_name] = {
+            'columns': columns_info,
+            'fingerprint': fingerprint,
+            'checked_at': time.monotonic()
+        }
+    return columns_info
+
+
+def invalidate_table_schema(table_name=None):
+    """Drops the cached schema for one table, or for every table if none is given."""
+    with _schema_cache_lock:
+        if table_name is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(table_name, None)
+
+
+def get_schema_fingerprint(connection, table_name):
+    """Computes a cheap checksum over a table's column and foreign key definitions."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT
+                (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', ORDINAL_POSITION, COLUMN_NAME, COLUMN_TYPE, COLLATION_NAME, COLUMN_KEY, EXTRA))), 0))
+                 FROM INFORMATION_SCHEMA.COLUMNS
+                 WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s) AS columns_checksum,
+                (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS(':', COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0))
+                 FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                 WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL) AS fk_checksum
+        """, (table_name, table_name))
+        row = cursor.fetchone()
+    return (row['columns_checksum'], row['fk_checksum'])
+
+
+def load_table_schema(connection, table_name):
     """Retrieves column information for the specified table, including ENUM and data type."""
     with connection.cursor() as cursor:
-        cursor.execute(f"DESCRIBE `{table_name}`")
+        # DESCRIBE plus the collation of each column
+        cursor.execute(f"SHOW FULL COLUMNS FROM `{table_name}`")
         schema = cursor.fetchall()
         
         # Get foreign key information
@@ -89,6 +277,7 @@ def get_table_schema(connection, table_name):
         
         columns_info[col_name] = {
             'type': col_type,
+            'collation': col['Collation'],
             'is_enum': is_enum,
             'enum_values': enum_values,
             'is_primary_key': is_primary_key,
@@ -107,6 +296,172 @@ def is_composite_pk(table_name):
     pk_config = PRIMARY_KEYS.get(table_name)
     return isinstance(pk_config, list)
 
+
+def get_visible_columns(table_name, schema):
+    """Returns the columns shown in the main table view: VISIBLE_COLUMNS if configured, else every schema column."""
+    visible_cols_config = VISIBLE_COLUMNS.get(table_name)
+    if visible_cols_config:
+        return [col for col in visible_cols_config if col in schema]
+    return [col for col in schema.keys()]
+
+
+def get_contributor_filter(table_name, user, table_alias=None):
+    """Returns a (sql, params) WHERE condition limiting a write-only table to the user's rows, or (None, []).
+
+    Tables with a `contributor_table` in WRITE_ONLY_CONFIG are filtered with an indexed EXISTS
+    lookup against that table; others fall back to matching the comma-separated contributor column.
+    """
+    if table_name not in WRITE_ONLY_CONFIG:
+        return None, []
+
+    ref = f'`{table_alias or table_name}`'
+    contributor_table = WRITE_ONLY_CONFIG[table_name].get('contributor_table')
+    if contributor_table:
+        pk_match = ' AND '.join(f"`__contrib`.`{col}` = {ref}.`{col}`" for col in get_primary_key_columns(table_name))
+        sql = f"EXISTS (SELECT 1 FROM `{contributor_table}` AS `__contrib` WHERE `__contrib`.`username` = %s AND {pk_match})"
+        return sql, [user]
+
+    contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+    return f"{ref}.`{contributor_column}` LIKE %s", [f"%{user}%"]
+
+
+def clean_insert_data(table_name, schema, data, user):
+    """Applies the add-row cleaning rules to one submitted row.
+
+    Empty values are dropped, the contributor column is stamped with the current user on
+    write-only tables, and an auto-incrementing single-column primary key is removed.
+    """
+    cleaned_data = {}
+    for key, value in data.items():
+        if value != '':
+            cleaned_data[key] = value
+
+    # Add contributor username if the table is write-only
+    if table_name in WRITE_ONLY_CONFIG:
+        contributor_column = WRITE_ONLY_CONFIG[table_name]['contributor_column']
+        cleaned_data[contributor_column] = user
+
+    primary_key_config = PRIMARY_KEYS.get(table_name)
+    if isinstance(primary_key_config, list):
+        # Composite key: The primary key fields are often not auto-incrementing
+        # and are included in the form, so we don't need to do anything.
+        pass
+    else:
+        # Single key: Remove auto-incrementing primary key if it exists
+        primary_key = primary_key_config
+        if primary_key and schema.get(primary_key, {}).get('is_auto_increment'):
+            if primary_key in cleaned_data:
+                del cleaned_data[primary_key]
+
+    return cleaned_data
+
+
+def get_primary_key_columns(table_name):
+    """Returns the primary key of a table as a list of columns, for single and composite keys alike."""
+    pk_config = PRIMARY_KEYS.get(table_name, 'id')
+    return list(pk_config) if isinstance(pk_config, list) else [pk_config]
+
+
+def format_server_timing(timings):
+    """Formats (name, seconds, description) entries as a Server-Timing header value."""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f};desc="{description}"' for name, seconds, description in timings)
+
+
+def clamp_page_size(page_size):
+    """Keeps a requested page size within 1..PAGE_SIZE_MAX, using the default when none is given."""
+    if page_size is None:
+        return PAGE_SIZE_DEFAULT
+    return min(max(page_size, 1), PAGE_SIZE_MAX)
+
+
+def encode_page_cursor(pk_values):
+    """Encodes the primary key values of the last row on a page into an opaque cursor token."""
+    payload = json.dumps([str(value) for value in pk_values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_page_cursor(token, pk_count):
+    """Decodes a cursor token from encode_page_cursor. Raises ValueError on malformed tokens."""
+    try:
+        pk_values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid page cursor.")
+    if not isinstance(pk_values, list) or len(pk_values) != pk_count:
+        raise ValueError("Invalid page cursor.")
+    return pk_values
+
+
+def build_rows_match(pk_columns, row_count, table_alias=None):
+    """Builds a WHERE condition matching row_count rows by primary key: (a = %s AND b = %s) OR ...
+
+    Single-column keys use an IN (...) list instead.
+    """
+    prefix = f'`{table_alias}`.' if table_alias else ''
+    if len(pk_columns) == 1:
+        return f"{prefix}`{pk_columns[0]}` IN ({', '.join(['%s'] * row_count)})"
+    row_match = '(' + ' AND '.join(f"{prefix}`{col}` = %s" for col in pk_columns) + ')'
+    return ' OR '.join([row_match] * row_count)
+
+
+def build_keyset_condition(pk_columns, pk_values, table_alias=None):
+    """Builds a WHERE condition selecting rows that sort after pk_values in primary key order.
+
+    Composite keys are expanded to (a > x) OR (a = x AND b > y) ... rather than a row constructor
+    comparison, which MySQL can't always resolve with an index range scan.
+    """
+    prefix = f'`{table_alias}`.' if table_alias else ''
+    disjuncts = []
+    params = []
+    for i, col in enumerate(pk_columns):
+        conjuncts = [f"{prefix}`{prev}` = %s" for prev in pk_columns[:i]]
+        conjuncts.append(f"{prefix}`{col}` > %s")
+        disjuncts.append('(' + ' AND '.join(conjuncts) + ')')
+        params.extend(pk_values[:i + 1])
+    return '(' + ' OR '.join(disjuncts) + ')', params
+
+def format_foreign_key_display(row, display_columns, fk_value):
+    """Builds the display string for a foreign key row from its display columns."""
+    display_parts = []
+    for col in display_columns:
+        if col in row and row[col] is not None:
+            display_parts.append(f"{col}: {row[col]}")
+
+    if display_parts:
+        return ' | '.join(display_parts[:3])  # Limit to 3 parts
+    else:
+        return f"ID: {fk_value}"
+
+
+def get_fk_display_config(foreign_table, table_name=None, fk_column=None):
+    """Returns (foreign_key, display_columns) used to label rows of foreign_table.
+
+    These come from the FOREIGN_KEY_CONFIG entry for table_name.fk_column when given, else from
+    the first entry pointing at foreign_table.
+    """
+    fk_config = FOREIGN_KEY_CONFIG.get(table_name, {}).get(fk_column, {})
+    if fk_config.get('foreign_table') == foreign_table:
+        return fk_config['foreign_key'], fk_config.get('display_columns', ['name', 'title', 'description'])
+
+    for table_config in FOREIGN_KEY_CONFIG.values():
+        for fk_config in table_config.values():
+            if fk_config.get('foreign_table') == foreign_table:
+                return fk_config['foreign_key'], fk_config.get('display_columns', ['name', 'title', 'description'])
+
+    foreign_pk = PRIMARY_KEYS.get(foreign_table, 'id')
+    if isinstance(foreign_pk, list):
+        foreign_pk = foreign_pk[0]  # Use first column of composite key
+    return foreign_pk, ['name', 'title', 'description']
+
+
+def get_fk_search_config(foreign_table, search_columns):
+    """Finds the FOREIGN_KEY_CONFIG entry that searches foreign_table over exactly these columns, or {}."""
+    for table_config in FOREIGN_KEY_CONFIG.values():
+        for fk_config in table_config.values():
+            if fk_config.get('foreign_table') == foreign_table and list(fk_config.get('search_columns', [])) == list(search_columns):
+                return fk_config
+    return {}
+
+
 def get_foreign_key_display_text(connection, table_name, fk_column, fk_value):
     """Helper function to get display text for a foreign key value."""
     if not fk_value:
@@ -141,16 +496,116 @@ def get_foreign_key_display_text(connection, table_name, fk_column, fk_value):
                 return f"ID: {fk_value} (not found)"
             
             # Create display string
-            display_parts = []
-            for col in display_columns:
-                if col in row and row[col] is not None:
-                    display_parts.append(f"{col}: {row[col]}")
-            
-            if display_parts:
-                return ' | '.join(display_parts[:3])  # Limit to 3 parts
-            else:
-                return f"ID: {fk_value}"
+            return format_foreign_key_display(row, display_columns, fk_value)
                 
     except Exception as e:
         print(f"Error getting FK display: {e}")
-        return f"ID: {fk_value}"
\ No newline at end of file
+        return f"ID: {fk_value}"
+
+
+# Maximum number of values bound into a single IN (...) clause
+IN_CLAUSE_CHUNK_SIZE = 500
+
+def fetch_foreign_key_rows(connection, foreign_table, foreign_key, display_columns, fk_values):
+    """Loads the display columns of the foreign rows with the given key values, as a dict of key -> row.
+
+    Uses the same projection as the single-value lookup, one chunked IN (...) query at a time.
+    """
+    # The key is also selected under an alias so matched rows can be mapped back without
+    # changing which columns end up in the display text
+    select_columns = [f'`{col}`' for col in display_columns if col != foreign_key]
+    if foreign_key not in display_columns:
+        select_columns.insert(0, f'`{foreign_key}`')
+    select_columns.append(f'`{foreign_key}` AS `__fk_key`')
+    columns_sql = ', '.join(select_columns)
+
+    rows_by_key = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(fk_values), IN_CLAUSE_CHUNK_SIZE):
+            chunk = fk_values[start:start + IN_CLAUSE_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            sql = f"SELECT {columns_sql} FROM `{foreign_table}` WHERE `{foreign_key}` IN ({placeholders})"
+            cursor.execute(sql, tuple(chunk))
+            for row in cursor.fetchall():
+                rows_by_key.setdefault(row.pop('__fk_key'), row)
+    return rows_by_key
+
+
+def get_foreign_table_display_texts(connection, foreign_table, ids, table_name=None, fk_column=None):
+    """Resolves display text for many ids of one foreign table, keyed by the id as a string.
+
+    With table_name and fk_column, ids are labelled the way that foreign key is configured to
+    (see get_fk_display_config). Ids with no matching row map to None.
+    """
+    foreign_key, display_columns = get_fk_display_config(foreign_table, table_name, fk_column)
+
+    # Tables no foreign key is configured for (junction targets, say) may not have the default
+    # columns; label those by their first few other columns, like the single-id endpoint does
+    schema = get_table_schema(connection, foreign_table)
+    display_columns = [col for col in display_columns if col in schema]
+    if not display_columns:
+        display_columns = [col for col in schema if col != foreign_key][:3]
+
+    ids = list(dict.fromkeys(str(record_id) for record_id in ids))
+    rows_by_key = fetch_foreign_key_rows(connection, foreign_table, foreign_key, display_columns, ids)
+
+    # Ids arrive as strings from the browser while the database returns typed keys
+    rows_by_id = {str(key): row for key, row in rows_by_key.items()}
+    return {
+        record_id: format_foreign_key_display(rows_by_id[record_id], display_columns, record_id) if record_id in rows_by_id else None
+        for record_id in ids
+    }
+
+
+def get_foreign_key_display_texts(connection, table_name, fk_column, fk_values):
+    """Bulk version of get_foreign_key_display_text for many values of one foreign key column.
+
+    Values are resolved with chunked IN (...) queries and the returned dict maps each value
+    to what get_foreign_key_display_text would have returned for it. A value the IN (...)
+    queries didn't return a row for is not looked up again: it is reported as not found.
+    """
+    results = {}
+    pending = []
+
+    fk_config = FOREIGN_KEY_CONFIG.get(table_name, {}).get(fk_column, {})
+    for fk_value in dict.fromkeys(fk_values):
+        if not fk_value:
+            results[fk_value] = None
+        elif not fk_config:
+            results[fk_value] = str(fk_value)
+        else:
+            pending.append(fk_value)
+
+    if not pending:
+        return results
+
+    foreign_table = fk_config['foreign_table']
+    foreign_key = fk_config['foreign_key']
+    display_columns = fk_config.get('display_columns', ['name', 'title', 'description'])
+
+    try:
+        rows_by_key = fetch_foreign_key_rows(connection, foreign_table, foreign_key, display_columns, pending)
+    except Exception as e:
+        print(f"Error getting FK display: {e}")
+        for fk_value in pending:
+            results[fk_value] = f"ID: {fk_value}"
+        return results
+
+    # The column collation may have matched a value that compares differently in Python (case,
+    # trailing spaces), so fall back to comparing the keys the way a case-insensitive collation does
+    def loose(key):
+        return str(key).rstrip().casefold()
+    rows_by_loose_key = {}
+    for key, row in rows_by_key.items():
+        rows_by_loose_key.setdefault(loose(key), row)
+
+    for fk_value in pending:
+        row = rows_by_key.get(fk_value)
+        if row is None:
+            row = rows_by_loose_key.get(loose(fk_value))
+        if row is None:
+            results[fk_value] = f"ID: {fk_value} (not found)"
+        else:
+            results[fk_value] = format_foreign_key_display(row, display_columns, fk_value)
+
+    return results
\ No newline at end of file
@@ -1,34 +1,68 @@
-from flask import Blueprint, abort, session, redirect, url_for, request, render_template
-from config import GRAPH_CONFIGS
-from functions import get_db_connection
+from flask import Blueprint, abort, copy_current_request_context, jsonify, make_response, session, redirect, url_for, request, render_template
+from config import (
+    GRAPH_BACKEND, GRAPH_CONFIGS, GRAPH_INLINE_DATA, GRAPH_JOB_PATHS_TIME_BUDGET, GRAPH_LOAD_CHUNK_ROWS, GRAPH_MAX_PATHS,
+    GRAPH_NEIGHBORHOOD_LOADING, GRAPH_PATHS_TIME_BUDGET, GRAPH_PATH_WORKERS
+)
+from functions import IN_CLAUSE_CHUNK_SIZE, build_rows_match, get_primary_key_columns, pooled_connection
+import graph_analytics
+import graph_cache
+import graph_jobs
+import graph_layers
 import networkx as nx
+import pymysql
+import gzip
+import hashlib
 import json
+import time
+import uuid
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # optional; /graph/data falls back to gzip
+
+# The modules below need numpy, which is only required for the csr backend and server-side layouts
+if GRAPH_BACKEND == 'csr':
+    import graph_csr
+    import graph_parallel
+elif GRAPH_PATH_WORKERS > 1:
+    print("GRAPH_PATH_WORKERS is ignored: parallel path searches need GRAPH_BACKEND = 'csr'")
+
+try:
+    import graph_layout
+except ImportError:
+    graph_layout = None  # optional; graphs are then always laid out in the browser
 
 graph = Blueprint("graph", __name__)
 
-@graph.route("/graph")
-def graph_route():
-    connection = None
+_instance_id = uuid.uuid4().hex  # tells graph versions of this process from those of earlier ones
 
-    if 'db_user' not in session:
-        return redirect(url_for('base_routes.login'))
 
-    try:
-        connection = get_db_connection(session['db_user'], session['db_password'])
-    except:
-        raise
-    
-    if len(GRAPH_CONFIGS) == 0:
-        abort(418)
+def get_graph_configs(ignore_type):
+    """Returns (index, gconf) for every GRAPH_CONFIGS entry not excluded by ignore_ttype."""
+    return [(index, gconf) for index, gconf in enumerate(GRAPH_CONFIGS) if gconf['table'] not in ignore_type]
 
-    G = nx.Graph()
 
-    weightfactor = request.args.get("weightfactor",3, type=float)
-    superign = request.args.get('superignore', type=lambda x: x.split(','))
-    min_weight = request.args.get('min', 0, type=float)
-    only_with_tag_one = request.args.get("only_one")
-    only_with_tag_both = request.args.get("only_both")
-    ignore_type = request.args.get("ignore_ttype", [], type=lambda x: x.split(',')) or []
+def get_graph_tables(ignore_type):
+    """Returns the set of tables a graph built without the `ignore_type` configs reads from."""
+    tables = set()
+    for _, gconf in get_graph_configs(ignore_type):
+        tables.update([gconf['table'], gconf['foreign_table']])
+        if 'tags_jct_table' in gconf:
+            tables.add(gconf['tags_jct_table']['name'])
+    return tables
+
+
+def build_edge_query(gconf, filters, condition=None):
+    """Builds the query for the edge rows of one graph config that pass the SQL-level filters.
+
+    `condition` narrows it further and may hold %s placeholders. Besides the configured columns,
+    rows carry the edge table's primary key as __key0, __key1, ... and the two node ids as
+    __id1 and __id2, which GraphSources uses to find the rows a change touches.
+    """
+    superign = filters['superign']
+    only_with_tag_one = filters['only_one']
+    only_with_tag_both = filters['only_both']
 
     if superign:
         superign_clause = ""
@@ -37,43 +71,514 @@ def graph_route():
     else:
         superign_clause = ""
 
+    if only_with_tag_one:
+        tag_only_clause_one = f""" \
+        and (exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id1']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_one})) \
+        or exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id2']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_one}))) """
+    else:
+        tag_only_clause_one = ""
+
+    if only_with_tag_both:
+        tag_only_clause_both = f""" \
+        and (exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id1']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_both})) \
+        and exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id2']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_both}))) 
+        """
+    else:
+        tag_only_clause_both = ""
+
+    key_columns = [f"{gconf['table']}.{col} as __key{i}" for i, col in enumerate(get_primary_key_columns(gconf['table']))]
+    columns = key_columns + [f"{gconf['id1']} as __id1", f"{gconf['id2']} as __id2"] + gconf['columns']
+
+    q = f"select {','.join(columns)} from {gconf['table']} inner join {gconf['foreign_table']} as t1 on {gconf['id1']} = t1.id inner join {gconf['foreign_table']} as t2 on {gconf['id2']} = t2.id where {gconf['weights']} >= {filters['min_weight']} " + superign_clause + tag_only_clause_one + tag_only_clause_both + (" and ".join([''] + gconf['sqlextras']))
+    if condition:
+        # The configured SQL is literal, so escape any % in it before adding placeholders
+        q = q.replace('%', '%%') + f" and ({condition})"
+    return q + ' ;'
+
+
+class GraphSources:
+    """Remembers which edge table rows each edge of a built graph came from.
+
+    This lets a change be applied by re-reading only the rows it touches. A row's old edge is
+    taken out using what was recorded when it was added. The row is then read again with the
+    graph's filters, to put back whatever it is now. When several rows give the same edge, it
+    keeps the attributes a full build would give it: every row's, merged in the order added.
+
+    Rows loaded in bulk by add_rows are kept as plain lists and only indexed (see index) when
+    a change first needs them, so graphs that never change don't pay for it.
+    """
+
+    def __init__(self, filters):
+        self.filters = filters
+        self.rows = {}  # (config index, row key) -> (node 1, node 2, id1 value, id2 value)
+        self.edges = {}  # frozenset of the edge's nodes -> {(config index, row key): raw weight}
+        self.by_endpoint = {}  # (config index, str(node id)) -> set of (config index, row key)
+        self.loaded = []  # (config index, key columns, names 1, names 2, ids 1, ids 2, weights) per add_rows batch
+
+    def _record(self, source, nname1, nname2, id1, id2, weight):
+        self.rows[source] = (nname1, nname2, id1, id2)
+        self.edges.setdefault(frozenset((nname1, nname2)), {})[source] = weight
+        for id_value in (id1, id2):
+            self.by_endpoint.setdefault((source[0], id_value), set()).add(source)
+
+    def index(self):
+        """Records the rows loaded by add_rows in rows, edges and by_endpoint, as add_row would have."""
+        for index, key_columns, names1, names2, ids1, ids2, weights in self.loaded:
+            for key, nname1, nname2, id1, id2, weight in zip(zip(*key_columns), names1, names2, ids1, ids2, weights):
+                self._record((index, tuple(map(str, key))), nname1, nname2, str(id1), str(id2), weight)
+        self.loaded = []
+
+    def add_row(self, G, index, gconf, row, key_count):
+        self.index()
+        source = (index, tuple(str(row[f'__key{i}']) for i in range(key_count)))
+        if source in self.rows:
+            self.remove_row(G, source)
+
+        nname1 = gconf["node_id_generator_j1"](row)
+        nname2 = gconf["node_id_generator_j2"](row)
+        weight = row[gconf["weights"]]
+        self._record(source, nname1, nname2, str(row['__id1']), str(row['__id2']), weight)
+
+        for n in (nname1, nname2):
+            if not G.has_node(n):
+                G.add_node(n, name=n)
+        graph_cache.own_edge(G, nname1, nname2)
+        G.add_edge(nname1, nname2, **gconf['attrs'], weight=weight)
+
+    def add_rows(self, G, index, gconf, columns, rows, nodes, seen=None):
+        """Adds a batch of edge rows fetched as tuples, with the given column names (see row_columns), to a graph being built.
+
+        Gives the graph add_row would, row by row, without its per-row work. The
+        node_id_generator lambdas run once per node id rather than once per row, so they must
+        only read the node's own columns; `nodes` keeps the names made, per (config index, side),
+        for every batch of a build. Edges go in with one add_weighted_edges_from call sharing
+        gconf['attrs']. Rows whose (config index, row key) is in `seen` are skipped, and the
+        others added to it, when it's given.
+        """
+        key_positions = [position for position, col in enumerate(columns) if col.startswith('__key')]
+        id1_position, id2_position = columns.index('__id1'), columns.index('__id2')
+        weight_position = columns.index(gconf['weights'])
+        if seen is not None:
+            fresh = []
+            for row in rows:
+                source = (index, tuple(str(row[position]) for position in key_positions))
+                if source not in seen:
+                    seen.add(source)
+                    fresh.append(row)
+            rows = fresh
+
+        new_nodes = {}
+
+        def new_name(names, generator, id_value, row):
+            name = names[id_value] = generator(dict(zip(columns, row)))
+            if name not in G and name not in new_nodes:
+                new_nodes[name] = {'name': name}
+            return name
+
+        names1 = nodes.setdefault((index, 1), {})
+        names2 = nodes.setdefault((index, 2), {})
+        generator1, generator2 = gconf['node_id_generator_j1'], gconf['node_id_generator_j2']
+        row_names1, row_names2 = [], []
+        for row in rows:
+            id1, id2 = row[id1_position], row[id2_position]
+            nname1 = names1.get(id1)
+            if nname1 is None:
+                nname1 = new_name(names1, generator1, id1, row)
+            nname2 = names2.get(id2)
+            if nname2 is None:
+                nname2 = new_name(names2, generator2, id2, row)
+            row_names1.append(nname1)
+            row_names2.append(nname2)
+
+        weights = [row[weight_position] for row in rows]
+        self.loaded.append((
+            index, [[row[position] for row in rows] for position in key_positions], row_names1, row_names2,
+            [row[id1_position] for row in rows], [row[id2_position] for row in rows], weights
+        ))
+        G.add_nodes_from(new_nodes.items())
+        G.add_weighted_edges_from(zip(row_names1, row_names2, weights), **gconf['attrs'])
+
+    def remove_row(self, G, source):
+        self.index()
+        nname1, nname2, id1, id2 = self.rows.pop(source)
+        for id_value in (id1, id2):
+            sources = self.by_endpoint.get((source[0], id_value))
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self.by_endpoint[(source[0], id_value)]
+
+        edge = frozenset((nname1, nname2))
+        sources = self.edges[edge]
+        del sources[source]
+        graph_cache.own_edge(G, nname1, nname2)
+        if sources:
+            edge_data = G.edges[nname1, nname2]
+            edge_data.clear()
+            for (index, _), weight in sources.items():
+                edge_data.update(GRAPH_CONFIGS[index]['attrs'])
+                edge_data['weight'] = weight
+        else:
+            del self.edges[edge]
+            G.remove_edge(nname1, nname2)
+            # Nodes only exist through their edges
+            for n in {nname1, nname2}:
+                if G.degree(n) == 0:
+                    G.remove_node(n)
+
+
+def row_columns(cursor):
+    """Returns the names a DictCursor would give the columns of a cursor's last result.
+
+    Edge rows are loaded as tuples, but the node_id_generator lambdas get them as dicts keyed
+    the way they always were: a name already taken is prefixed with its table, e.g. `name` and
+    `t2.name` when both t1.name and t2.name are selected.
+    """
+    columns = []
+    for field in cursor._result.fields:
+        name = field.name
+        if name in columns:
+            name = f"{field.table_name}.{name}"
+        columns.append(name)
+    return columns
+
+
+def build_graph(connection, filters):
+    """Queries every GRAPH_CONFIGS table and builds the graph for one set of SQL-level filters.
+
+    Returns (graph, GraphSources). Edge weights are left as the raw column values;
+    apply_weightfactor turns them into the weights the page uses.
+    """
+    G = nx.Graph()
+    sources = GraphSources(filters)
+    nodes = {}
+
+    # Rows are streamed as tuples, GRAPH_LOAD_CHUNK_ROWS at a time, and loaded in bulk
+    with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+        for index, gconf in get_graph_configs(filters['ignore_type']):
+            q = build_edge_query(gconf, filters)
+
+            print(q)
+            cursor.execute(q)
+            columns = row_columns(cursor)
+            while True:
+                rows = cursor.fetchmany(GRAPH_LOAD_CHUNK_ROWS)
+                if not rows:
+                    break
+                sources.add_rows(G, index, gconf, columns, rows, nodes)
+
+    return G, sources
+
+
+def can_load_neighborhood(ignore_type, src, distance):
+    """Whether build_neighborhood_graph can load the graph for these args instead of build_graph."""
+    return (
+        GRAPH_NEIGHBORHOOD_LOADING and src is not None and distance is not None and distance >= 1
+        and all('node_id_parser' in gconf for _, gconf in get_graph_configs(ignore_type))
+    )
+
+
+def build_neighborhood_graph(connection, filters, src, distance):
+    """Builds the graph of the nodes within `distance` hops of src, reading only their edges.
+
+    Returns (graph, GraphSources) like build_graph, with the same graph as
+    nx.ego_graph(build_graph(...), src, distance). The frontier is expanded one hop at a time
+    with batched IN queries on the id columns, which reads every edge of the nodes closer than
+    `distance`; a last query reads the edges among the nodes at exactly `distance`. Every graph
+    config needs a node_id_parser to turn node names back into ids (see can_load_neighborhood).
+    """
+    G = nx.Graph()
+    sources = GraphSources(filters)
+    configs = get_graph_configs(filters['ignore_type'])
+
+    def node_ids(gconf, names):
+        # Names from another config's tables parse to None
+        return list(dict.fromkeys(i for i in map(gconf['node_id_parser'], names) if i is not None))
+
+    nodes = {}
+    seen = set()
+
+    def add_rows(cursor, index, gconf, condition, params):
+        cursor.execute(build_edge_query(gconf, filters, condition), params)
+        # Rows between two frontier nodes come up twice; seen skips them the second time
+        sources.add_rows(G, index, gconf, row_columns(cursor), cursor.fetchall(), nodes, seen)
+
+    reached = {src}
+    frontier = [src]
+    with connection.cursor(pymysql.cursors.Cursor) as cursor:
+        for _ in range(distance):
+            for index, gconf in configs:
+                ids = node_ids(gconf, frontier)
+                for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+                    chunk = ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    condition = f"({gconf['id1']} in ({placeholders}) or {gconf['id2']} in ({placeholders}))"
+                    add_rows(cursor, index, gconf, condition, tuple(chunk + chunk))
+            if src not in G:
+                raise nx.NodeNotFound(f"Source {src} is not in G")
+            frontier = [n for n in G if n not in reached]
+            reached.update(frontier)
+            if not frontier:
+                break
+
+        # Edges between two nodes of the last hop, in either direction
+        for index, gconf in configs:
+            ids = node_ids(gconf, frontier)
+            chunks = [ids[start:start + IN_CLAUSE_CHUNK_SIZE] for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE)]
+            for chunk1 in chunks:
+                for chunk2 in chunks:
+                    condition = f"({gconf['id1']} in ({', '.join(['%s'] * len(chunk1))}) and {gconf['id2']} in ({', '.join(['%s'] * len(chunk2))}))"
+                    add_rows(cursor, index, gconf, condition, tuple(chunk1 + chunk2))
+
+    return G, sources
+
+
+def update_graph(connection, G, sources, events):
+    """Applies change events to a built graph by re-reading the edge rows they touch.
+
+    Writes to an edge table re-read those rows; writes to a node table re-read every edge
+    row of the nodes written. Returns False when the events can't be applied this way, i.e.
+    rows were inserted with unknown keys or tags changed under a tag filter, so the caller
+    rebuilds instead.
+    """
+    filters = sources.filters
+    configs = get_graph_configs(filters['ignore_type'])
+    sources.index()
+    row_keys = {}  # config index -> set of edge table keys to re-read
+    node_ids = {}  # config index -> set of node ids whose edges to re-read
+
+    for event in events:
+        for index, gconf in configs:
+            if event.table == gconf['table']:
+                if event.keys is None:
+                    return False
+                row_keys.setdefault(index, set()).update(tuple(str(value) for value in keys) for keys in event.keys)
+            if event.table == gconf['foreign_table']:
+                if event.keys is None:
+                    return False
+                node_ids.setdefault(index, set()).update(str(keys[0]) for keys in event.keys)
+            if 'tags_jct_table' in gconf and event.table == gconf['tags_jct_table']['name'] and (filters['only_one'] or filters['only_both']):
+                return False
+
+    with connection.cursor() as cursor:
+        for index, gconf in configs:
+            keys = list(row_keys.get(index, ()))
+            ids = list(node_ids.get(index, ()))
+            if not keys and not ids:
+                continue
+
+            stale = {(index, key) for key in keys} | {
+                source for id_value in ids for source in sources.by_endpoint.get((index, id_value), ())
+            }
+            for source in stale:
+                if source in sources.rows:
+                    sources.remove_row(G, source)
+
+            pk_columns = get_primary_key_columns(gconf['table'])
+            for start in range(0, len(keys), IN_CLAUSE_CHUNK_SIZE):
+                chunk = keys[start:start + IN_CLAUSE_CHUNK_SIZE]
+                condition = build_rows_match(pk_columns, len(chunk), gconf['table'])
+                cursor.execute(build_edge_query(gconf, filters, condition), tuple(value for key in chunk for value in key))
+                for row in cursor.fetchall():
+                    sources.add_row(G, index, gconf, row, len(pk_columns))
+
+            for start in range(0, len(ids), IN_CLAUSE_CHUNK_SIZE):
+                chunk = ids[start:start + IN_CLAUSE_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                condition = f"({gconf['id1']} in ({placeholders}) or {gconf['id2']} in ({placeholders}))"
+                cursor.execute(build_edge_query(gconf, filters, condition), tuple(chunk + chunk))
+                for row in cursor.fetchall():
+                    sources.add_row(G, index, gconf, row, len(pk_columns))
+
+    return True
+
+
+def apply_weightfactor(base, weightfactor):
+    """Returns a copy of a cached graph with each raw edge weight w replaced by weightfactor / w."""
+    G = base.copy()
+    for u, v, edge_data in G.edges(data=True):
+        edge_data['weight'] = weightfactor/float(edge_data['weight'])
+    return G
+
+
+def get_request_graph():
+    """Returns (graph, version) of the cached graph for the SQL-level filters in the request args.
+
+    Built graphs are shared between requests with the same filters, per user since database
+    permissions differ. Edge weights are raw; weightfactor only rescales them, so it's applied
+    to a copy (see apply_weightfactor).
+
+    With src and dist, and the full graph not cached already, only the neighbourhood of src is
+    loaded (see build_neighborhood_graph). It's cached per src and dist, and rebuilt on any
+    write to its tables, since a write anywhere may change which nodes are in it.
+    """
+    superign = request.args.get('superignore', type=lambda x: x.split(','))
+    min_weight = request.args.get('min', 0, type=float)
+    only_with_tag_one = request.args.get("only_one")
+    only_with_tag_both = request.args.get("only_both")
+    ignore_type = request.args.get("ignore_ttype", [], type=lambda x: x.split(',')) or []
+
+    cache_key = (session['db_user'], min_weight, tuple(superign or ()), only_with_tag_one, only_with_tag_both, tuple(ignore_type))
+
+    filters = {
+        'min_weight': min_weight, 'superign': superign, 'only_one': only_with_tag_one,
+        'only_both': only_with_tag_both, 'ignore_type': ignore_type
+    }
+
+    def build():
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            return build_graph(connection, filters)
+
+    def update(G, sources, events):
+        with pooled_connection(session['db_user'], session['db_password']) as connection:
+            return update_graph(connection, G, sources, events)
+
+    src = request.args.get("src")
+    distance = request.args.get("dist", type=int)
+    if can_load_neighborhood(ignore_type, src, distance) and not graph_cache.is_cached(cache_key):
+        def build_neighborhood():
+            with pooled_connection(session['db_user'], session['db_password']) as connection:
+                return build_neighborhood_graph(connection, filters, src, distance)
+
+        return graph_cache.get_graph(
+            cache_key + ('neighborhood', src, distance), get_graph_tables(ignore_type),
+            build_neighborhood, lambda G, sources, events: False
+        )
+
+    return graph_cache.get_graph(cache_key, get_graph_tables(ignore_type), build, update)
+
+
+def take_paths(paths, limit, time_budget, job=None):
+    """Takes up to `limit` paths from a path generator, for about `time_budget` seconds.
+
+    Returns (paths, truncated). truncated is True when paths may have been left out: the
+    generator had more than `limit`, the time ran out or the job was cancelled. For a
+    background job, each path is also reported to it as found. Time and cancellation are
+    checked after every path, and whenever the generator yields None (see simple_paths).
+    """
+    taken = []
+    deadline = time.monotonic() + time_budget
+    for path in paths:
+        if path is not None:
+            if len(taken) >= limit:
+                return taken, True
+            taken.append(path)
+            if job is not None:
+                job.add_path(path)
+        if (job is not None and job.cancelled) or time.monotonic() > deadline:
+            return taken, True
+    return taken, False
+
+
+def simple_paths(G, source, target, cutoff):
+    """Yields the same paths as nx.all_simple_paths(G, source, target, cutoff), in the same order.
+
+    Like CSRGraph.all_simple_paths it skips branches that can't reach target within the cutoff,
+    found from one BFS out of target, and yields None every 1024 steps so take_paths can stop
+    a search that goes on without finding paths.
+    """
+    if source not in G:
+        raise nx.NodeNotFound(f"source node {source} not in graph")
+    if cutoff < 0 or target not in G:
+        return
+    if source == target:
+        yield [source]
+        return
+    if cutoff == 0:
+        return
+
+    remaining = nx.single_source_shortest_path_length(G, target, cutoff)
+    path = [source]
+    on_path = {source}
+    stack = [iter(G[source])]
+    steps = 0
+    while stack:
+        steps += 1
+        if steps % 1024 == 0:
+            yield None
+        child = next((c for c in stack[-1] if c not in on_path), None)
+        if child is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        if child == target:
+            yield path + [target]
+        elif remaining.get(child, cutoff + 1) <= cutoff - len(path):
+            path.append(child)
+            on_path.add(child)
+            stack.append(iter(G[child]))
+
+
+def k_shortest_paths(G, src, target, weight):
+    """Yields the simple paths from src to target, shortest first (Yen's algorithm), or nothing if there are none."""
+    if target not in G:
+        return  # like all_simple_paths, which this replaces
     try:
-        with connection.cursor() as cursor:
-            for gconf in GRAPH_CONFIGS:
-                if gconf['table'] in ignore_type:
-                    continue
-                if only_with_tag_one:
-                    tag_only_clause_one = f""" \
-            and (exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id1']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_one})) \
-            or exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id2']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_one}))) """
-                else:
-                    tag_only_clause_one = ""
-
-                if only_with_tag_both:
-                    tag_only_clause_both = f""" \
-            and (exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id1']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_both})) \
-            and exists (select 1 from {gconf['tags_jct_table']['name']} where {gconf['id2']} = {gconf['tags_jct_table']['c1']} and {gconf['tags_jct_table']['c2']} in ({only_with_tag_both}))) 
-            """
-                else:
-                    tag_only_clause_both = ""
-
-                q = f"select {','.join(gconf["columns"])} from {gconf['table']} inner join {gconf['foreign_table']} as t1 on {gconf['id1']} = t1.id inner join {gconf['foreign_table']} as t2 on {gconf['id2']} = t2.id where {gconf['weights']} >= {min_weight} " + superign_clause + tag_only_clause_one + tag_only_clause_both + (" and ".join([''] + gconf['sqlextras'])) + ' ;'
-
-                print(q)
-                cursor.execute(q)
-                data = cursor.fetchall()
-                for row in data:
-                    if not G.has_node((nname1 := gconf["node_id_generator_j1"](row))):
-                        G.add_node(nname1)
-                    if not G.has_node((nname2 := gconf["node_id_generator_j2"](row))):
-                        G.add_node(nname2)
-                    G.add_edge(nname1, nname2, weight=weightfactor/float(row[gconf["weights"]]), **gconf['attrs'])
-    finally:
-        connection.close()
-
-    for n in G:
-        G.nodes[n]["name"] = n
-    
+        yield from nx.shortest_simple_paths(G, src, target, weight)
+    except nx.NetworkXNoPath:
+        return
+
+
+def query_graph_csr(base, version, weightfactor, src, distance, rr_out, rr_in, ring_weighted, target, shortest_only, no_ignore_weights, cutoff, k, max_paths, time_budget, job=None):
+    """Does the src/dist/ring/target part of /graph on the CSR form of the cached graph.
+
+    Returns (graph, truncated), giving the same graph as the networkx code in graph_route, but
+    traverses NumPy arrays and only copies and reweights the nodes and edges that end up in the
+    result. k shortest paths are found by networkx, on the cached graph with weights computed
+    on the fly.
+    """
+    csr = graph_csr.get_csr(base, version)
+    mask = None  # nodes of the ego graph, when dist narrows the graph first
+    G = None
+
+    if src is not None and distance is not None:
+        # ego_nodes lists them in BFS order, unlike nx.ego_graph, but a subgraph of base iterates
+        # in base's order whatever order its nodes were given in, so the result matches networkx's
+        nodes = csr.ego_nodes(src, distance)
+        mask = csr.mask_of(nodes)
+        G = apply_weightfactor(base.subgraph(nodes), weightfactor)
+    if src is not None and rr_out is not None:
+        weights = weightfactor / csr.weights if ring_weighted else None
+        def compute():
+            ids, distances = csr.reached(src, weights, mask)
+            return graph_layers.Layers(csr.node_names(ids), distances)
+        layers = graph_layers.get_layers(version, src, compute, weightfactor if ring_weighted else None, distance)
+        nodes = graph_layers.ring_nodes(layers, rr_out-1 if rr_in is None else rr_in, rr_out)
+        nodes.add(src)
+        # The networkx code returns a read-only subgraph view here, which ignore can't remove nodes from
+        return nx.freeze(apply_weightfactor(base.subgraph(nodes), weightfactor)), False
+    elif src is not None and target is not None:
+        if shortest_only:
+            paths = csr.all_shortest_paths(src, target, weightfactor / csr.weights if no_ignore_weights else None, mask)
+        elif k is not None:
+            weight = (lambda u, v, edge_data: weightfactor/float(edge_data['weight'])) if no_ignore_weights else None
+            paths = k_shortest_paths(base if mask is None else base.subgraph(nodes), src, target, weight)
+        elif graph_parallel.wants_parallel(cutoff):
+            paths = None  # searched below, split by first hop across GRAPH_PATH_WORKERS processes
+        else:
+            paths = csr.all_simple_paths(src, target, cutoff, mask)
+        if paths is None:
+            paths, truncated = graph_parallel.take_simple_paths(csr, version, src, target, cutoff, mask, max_paths, time_budget, job)
+        else:
+            paths, truncated = take_paths(paths, k or max_paths, time_budget, job)
+        H = nx.Graph()
+        for path in paths:
+            H.add_nodes_from(path)
+            H.add_weighted_edges_from(zip(path, path[1:], [weightfactor/float(base[u][v]['weight']) for u, v in zip(path, path[1:])]))
+        return H, truncated
+
+    return (G if G is not None else apply_weightfactor(base, weightfactor)), False
+
+
+def query_request_graph(base, version, job=None):
+    """Applies the src/dist/ring/target/ignore args of a /graph request to a cached graph.
+
+    Returns (graph, truncated), where truncated is True if a path query stopped early. When
+    run as a background job (see graph_jobs), path queries report their paths to it and may
+    run for up to GRAPH_JOB_PATHS_TIME_BUDGET.
+    """
+    weightfactor = request.args.get("weightfactor",3, type=float)
+
     src = request.args.get("src")
     distance = request.args.get("dist", type=int)
     target = request.args.get("target")
@@ -81,37 +586,53 @@ def graph_route():
     no_ignore_weights = request.args.get("no_ignore_weights", False, type=bool)
     ignore = request.args.get("ignore", type=lambda x: x.split(','))
     cutoff = request.args.get("cutoff", 4, type=lambda x:min(int(x), 7))
-    rr_out = request.args.get("ring", type=int)
-    rr_in = request.args.get("ring_in", type=int)
-
-    if (src is not None and distance is not None): #type: ignore
-        print("YAY SOMEONE KNOWS HOW TO USE TS")
-        G = nx.ego_graph(G, src, distance)
-    if (src is not None and rr_out is not None):
-        print("src + ring")
-        nodes_at_distance_out = set(nx.descendants_at_distance(G, src, rr_out))
-        nodes_up_to_distance_in = set()
-        if rr_in is None: rr_in = rr_out-1
-        for i in range(rr_out, rr_in, -1):
-            nodes_up_to_distance_in |= set(nx.descendants_at_distance(G, src, i))
-        
-        nodes_up_to_distance_in.add(src) # ensure the source is included
-        G = G.subgraph(nodes_at_distance_out | nodes_up_to_distance_in)
-    elif (src is not None and target is not None):
-        print('src not none and target specified')
-        H = nx.Graph()
-        print('H created')
-        if shortest_only:
-            paths = nx.all_shortest_paths(G, src, target, 'weight' if no_ignore_weights else None) 
-        else:
-            paths = nx.all_simple_paths(G, src, target, cutoff)
-        for path in paths:
-            #print(path)
-            H.add_nodes_from(path)
-            #print('added nodes')
-            H.add_weighted_edges_from(zip(path, path[1:], [G.get_edge_data(path[x], path[x+1])["weight"] for x in range(len(path)-1)]))
-            #print('added edges')
-        G = H
+    # With ring_weighted the ring bounds are path lengths (weights after weightfactor) rather than hop counts
+    ring_weighted = request.args.get("ring_weighted", False, type=bool)
+    rr_out = request.args.get("ring", type=float if ring_weighted else int)
+    rr_in = request.args.get("ring_in", type=float if ring_weighted else int)
+    # Path queries stop after max_paths paths or time_budget seconds; k asks for the k shortest simple paths instead of all up to cutoff
+    max_paths = request.args.get("max_paths", GRAPH_MAX_PATHS, type=lambda x: max(1, min(int(x), GRAPH_MAX_PATHS)))
+    budget = GRAPH_PATHS_TIME_BUDGET if job is None else GRAPH_JOB_PATHS_TIME_BUDGET
+    time_budget = request.args.get("time_budget", budget, type=lambda x: min(float(x), budget))
+    k = request.args.get("k", type=lambda x: max(1, min(int(x), max_paths)))
+    truncated = False
+
+    if GRAPH_BACKEND == 'csr':
+        G, truncated = query_graph_csr(base, version, weightfactor, src, distance, rr_out, rr_in, ring_weighted, target, shortest_only, no_ignore_weights, cutoff, k, max_paths, time_budget, job)
+    else:
+        G = apply_weightfactor(base, weightfactor)
+
+        if (src is not None and distance is not None): #type: ignore
+            print("YAY SOMEONE KNOWS HOW TO USE TS")
+            G = nx.ego_graph(G, src, distance)
+        if (src is not None and rr_out is not None):
+            print("src + ring")
+            # Distances from src are found once per graph version and reused for any ring bounds
+            layers = graph_layers.get_layers(
+                version, src, lambda: graph_layers.networkx_layers(G, src, 'weight' if ring_weighted else None),
+                weightfactor if ring_weighted else None, distance
+            )
+            nodes = graph_layers.ring_nodes(layers, rr_out-1 if rr_in is None else rr_in, rr_out)
+            nodes.add(src) # ensure the source is included
+            G = G.subgraph(nodes)
+        elif (src is not None and target is not None):
+            print('src not none and target specified')
+            H = nx.Graph()
+            print('H created')
+            if shortest_only:
+                paths = nx.all_shortest_paths(G, src, target, 'weight' if no_ignore_weights else None) 
+            elif k is not None:
+                paths = k_shortest_paths(G, src, target, 'weight' if no_ignore_weights else None)
+            else:
+                paths = simple_paths(G, src, target, cutoff)
+            paths, truncated = take_paths(paths, k or max_paths, time_budget, job)
+            for path in paths:
+                #print(path)
+                H.add_nodes_from(path)
+                #print('added nodes')
+                H.add_weighted_edges_from(zip(path, path[1:], [G.get_edge_data(path[x], path[x+1])["weight"] for x in range(len(path)-1)]))
+                #print('added edges')
+            G = H
 
     if ignore is not None:
         for n in ignore:
@@ -120,17 +641,291 @@ def graph_route():
             except:
                 pass
 
+    # Cliques, communities and betweenness of the cached graph, computed once per version in the
+    # background; nodes get an empty clique list until they're ready
+    analytics = graph_analytics.get_analytics(base, version) or {}
     for node_id in G.nodes():
-        G.nodes[node_id]['cliques'] = []
+        G.nodes[node_id].update(analytics.get(node_id, {'cliques': []}))
 
+    return G, truncated
+
+
+@graph.route("/graph")
+def graph_route():
+    if 'db_user' not in session:
+        return redirect(url_for('base_routes.login'))
+
+    if len(GRAPH_CONFIGS) == 0:
+        abort(418)
+
+    # Without GRAPH_INLINE_DATA the page loads the graph from /graph/data itself
+    data = nodecount = None
+    truncated = False
+    if GRAPH_INLINE_DATA:
+        base, version = get_request_graph()
+        G, truncated = query_request_graph(base, version)
+        data = nx.cytoscape_data(G)
+        positions = request_positions(G, version)
+        if positions is not None:
+            for node, (x, y) in zip(data['elements']['nodes'], positions):
+                node['position'] = {'x': x, 'y': y}
+        data = json.dumps(data)
+        nodecount = G.number_of_nodes()
 
-    d = nx.cytoscape_data(G)
     return render_template("graph.html", 
-        data = json.dumps(d),
-        nodecount = G.number_of_nodes(),
-        src = src,
-        dist = distance,
-        ignore = ignore,
-        weightfactor = weightfactor,
+        data = data,
+        nodecount = nodecount,
+        src = request.args.get("src"),
+        dist = request.args.get("dist", type=int),
+        ignore = request.args.get("ignore", type=lambda x: x.split(',')),
+        weightfactor = request.args.get("weightfactor",3, type=float),
+        truncated = truncated,
         layout=request.args.get("layout","cose")
-    )
\ No newline at end of file
+    )
+
+
+def request_positions(G, version):
+    """Returns node positions for the graph of this request's args, or None to leave the layout to the browser.
+
+    See graph_layout.wants_server_layout for when the server lays a graph out. Positions are a
+    list of [x, y] in G's node order, cached per user and args (but for layout) for the graph
+    version, and warm started from the previous version's when it changed.
+    """
+    if graph_layout is None or not graph_layout.wants_server_layout(request.args.get("layout"), G.number_of_nodes()):
+        return None
+    args = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != "layout"))
+    positions = graph_layout.get_positions((session['db_user'], args), version, G)
+    return positions.round(1).tolist()
+
+
+def compact_graph_data(G):
+    """Returns a graph in the compact form served by /graph/data.
+
+    Node names are listed once, in `nodes`, and edges are parallel arrays of indices into it
+    (`sources`, `targets`) and of `weights`. The other attributes of nodes and edges are listed
+    once per distinct set in `attrs` and referred to by index (`node_attrs`, `edge_attrs`), as
+    most of them are shared. A node's name attribute is left out when it is the node's name.
+    The attributes from graph_analytics differ per node, so they are lists in `node_values`
+    instead, by attribute name, with null for nodes without one.
+    """
+    attrs = []
+    attr_ids = {}
+
+    def intern_attrs(data):
+        key = json.dumps(data, sort_keys=True, default=str)
+        if key not in attr_ids:
+            attr_ids[key] = len(attrs)
+            attrs.append(data)
+        return attr_ids[key]
+
+    index = {}
+    nodes, node_attrs = [], []
+    node_values = {key: [] for key in graph_analytics.NODE_KEYS}
+    for n, node_data in G.nodes(data=True):
+        index[n] = len(nodes)
+        nodes.append(n)
+        for key, values in node_values.items():
+            values.append(node_data.get(key))
+        node_attrs.append(intern_attrs({
+            k: v for k, v in node_data.items() if not (k == 'name' and v == n) and k not in node_values
+        }))
+
+    sources, targets, weights, edge_attrs = [], [], [], []
+    for u, v, edge_data in G.edges(data=True):
+        sources.append(index[u])
+        targets.append(index[v])
+        weights.append(edge_data.get('weight'))
+        edge_attrs.append(intern_attrs({k: val for k, val in edge_data.items() if k != 'weight'}))
+
+    return {
+        'nodes': nodes, 'node_attrs': node_attrs,
+        'node_values': {key: values for key, values in node_values.items() if any(v is not None for v in values)},
+        'sources': sources, 'targets': targets, 'weights': weights, 'edge_attrs': edge_attrs,
+        'attrs': attrs
+    }
+
+
+def compressed_json_response(payload, etag=None):
+    """Returns payload as minified JSON, compressed with brotli or gzip if the client accepts it.
+
+    With an ETag, a request whose If-None-Match already has it should be answered with 304
+    before calling this; see graph_data_route.
+    """
+    body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+    encoding = None
+    if brotli is not None and request.accept_encodings['br'] > 0:
+        body, encoding = brotli.compress(body), 'br'
+    elif request.accept_encodings['gzip'] > 0:
+        body, encoding = gzip.compress(body, compresslevel=6), 'gzip'
+
+    response = make_response(body)
+    response.mimetype = 'application/json'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Graphs depend on the user's database permissions, and must be checked again on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+@graph.route("/graph/data")
+def graph_data_route():
+    """The graph /graph shows for the same args, as compact JSON (see compact_graph_data).
+
+    Also has `truncated`, as on /graph, and `positions` when the server lays the graph out
+    (see request_positions). The ETag is the graph version plus the args, so a
+    client revalidating an unchanged graph gets a 304 without the graph being queried again.
+    It is only sent once the version's analytics are ready, so clients don't keep a copy
+    without them.
+    """
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if len(GRAPH_CONFIGS) == 0:
+        abort(418)
+
+    try:
+        base, version = get_request_graph()
+        analysed = graph_analytics.is_ready(version)
+        # Versions restart with the process, hence the instance id
+        etag = hashlib.sha1(f"{_instance_id}:{version}:{request.query_string.decode()}".encode()).hexdigest()
+        if analysed and request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        G, truncated = query_request_graph(base, version)
+        # A path search cut short by its time budget may find more paths next time
+        return compressed_json_response(graph_payload(G, version, truncated), etag if analysed and not truncated else None)
+
+    except Exception as e:
+        print(f"Error getting graph data: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def graph_payload(G, version, truncated):
+    """Returns what /graph/data serves for a queried graph."""
+    payload = compact_graph_data(G)
+    payload['truncated'] = truncated
+    positions = request_positions(G, version)
+    if positions is not None:
+        payload['positions'] = positions
+    return payload
+
+
+def run_graph_job(job):
+    """Does the work of /graph/data for the request's args as a background job, returning its payload.
+
+    Runs on the graph_jobs pool inside a copy of the request context. Cancelling stops a path
+    search after the current path, and the paths found so far are the result; a job cancelled
+    while the graph is being built stops once it's built, with no result.
+    """
+    job.stage = 'building graph'
+    base, version = get_request_graph()
+    if job.cancelled:
+        return None
+    job.stage = 'querying'
+    G, truncated = query_request_graph(base, version, job)
+    job.stage = None
+    return graph_payload(G, version, truncated)
+
+
+@graph.route("/graph/jobs", methods=["POST"])
+def graph_job_start_route():
+    """Starts a background job computing /graph/data for the same args; poll it with graph_job_route."""
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if len(GRAPH_CONFIGS) == 0:
+        abort(418)
+
+    job = graph_jobs.submit(session['db_user'], copy_current_request_context(run_graph_job))
+    return jsonify({'success': True, 'job_id': job.id}), 202
+
+
+@graph.route("/graph/jobs/<job_id>")
+def graph_job_route(job_id):
+    """Progress of a graph job: status, stage, elapsed seconds and the paths found after the first `since`.
+
+    Once the job is done or cancelled, `result` has its /graph/data payload (None if it was
+    cancelled before it got to the query).
+    """
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    job = graph_jobs.get_job(job_id, session['db_user'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return compressed_json_response(job.progress(request.args.get('since', 0, type=int)))
+
+
+@graph.route("/graph/jobs/<job_id>/cancel", methods=["POST"])
+def graph_job_cancel_route(job_id):
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    job = graph_jobs.get_job(job_id, session['db_user'])
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job.cancel()
+    return jsonify({'success': True})
+
+
+@graph.route("/graph/layers")
+def graph_layers_route():
+    """Distances from src as JSON, grouped into layers of equal distance, nearest first.
+
+    Takes the same graph filters as /graph, plus ring_weighted (and weightfactor) to measure
+    path lengths instead of hops, and optionally ring/ring_in to return only those layers.
+    Returns {"success": true, "src": ..., "weighted": ..., "version": ...,
+    "layers": [{"distance": d, "nodes": [...]}, ...]}. version changes whenever the graph does.
+    """
+    if 'db_user' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    if len(GRAPH_CONFIGS) == 0:
+        abort(418)
+
+    src = request.args.get("src")
+    if src is None:
+        return jsonify({'error': "Missing 'src'."}), 400
+
+    weightfactor = request.args.get("weightfactor", 3, type=float)
+    ring_weighted = request.args.get("ring_weighted", False, type=bool)
+    rr_out = request.args.get("ring", type=float if ring_weighted else int)
+    rr_in = request.args.get("ring_in", type=float if ring_weighted else int)
+
+    try:
+        base, version = get_request_graph()
+        if src not in base:
+            return jsonify({'error': f"Node {src} is not in the graph."}), 404
+
+        if GRAPH_BACKEND == 'csr':
+            csr = graph_csr.get_csr(base, version)
+            def compute():
+                ids, distances = csr.reached(src, weightfactor / csr.weights if ring_weighted else None)
+                return graph_layers.Layers(csr.node_names(ids), distances)
+        else:
+            weight = (lambda u, v, edge_data: weightfactor/float(edge_data['weight'])) if ring_weighted else None
+            compute = lambda: graph_layers.networkx_layers(base, src, weight)
+        layers = graph_layers.get_layers(version, src, compute, weightfactor if ring_weighted else None)
+
+        if rr_out is not None:
+            layers = graph_layers.ring_slice(layers, rr_out-1 if rr_in is None else rr_in, rr_out)
+
+        return jsonify({
+            'success': True,
+            'src': src,
+            'weighted': ring_weighted,
+            'version': version,
+            'layers': [
+                {'distance': distance if ring_weighted else int(distance), 'nodes': nodes}
+                for distance, nodes in graph_layers.group_layers(layers)
+            ]
+        })
+
+    except Exception as e:
+        print(f"Error getting graph layers: {e}")
+        return jsonify({'error': str(e)}), 500
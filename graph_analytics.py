@@ -0,0 +1,118 @@
+from config import (
+    GRAPH_ANALYTICS, GRAPH_ANALYTICS_BETWEENNESS_SAMPLES, GRAPH_ANALYTICS_LOUVAIN_MAX_NODES, GRAPH_ANALYTICS_MAX_CLIQUES,
+    GRAPH_ANALYTICS_MIN_CLIQUE_SIZE, GRAPH_CACHE_MAX_ENTRIES
+)
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import multiprocessing
+import networkx as nx
+import threading
+
+# Node attributes the analytics set. They differ from node to node, so /graph/data sends them as
+# per-node lists rather than with the shared attributes (see graph.compact_graph_data)
+NODE_KEYS = ('cliques', 'community', 'betweenness')
+
+# The thread only picks the next version to analyse and waits for the process, which does the
+# (pure Python, GIL-holding) work so it doesn't slow down requests
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='graph-analytics')
+_pool = None
+_analytics = OrderedDict()  # graph version -> {node: analytics}, least recently used first
+_queued = OrderedDict()  # graph versions waiting for or being analysed, oldest first
+_lock = threading.Lock()
+
+
+def analyse(G):
+    """Returns {node: {'cliques', 'community', 'betweenness'}} for a cached graph (raw weights).
+
+    cliques lists the ids of the maximal cliques of at least GRAPH_ANALYTICS_MIN_CLIQUE_SIZE
+    nodes a node is in, numbered in the order they're found, up to GRAPH_ANALYTICS_MAX_CLIQUES.
+    community numbers the Louvain communities by size, largest first, or the label propagation
+    ones above GRAPH_ANALYTICS_LOUVAIN_MAX_NODES nodes. betweenness is normalized hop-count
+    betweenness, estimated from GRAPH_ANALYTICS_BETWEENNESS_SAMPLES sampled sources.
+    """
+    cliques = {n: [] for n in G}
+    found = (clique for clique in nx.find_cliques(G) if len(clique) >= GRAPH_ANALYTICS_MIN_CLIQUE_SIZE)
+    for i, clique in enumerate(itertools.islice(found, GRAPH_ANALYTICS_MAX_CLIQUES)):
+        for n in clique:
+            cliques[n].append(i)
+
+    # Higher raw weights are stronger ties, so they pull nodes into the same community
+    W = nx.Graph()
+    W.add_nodes_from(G)
+    W.add_weighted_edges_from((u, v, float(w)) for u, v, w in G.edges(data='weight', default=1))
+    if len(W) <= GRAPH_ANALYTICS_LOUVAIN_MAX_NODES:
+        communities = nx.community.louvain_communities(W, seed=0)
+    else:
+        communities = nx.community.asyn_lpa_communities(W, weight='weight', seed=0)
+    community = {}
+    for i, members in enumerate(sorted(communities, key=len, reverse=True)):
+        for n in members:
+            community[n] = i
+
+    samples = GRAPH_ANALYTICS_BETWEENNESS_SAMPLES if len(G) > GRAPH_ANALYTICS_BETWEENNESS_SAMPLES else None
+    betweenness = nx.betweenness_centrality(G, k=samples, seed=0)
+
+    return {
+        n: {'cliques': cliques[n], 'community': community.get(n), 'betweenness': round(betweenness.get(n, 0.0), 6)}
+        for n in G
+    }
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Forking a threaded server is unsafe, so the worker starts fresh and only imports this module
+        _pool = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _run(G, version):
+    global _pool
+    with _lock:
+        if version not in _queued:
+            return  # dropped for newer versions while it waited
+    try:
+        result = _get_pool().submit(analyse, G).result()
+    except BrokenProcessPool as e:
+        print(f"Error analysing graph version {version}: {e}")
+        _pool = None  # the worker died (e.g. out of memory); start a new one for the next version
+        result = {}
+    except Exception as e:
+        print(f"Error analysing graph version {version}: {e}")
+        result = {}  # so requests don't queue it again
+    with _lock:
+        _queued.pop(version, None)
+        _analytics[version] = result
+        while len(_analytics) > GRAPH_CACHE_MAX_ENTRIES:
+            _analytics.popitem(last=False)
+
+
+def is_ready(version):
+    """Whether get_analytics has the analytics of a graph version, or analytics are off."""
+    with _lock:
+        return not GRAPH_ANALYTICS or version in _analytics
+
+
+def get_analytics(G, version):
+    """Returns the analytics of a cached graph version (see analyse), or None until they're ready.
+
+    The first call for a version queues G, the read-only graph graph_cache returned for it, to
+    be analysed in the background, in a worker process; later calls get the cached result. Only
+    the latest GRAPH_CACHE_MAX_ENTRIES versions asked for are kept waiting.
+    """
+    if not GRAPH_ANALYTICS:
+        return None
+    with _lock:
+        result = _analytics.get(version)
+        if result is not None:
+            _analytics.move_to_end(version)
+            return result
+        if version in _queued:
+            return None
+        _queued[version] = True
+        while len(_queued) > GRAPH_CACHE_MAX_ENTRIES:
+            _queued.popitem(last=False)
+    _executor.submit(_run, G, version)
+    return None
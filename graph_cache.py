@@ -0,0 +1,163 @@
+from config import GRAPH_CACHE_MAX_AGE, GRAPH_CACHE_MAX_ENTRIES
+from collections import OrderedDict
+import changefeed
+import itertools
+import threading
+import time
+
+# key -> {'graph', 'state', 'tables', 'pending', 'version', 'built_at', 'lock'}, least recently used first
+_graphs = OrderedDict()
+_write_counts = {}  # table name -> number of writes seen, to spot builds that raced with a write
+_versions = itertools.count(1)  # every graph built or changed gets a new, process-wide unique version
+# version -> (previous version, set of nodes whose edges changed from it), for versions made by
+# applying events, oldest first. Caches derived from a graph use it to update rather than redo
+_changes = OrderedDict()
+MAX_CHANGES = 1024
+_lock = threading.Lock()
+
+
+def copy_on_write(G):
+    """Returns a copy of a networkx graph that shares G's adjacency and attribute dicts.
+
+    Only the outer node and adjacency dicts are copied, which takes a small fraction of the
+    time of G.copy(). Call own_edge(copy, u, v) before adding, changing or removing an edge of
+    the copy, so the change doesn't show in G; nodes can be added and (once they have no edges)
+    removed freely.
+    """
+    H = G.__class__()
+    H.graph.update(G.graph)
+    H._node = dict(G._node)
+    H._adj = dict(G._adj)
+    H._owned_nodes = set()  # nodes whose adjacency dict belongs to H, i.e. whose edges may change
+    H._owned_edges = set()  # edges, as frozensets of their nodes, whose data dict belongs to H
+    return H
+
+
+def own_edge(G, u, v):
+    """Gives a copy_on_write graph its own copy of what changing the edge u-v touches. No-op for other graphs."""
+    owned_nodes = getattr(G, '_owned_nodes', None)
+    if owned_nodes is None:
+        return
+    for n in (u, v):
+        if n in G._adj and n not in owned_nodes:
+            G._adj[n] = dict(G._adj[n])
+            owned_nodes.add(n)
+    edge = frozenset((u, v))
+    if u in G._adj and v in G._adj[u] and edge not in G._owned_edges:
+        G._adj[u][v] = G._adj[v][u] = dict(G._adj[u][v])
+        G._owned_edges.add(edge)
+
+
+def get_changes(version, wanted):
+    """Finds the nearest earlier version of the same graph for which wanted(version) is true.
+
+    Returns (that version, set of nodes whose edges changed since), or None if there is none,
+    e.g. because the graph was rebuilt in between. Nodes added or removed since are in the set.
+    """
+    changed = set()
+    with _lock:
+        while version in _changes:
+            version, nodes = _changes[version]
+            changed |= nodes
+            if wanted(version):
+                return version, changed
+    return None
+
+
+def get_graph(key, tables, build, update):
+    """Returns (graph, version) for key, building or bringing the cached graph up to date as needed.
+
+    `build()` returns a new (graph, state) pair. `update(graph, state, events)` applies change
+    events to a copy_on_write copy of the cached graph, calling own_edge before changing an edge,
+    and to its state in place. It returns False if they can't be applied incrementally, in which
+    case the graph is rebuilt. `tables` are the tables the graph is read from; only events for
+    those are queued for it.
+
+    Events are applied lazily, by the first read after them. The returned graph is shared with
+    other requests and must be treated as read-only; a graph is never changed once returned,
+    changes go to a copy published under a new version. get_changes tells what changed between
+    versions. A graph built more than GRAPH_CACHE_MAX_AGE seconds ago is built again.
+    """
+    with _lock:
+        entry = _graphs.get(key)
+        if entry is not None and _expired(entry):
+            del _graphs[key]
+            entry = None
+        if entry is not None:
+            _graphs.move_to_end(key)
+        else:
+            write_counts = {table: _write_counts.get(table, 0) for table in tables}
+
+    if entry is None:
+        graph, state = build()
+        version = next(_versions)
+        with _lock:
+            # A write that landed while the graph was being built may or may not be in it, so don't keep it
+            if all(_write_counts.get(table, 0) == count for table, count in write_counts.items()):
+                _graphs[key] = {
+                    'graph': graph, 'state': state, 'tables': set(tables), 'pending': [],
+                    'version': version, 'built_at': time.monotonic(), 'lock': threading.Lock()
+                }
+                while len(_graphs) > GRAPH_CACHE_MAX_ENTRIES:
+                    _graphs.popitem(last=False)
+        return graph, version
+
+    with entry['lock']:
+        with _lock:
+            pending = entry['pending']
+            entry['pending'] = []
+
+        if pending:
+            try:
+                graph = copy_on_write(entry['graph'])
+                if update(graph, entry['state'], pending):
+                    previous = entry['version']
+                    entry['graph'] = graph
+                    entry['version'] = next(_versions)
+                    changed = graph._owned_nodes
+                    del graph._owned_nodes, graph._owned_edges
+                    with _lock:
+                        _changes[entry['version']] = (previous, changed)
+                        while len(_changes) > MAX_CHANGES:
+                            _changes.popitem(last=False)
+                else:
+                    entry['graph'], entry['state'] = build()
+                    entry['version'] = next(_versions)
+                    entry['built_at'] = time.monotonic()
+            except Exception:
+                # The state may be half updated, so start over on the next read
+                with _lock:
+                    if _graphs.get(key) is entry:
+                        del _graphs[key]
+                raise
+
+        return entry['graph'], entry['version']
+
+
+def _expired(entry):
+    # Writes through other worker processes or outside the app never reach this process's change
+    # feed, so graphs are rebuilt now and then to pick those up
+    return GRAPH_CACHE_MAX_AGE and time.monotonic() - entry['built_at'] > GRAPH_CACHE_MAX_AGE
+
+
+def is_cached(key):
+    """Whether a graph is cached for key, though it may still have changes to apply."""
+    with _lock:
+        entry = _graphs.get(key)
+        return entry is not None and not _expired(entry)
+
+
+@changefeed.subscribe
+def on_change(event):
+    """Queues a committed write for every cached graph read from its table."""
+    with _lock:
+        _write_counts[event.table] = _write_counts.get(event.table, 0) + 1
+        for entry in _graphs.values():
+            if event.table in entry['tables']:
+                entry['pending'].append(event)
+
+
+def clear():
+    """Drops every cached graph."""
+    with _lock:
+        _graphs.clear()
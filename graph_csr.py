@@ -0,0 +1,365 @@
+from config import GRAPH_CACHE_MAX_ENTRIES
+from collections import OrderedDict
+from heapq import heappop, heappush
+import graph_cache
+import itertools
+import networkx as nx
+import numpy as np
+import threading
+
+
+class CSRGraph:
+    """Read-only adjacency of an undirected networkx graph as NumPy CSR arrays.
+
+    Nodes are interned as ids 0..n-1 in the graph's node order. The neighbours of node i are
+    indices[indptr[i]:indptr[i + 1]], with the raw weight of each edge at the same position in
+    weights. Neighbours are kept in the order networkx iterates them in a copy of the graph,
+    which is what /graph traverses: first the neighbours that come earlier in node order,
+    ascending, then the rest in the original order. Every traversal below follows its networkx
+    counterpart step for step, so results come out the same and in the same order.
+
+    Methods that take a `mask` (a bool array over node ids) only see the masked-in nodes, as if
+    run on the subgraph of those nodes.
+    """
+
+    def __init__(self, G):
+        self.names = list(G)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+
+        # G.edges() lists every edge once, from its endpoint earlier in node order
+        us, vs, raw = [], [], []
+        for u, v, weight in G.edges(data='weight'):
+            us.append(self.index[u])
+            vs.append(self.index[v])
+            raw.append(float(weight))
+        us = np.array(us, dtype=np.int64)
+        vs = np.array(vs, dtype=np.int64)
+        raw = np.array(raw, dtype=np.float64)
+        edge_ids = np.arange(len(us))
+        loops = us == vs
+
+        # An edge is listed under its later endpoint first, then under its earlier one; sorting
+        # on (row, which of the two, edge order) gives the neighbour order of G.copy()
+        rows = np.concatenate([vs[~loops], us])
+        cols = np.concatenate([us[~loops], vs])
+        order_ids = np.concatenate([edge_ids[~loops], edge_ids])
+        second = np.concatenate([np.zeros(int((~loops).sum()), dtype=np.int8), np.ones(len(us), dtype=np.int8)])
+        order = np.lexsort((order_ids, second, rows))
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+        self.indices = cols[order].astype(np.int32)
+        self.weights = raw[order_ids[order]]
+
+    @classmethod
+    def patched(cls, old, G, changed):
+        """Returns the CSRGraph of G given the one of an earlier version of it, `old`.
+
+        Only the rows of the nodes in `changed`, which must hold every node whose edges changed
+        since (see graph_cache.get_changes), are read from G; the others are copied from old.
+        Nodes keep their relative order in a graph, so the copied rows keep their order too.
+        """
+        self = cls.__new__(cls)
+        self.names = list(G)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+
+        remap = np.fromiter((self.index.get(name, -1) for name in old.names), dtype=np.int64, count=len(old.names))
+        keep = remap >= 0
+        for name in changed:
+            i = old.index.get(name)
+            if i is not None:
+                keep[i] = False
+        old_rows = np.repeat(np.arange(len(old.names)), np.diff(old.indptr))
+        kept = keep[old_rows]
+
+        rows, cols, raw = [], [], []
+        for name in changed:
+            r = self.index.get(name)
+            if r is None:
+                continue
+            ids = [(self.index[v], float(data['weight'])) for v, data in G._adj[name].items()]
+            for c, weight in sorted(e for e in ids if e[0] < r) + [e for e in ids if e[0] >= r]:
+                rows.append(r)
+                cols.append(c)
+                raw.append(weight)
+
+        rows = np.concatenate([remap[old_rows[kept]], np.array(rows, dtype=np.int64)])
+        order = np.argsort(rows, kind='stable')
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+        self.indices = np.concatenate([remap[old.indices[kept]], np.array(cols, dtype=np.int64)])[order].astype(np.int32)
+        self.weights = np.concatenate([old.weights[kept], np.array(raw, dtype=np.float64)])[order]
+        return self
+
+    def __len__(self):
+        return len(self.names)
+
+    def node_id(self, name, mask=None):
+        """Returns the id of a node, raising NodeNotFound like networkx if it isn't in the (masked) graph."""
+        i = self.index.get(name)
+        if i is None or (mask is not None and not mask[i]):
+            raise nx.NodeNotFound(f"Node {name} is not in the graph.")
+        return i
+
+    def node_names(self, ids):
+        return [self.names[i] for i in ids]
+
+    def _row(self, i, mask=None, weights=None):
+        """Returns (neighbour ids, weights) of node i as NumPy arrays, taking the weights from `weights` if given."""
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        row, weights = self.indices[lo:hi], (self.weights if weights is None else weights)[lo:hi]
+        if mask is not None:
+            keep = mask[row]
+            row, weights = row[keep], weights[keep]
+        return row, weights
+
+    def _neighbours(self, nodes):
+        """Returns (neighbour ids, the node each one is a neighbour of) for an array of nodes, in row order."""
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        # Position of every neighbour: its row's start plus its rank within the row
+        ranks = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.indices[np.repeat(starts, counts) + ranks], np.repeat(nodes, counts)
+
+    def bfs_layers(self, source, cutoff=None, mask=None):
+        """Yields arrays of the node ids 0, 1, 2, ... hops from source, in nx.bfs_layers order."""
+        visited = np.zeros(len(self), dtype=bool) if mask is None else ~mask
+        layer = np.array([source], dtype=np.int64)
+        visited[source] = True
+        depth = 0
+        while len(layer):
+            yield layer
+            if cutoff is not None and depth >= cutoff:
+                return
+            neighbours, _ = self._neighbours(layer)
+            fresh = neighbours[~visited[neighbours]]
+            # Keep each new node once, where it was first reached
+            _, first = np.unique(fresh, return_index=True)
+            layer = fresh[np.sort(first)].astype(np.int64)
+            visited[layer] = True
+            depth += 1
+
+    def hop_distances(self, source, cutoff=None, mask=None):
+        """Returns an array of hop counts from source, -1 for nodes not reached within cutoff."""
+        distances = np.full(len(self), -1, dtype=np.int64)
+        for depth, layer in enumerate(self.bfs_layers(source, cutoff, mask)):
+            distances[layer] = depth
+        return distances
+
+    def reached(self, source, weights=None, mask=None):
+        """Returns (ids, distances) of every node reachable from source, nearest first.
+
+        Distances are hop counts from one BFS, or path lengths from one Dijkstra run over
+        `weights` (laid out like self.weights) when given.
+        """
+        s = self.node_id(source, mask)
+        if weights is None:
+            layers = list(self.bfs_layers(s, mask=mask))
+            ids = np.concatenate(layers)
+            distances = np.repeat(np.arange(len(layers), dtype=np.float64), [len(layer) for layer in layers])
+            return ids, distances
+
+        dist = {}
+        seen = {s: 0}
+        c = itertools.count()
+        fringe = [(0, next(c), s)]
+        while fringe:
+            dist_v, _, v = heappop(fringe)
+            if v in dist:
+                continue
+            dist[v] = dist_v
+            row, costs = self._row(v, mask, weights)
+            for u, cost in zip(row.tolist(), costs.tolist()):
+                vu_dist = dist_v + cost
+                if u not in dist and (u not in seen or vu_dist < seen[u]):
+                    seen[u] = vu_dist
+                    heappush(fringe, (vu_dist, next(c), u))
+        return np.fromiter(dist, dtype=np.int64, count=len(dist)), np.fromiter(dist.values(), dtype=np.float64, count=len(dist))
+
+    def ego_nodes(self, source, radius, mask=None):
+        """Returns the names of the nodes of nx.ego_graph(G, source, radius), in BFS order as networkx finds them."""
+        layers = self.bfs_layers(self.node_id(source, mask), radius, mask)
+        return self.node_names(np.concatenate(list(layers)))
+
+    def mask_of(self, names):
+        """Returns a mask of the given nodes."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[[self.index[name] for name in names]] = True
+        return mask
+
+    def descendants_at_distance(self, source, distance, mask=None):
+        """Returns the same set of names as nx.descendants_at_distance(G, source, distance)."""
+        for depth, layer in enumerate(self.bfs_layers(self.node_id(source, mask), distance, mask)):
+            if depth == distance:
+                return set(self.node_names(layer))
+        return set()
+
+    def _bfs_predecessors(self, source, target, mask=None):
+        """Returns pred(node) giving the predecessor lists of nx.predecessor(G, source), or None if target isn't reached.
+
+        Stops after the layer target is found in, which is all its shortest paths need.
+        """
+        visited = np.zeros(len(self), dtype=bool) if mask is None else ~mask
+        visited[source] = True
+        layer = np.array([source], dtype=np.int64)
+        reached, parents = [], []
+        while len(layer) and not visited[target]:
+            neighbours, of = self._neighbours(layer)
+            fresh = ~visited[neighbours]
+            neighbours, of = neighbours[fresh], of[fresh]
+            reached.append(neighbours)
+            parents.append(of)
+            _, first = np.unique(neighbours, return_index=True)
+            layer = neighbours[np.sort(first)].astype(np.int64)
+            visited[layer] = True
+        if not visited[target]:
+            return None
+
+        # Group the (node, predecessor) pairs by node, keeping each group in BFS order
+        reached = np.concatenate(reached) if reached else np.empty(0, dtype=np.int64)
+        parents = np.concatenate(parents) if parents else np.empty(0, dtype=np.int64)
+        order = np.argsort(reached, kind='stable')
+        reached, parents = reached[order], parents[order]
+        return lambda node: parents[np.searchsorted(reached, node):np.searchsorted(reached, node, 'right')].tolist()
+
+    def _dijkstra_predecessors(self, source, target, weights, mask=None):
+        """Returns pred(node) giving the predecessor lists of nx.dijkstra_predecessor_and_distance, or None if target isn't reached.
+
+        Stops once every node as close as target is settled, which is all its shortest paths need.
+        """
+        dist = {}
+        seen = {source: 0}
+        pred = {source: []}
+        c = itertools.count()
+        fringe = [(0, next(c), source)]
+        target_dist = None
+        while fringe:
+            dist_v, _, v = heappop(fringe)
+            if v in dist:
+                continue
+            if target_dist is not None and dist_v > target_dist:
+                break
+            dist[v] = dist_v
+            if v == target:
+                target_dist = dist_v
+            row, costs = self._row(v, mask, weights)
+            for u, cost in zip(row.tolist(), costs.tolist()):
+                vu_dist = dist_v + cost
+                if u in dist:
+                    if vu_dist < dist[u]:
+                        raise ValueError("Contradictory paths found:", "negative weights?")
+                    elif vu_dist == dist[u]:
+                        pred[u].append(v)
+                elif u not in seen or vu_dist < seen[u]:
+                    seen[u] = vu_dist
+                    heappush(fringe, (vu_dist, next(c), u))
+                    pred[u] = [v]
+                elif vu_dist == seen[u]:
+                    pred[u].append(v)
+        if target not in dist:
+            return None
+        return pred.__getitem__
+
+    def all_shortest_paths(self, source, target, weights=None, mask=None):
+        """Yields the same paths as nx.all_shortest_paths(G, source, target, weight), in the same order.
+
+        `weights` is an array of edge costs laid out like self.weights, or None to count hops.
+        """
+        s = self.node_id(source, mask)
+        t = self.index.get(target)
+        if t is not None and mask is not None and not mask[t]:
+            t = None
+        # Like networkx, a target that isn't in the graph is just unreachable
+        if t is None:
+            pred = None
+        elif weights is None:
+            pred = self._bfs_predecessors(s, t, mask)
+        else:
+            pred = self._dijkstra_predecessors(s, t, weights, mask)
+        if pred is None:
+            raise nx.NetworkXNoPath(f"Target {target} cannot be reached from given sources")
+
+        # Same walk back from target as networkx's _build_paths_from_predecessors
+        stack = {t: iter(pred(t))}
+        path = [t]
+        while stack:
+            node = path[-1]
+            if node == s:
+                yield self.node_names(reversed(path))
+            for predecessor in stack[node]:
+                if predecessor in stack:
+                    continue
+                stack[predecessor] = iter(pred(predecessor))
+                path.append(predecessor)
+                break
+            else:
+                stack.popitem()
+                path.pop()
+
+    def all_simple_paths(self, source, target, cutoff, mask=None):
+        """Yields the same paths as nx.all_simple_paths(G, source, target, cutoff), in the same order.
+
+        The depth-first search is networkx's, except that it doesn't go down branches that
+        can't reach target within the cutoff, which it finds from one BFS out of target. It
+        also yields None every 1024 steps, so take_paths can stop it between paths.
+        """
+        s = self.node_id(source, mask)
+        t = self.index.get(target)
+        if cutoff < 0 or t is None or (mask is not None and not mask[t]):
+            return
+        if s == t:
+            yield [source]
+            return
+        if cutoff == 0:
+            return
+
+        remaining = self.hop_distances(t, cutoff, mask)
+        path = [s]
+        on_path = {s}
+        stack = [iter(self._row(s, mask)[0].tolist())]
+        steps = 0
+        while stack:
+            steps += 1
+            if steps % 1024 == 0:
+                yield None
+            child = next((c for c in stack[-1] if c not in on_path), None)
+            if child is None:
+                stack.pop()
+                on_path.discard(path.pop())
+                continue
+            if child == t:
+                yield self.node_names(path) + [target]
+            elif 0 <= remaining[child] <= cutoff - len(path):
+                path.append(child)
+                on_path.add(child)
+                stack.append(iter(self._row(child, mask)[0].tolist()))
+
+
+# graph version -> CSRGraph, least recently used first. Versions are unique, so entries never go stale
+_csr_graphs = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_csr(G, version):
+    """Returns the CSRGraph of a cached graph (see graph_cache.get_graph), building it on first use.
+
+    A version made by applying change events is patched from the CSRGraph of an earlier
+    version when that is still cached.
+    """
+    with _lock:
+        csr = _csr_graphs.get(version)
+        if csr is not None:
+            _csr_graphs.move_to_end(version)
+            return csr
+
+    found = graph_cache.get_changes(version, lambda earlier: earlier in _csr_graphs)
+    with _lock:
+        old = _csr_graphs.get(found[0]) if found else None
+    csr = CSRGraph(G) if old is None else CSRGraph.patched(old, G, found[1])
+    with _lock:
+        _csr_graphs[version] = csr
+        while len(_csr_graphs) > GRAPH_CACHE_MAX_ENTRIES:
+            _csr_graphs.popitem(last=False)
+    return csr
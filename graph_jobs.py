@@ -0,0 +1,101 @@
+from config import GRAPH_JOB_MAX_ENTRIES, GRAPH_JOB_WORKERS
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import uuid
+
+_executor = ThreadPoolExecutor(max_workers=GRAPH_JOB_WORKERS, thread_name_prefix='graph-job')
+_jobs = OrderedDict()  # job id -> Job, oldest first
+_lock = threading.Lock()
+
+
+class Job:
+    """A graph query running in the background, with its progress so far.
+
+    status goes from 'queued' to 'running', then to 'done', 'cancelled' or 'error'. A running
+    query reports paths as it finds them with add_path and checks `cancelled` between them;
+    `stage` says what it's doing otherwise.
+    """
+
+    def __init__(self, user):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.status = 'queued'
+        self.stage = None
+        self.created = time.monotonic()
+        self.finished = None
+        self.paths = []  # paths found so far, in order
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def add_path(self, path):
+        with self.lock:
+            self.paths.append(path)
+
+    def progress(self, since=0):
+        """Returns the job's state as a dict for the client, with the paths found after the first `since`."""
+        with self.lock:
+            elapsed = (self.finished or time.monotonic()) - self.created
+            progress = {
+                'id': self.id, 'status': self.status, 'stage': self.stage, 'elapsed': round(elapsed, 3),
+                'paths_found': len(self.paths), 'paths': self.paths[since:], 'error': self.error
+            }
+            if self.status in ('done', 'cancelled'):
+                progress['result'] = self.result
+            return progress
+
+
+def submit(user, run):
+    """Queues run(job) on the worker pool and returns the new Job.
+
+    What run returns becomes the job's result, also when it stops early because the job was
+    cancelled. The oldest finished jobs are forgotten beyond GRAPH_JOB_MAX_ENTRIES.
+    """
+    job = Job(user)
+
+    def work():
+        with job.lock:
+            if job.cancelled:
+                job.status = 'cancelled'
+                job.finished = time.monotonic()
+                return
+            job.status = 'running'
+        try:
+            result = run(job)
+            with job.lock:
+                job.result = result
+                job.status = 'cancelled' if job.cancelled else 'done'
+        except Exception as e:
+            print(f"Error in graph job {job.id}: {e}")
+            with job.lock:
+                job.error = str(e)
+                job.status = 'error'
+        finally:
+            job.finished = time.monotonic()
+
+    with _lock:
+        _jobs[job.id] = job
+        finished = [job_id for job_id, old in _jobs.items() if old.finished is not None]
+        for job_id in finished[:max(0, len(_jobs) - GRAPH_JOB_MAX_ENTRIES)]:
+            del _jobs[job_id]
+    _executor.submit(work)
+    return job
+
+
+def get_job(job_id, user):
+    """Returns the job with this id if it was started by user, else None."""
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None or job.user != user:
+        return None
+    return job
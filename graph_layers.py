@@ -0,0 +1,85 @@
+from config import GRAPH_LAYER_CACHE_MAX_ENTRIES
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+import graph_cache
+import networkx as nx
+import threading
+
+# Every node reachable from a source, nearest first, and its distance from it as a sorted list
+# (or NumPy array, from the csr backend). Distances are hop counts, or path lengths for weighted
+# layers.
+Layers = namedtuple('Layers', ['nodes', 'distances'])
+
+_layers = OrderedDict()  # (graph version, src, weightfactor, radius) -> Layers, least recently used first
+_lock = threading.Lock()
+
+
+def get_layers(version, src, compute, weightfactor=None, radius=None):
+    """Returns the Layers of src in a graph version, calling compute() to find them on first use.
+
+    `weightfactor` is given for weighted layers, and `radius` when they are measured within the
+    ego graph of that radius. Versions are unique (see graph_cache.get_graph), so cached layers
+    never go stale and are simply dropped once least recently used. The layers of an earlier
+    version are reused when none of the nodes they reach changed since.
+    """
+    key = (version, src, weightfactor, radius)
+    with _lock:
+        layers = _layers.get(key)
+        if layers is not None:
+            _layers.move_to_end(key)
+            return layers
+
+    found = graph_cache.get_changes(version, lambda earlier: (earlier,) + key[1:] in _layers)
+    with _lock:
+        layers = _layers.get((found[0],) + key[1:]) if found else None
+    if layers is None or not found[1].isdisjoint(layers.nodes):
+        layers = compute()
+    with _lock:
+        _layers[key] = layers
+        while len(_layers) > GRAPH_LAYER_CACHE_MAX_ENTRIES:
+            _layers.popitem(last=False)
+    return layers
+
+
+def networkx_layers(G, src, weight=None):
+    """Finds the Layers of src in a networkx graph with one BFS, or one Dijkstra run when weight is given."""
+    if weight is None:
+        lengths = nx.single_source_shortest_path_length(G, src)
+    else:
+        lengths = nx.single_source_dijkstra_path_length(G, src, weight=weight)
+    # Both list nodes in the order they were reached, which is nearest first
+    return Layers(list(lengths), [float(d) for d in lengths.values()])
+
+
+def ring_slice(layers, inner, outer):
+    """Returns the Layers of the nodes further than `inner` and at most `outer` away.
+
+    As in the original ring query, an inner bound at or beyond outer gives just the nodes at
+    exactly outer.
+    """
+    distances = layers.distances
+    if inner < outer:
+        start = bisect_right(distances, inner)
+    else:
+        start = bisect_left(distances, outer)
+    end = bisect_right(distances, outer)
+    return Layers(layers.nodes[start:end], distances[start:end])
+
+
+def ring_nodes(layers, inner, outer):
+    """Returns the set of nodes of ring_slice(layers, inner, outer)."""
+    return set(ring_slice(layers, inner, outer).nodes)
+
+
+def group_layers(layers):
+    """Returns [(distance, [nodes])] with one entry per distinct distance, nearest first."""
+    distances = layers.distances
+    groups = []
+    start = 0
+    while start < len(distances):
+        # Distances are sorted, so each layer ends where the next larger distance starts
+        distance = float(distances[start])
+        end = bisect_right(distances, distance, start)
+        groups.append((distance, layers.nodes[start:end]))
+        start = end
+    return groups
@@ -0,0 +1,188 @@
+from config import (
+    GRAPH_LAYOUT_CACHE_MAX_ENTRIES, GRAPH_LAYOUT_EXACT_MAX_NODES, GRAPH_LAYOUT_ITERATIONS, GRAPH_LAYOUT_WARM_ITERATIONS,
+    GRAPH_SERVER_LAYOUT_MIN_NODES
+)
+from collections import OrderedDict
+import numpy as np
+import threading
+
+# Layouts graph.html runs as a force-directed simulation in the browser; for large graphs the
+# server computes these instead. 'server' asks for it whatever the size.
+FORCE_LAYOUTS = ('cose', 'fcose', 'server')
+
+# Pixels per sqrt(node) of the laid out graph's width, so the area grows with the node count
+SPACING = 60
+
+# filter key -> {'version', 'positions'}, least recently used first. positions maps node -> (x, y)
+# in layout units, for the latest version laid out with those filters
+_layouts = OrderedDict()
+_lock = threading.Lock()
+
+
+def wants_server_layout(layout, nodecount):
+    """Whether to send precomputed positions for the `layout` arg of /graph (e.g. 'cose' or 'breadthfirst-upward')."""
+    name = (layout or 'cose').split('-')[0]
+    return name == 'server' or (name in FORCE_LAYOUTS and nodecount >= GRAPH_SERVER_LAYOUT_MIN_NODES)
+
+
+def _exact_repulsion(pos, k):
+    """Returns the repulsive displacement k^2/d of every node from every other, in blocks of rows."""
+    n = len(pos)
+    x, y = pos[:, 0], pos[:, 1]
+    disp = np.zeros((n, 2))
+    block = max(1, 65536 // n)  # small enough for the temporaries to stay in cache
+    for start in range(0, n, block):
+        dx = x[start:start + block, None] - x[None, :]
+        dy = y[start:start + block, None] - y[None, :]
+        scale = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+        disp[start:start + block, 0] = np.einsum('ij,ij->i', dx, scale)
+        disp[start:start + block, 1] = np.einsum('ij,ij->i', dy, scale)
+    return disp
+
+
+def _grid_repulsion(pos, k):
+    """Approximates _exact_repulsion for large graphs on a grid of about 6 sqrt(n) cells.
+
+    Nodes in the same or an adjacent cell repel each other exactly; every other cell repels as
+    one mass at its centre, which takes the cost of an iteration from n^2 to about n^1.5.
+    """
+    n = len(pos)
+    side = max(3, int(np.sqrt(6 * np.sqrt(n))))
+    # Outliers go in the border cells rather than stretch the grid. Which cell a node is put in
+    # only changes how well it is approximated, as adjacent cells are exact whatever they hold
+    low, high = np.percentile(pos, [1, 99], axis=0)
+    size = (high - low).max() / side + 1e-12
+    cells = np.clip(((pos - low) / size).astype(np.int64), 0, side - 1)
+    cell = cells[:, 0] * side + cells[:, 1]
+    counts = np.bincount(cell, minlength=side * side)
+    cellptr = np.zeros(side * side + 1, dtype=np.int64)
+    np.cumsum(counts, out=cellptr[1:])
+    order = np.argsort(cell, kind='stable')
+
+    occupied = np.flatnonzero(counts)
+    mass = counts[occupied]
+    cx = np.bincount(cell, weights=pos[:, 0], minlength=side * side)[occupied] / mass
+    cy = np.bincount(cell, weights=pos[:, 1], minlength=side * side)[occupied] / mass
+    col, row = occupied // side, occupied % side
+
+    disp = np.zeros((n, 2))
+    block = max(1, 65536 // len(occupied))
+    for start in range(0, n, block):
+        dx = pos[start:start + block, 0, None] - cx[None, :]
+        dy = pos[start:start + block, 1, None] - cy[None, :]
+        scale = k * k * mass / np.maximum(dx * dx + dy * dy, 1e-9)
+        # Adjacent cells are done exactly below
+        near = (np.abs(cells[start:start + block, 0, None] - col) <= 1) & (np.abs(cells[start:start + block, 1, None] - row) <= 1)
+        scale[near] = 0
+        disp[start:start + block, 0] = np.einsum('ij,ij->i', dx, scale)
+        disp[start:start + block, 1] = np.einsum('ij,ij->i', dy, scale)
+
+    x, y = pos[:, 0].copy(), pos[:, 1].copy()  # contiguous, for faster gathers
+    for ox in (-1, 0, 1):
+        for oy in (-1, 0, 1):
+            tx, ty = cells[:, 0] + ox, cells[:, 1] + oy
+            nodes = np.flatnonzero((tx >= 0) & (tx < side) & (ty >= 0) & (ty < side))
+            target = tx[nodes] * side + ty[nodes]
+            starts = cellptr[target]
+            lengths = cellptr[target + 1] - starts
+            # Pair every node with each node of the cell at this offset from its own
+            ranks = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            us = np.repeat(nodes, lengths)
+            vs = order[np.repeat(starts, lengths) + ranks]
+            dx, dy = x[us] - x[vs], y[us] - y[vs]
+            scale = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+            disp[:, 0] += np.bincount(us, weights=dx * scale, minlength=n)
+            disp[:, 1] += np.bincount(us, weights=dy * scale, minlength=n)
+    return disp
+
+
+def force_layout(n, sources, targets, init=None, iterations=GRAPH_LAYOUT_ITERATIONS, temperature=0.1, seed=0):
+    """Fruchterman-Reingold layout of n nodes joined by edges sources[i]-targets[i]; returns an (n, 2) array.
+
+    `init` holds starting positions, NaN for nodes without one. Those start next to their
+    placed neighbours, or at random if they have none. Repulsion is exact up to
+    GRAPH_LAYOUT_EXACT_MAX_NODES nodes and approximated on a grid beyond, and a weak pull to
+    the centre keeps separate components close.
+    """
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2)) if init is None else np.array(init, dtype=np.float64)
+    missing = np.isnan(pos).any(axis=1)
+    if missing.any() and not missing.all():
+        # Average the positions of each new node's placed neighbours
+        ends = np.concatenate([sources, targets])
+        others = np.concatenate([targets, sources])
+        placed = ~missing[others] & missing[ends]
+        total = np.zeros((n, 2))
+        count = np.zeros(n)
+        np.add.at(total, ends[placed], pos[others[placed]])
+        np.add.at(count, ends[placed], 1)
+        near = missing & (count > 0)
+        pos[near] = total[near] / count[near, None]
+        missing &= ~near
+        pos[near] += (rng.random((near.sum(), 2)) - 0.5) * 0.01
+    pos[missing] = rng.random((missing.sum(), 2))
+    if n < 2:
+        return pos
+
+    k = np.sqrt(1.0 / n)  # ideal edge length in the unit square
+    repulsion = _exact_repulsion if n <= GRAPH_LAYOUT_EXACT_MAX_NODES else _grid_repulsion
+    t = temperature
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        disp = repulsion(pos, k)
+        delta = pos[sources] - pos[targets]
+        force = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        np.add.at(disp, sources, -force)
+        np.add.at(disp, targets, force)
+        disp -= (pos - pos.mean(axis=0)) * (k * np.sqrt(n))
+
+        # Move each node along its displacement, but no further than the temperature
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        pos += disp * (np.minimum(length, t) / length)[:, None]
+        t -= cooling
+    return pos
+
+
+def to_pixels(pos):
+    """Centres layout positions and scales them to cytoscape pixel coordinates."""
+    if not len(pos):
+        return pos
+    pos = pos - pos.mean(axis=0)
+    extent = np.abs(pos).max()
+    if extent > 0:
+        pos = pos * (SPACING * np.sqrt(len(pos)) / 2 / extent)
+    return pos
+
+
+def get_positions(key, version, G):
+    """Returns pixel positions of G's nodes, in node order, as an (n, 2) array.
+
+    Positions are cached per `key` (the user and the args that chose G) for the latest graph
+    version. A new version starts from the previous positions and needs only a few iterations
+    when at least half its nodes were laid out before.
+    """
+    names = list(G)
+    with _lock:
+        entry = _layouts.get(key)
+        if entry is not None:
+            _layouts.move_to_end(key)
+
+    previous = entry['positions'] if entry is not None else {}
+    known = sum(1 for name in names if name in previous)
+    if entry is not None and entry['version'] == version and known == len(names):
+        return to_pixels(np.array([previous[name] for name in names]).reshape(-1, 2))
+
+    index = {name: i for i, name in enumerate(names)}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    if known * 2 >= len(names) and known > 0:
+        init = np.array([previous.get(name, (np.nan, np.nan)) for name in names]).reshape(-1, 2)
+        pos = force_layout(len(names), edges[:, 0], edges[:, 1], init, GRAPH_LAYOUT_WARM_ITERATIONS, temperature=0.02)
+    else:
+        pos = force_layout(len(names), edges[:, 0], edges[:, 1])
+
+    with _lock:
+        _layouts[key] = {'version': version, 'positions': dict(zip(names, map(tuple, pos.tolist())))}
+        _layouts.move_to_end(key)
+        while len(_layouts) > GRAPH_LAYOUT_CACHE_MAX_ENTRIES:
+            _layouts.popitem(last=False)
+    return to_pixels(pos)
@@ -0,0 +1,236 @@
+from config import GRAPH_CACHE_MAX_ENTRIES, GRAPH_PARALLEL_MIN_CUTOFF, GRAPH_PATH_WORKERS
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+import atexit
+import multiprocessing
+import numpy as np
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Adjacency arrays of CSR graphs are written to .npy files under _dir, which the worker processes
+# memory-map, so the page cache holds one copy however many workers read them
+_dir = None
+_published = OrderedDict()  # graph version -> directory of its arrays, least recently used first
+# directory -> number of searches using it. Directories evicted from _published while in use are
+# deleted by the last search to release them
+_users = {}
+_pool = None
+_lock = threading.Lock()
+
+
+def wants_parallel(cutoff):
+    """Whether a simple path search with this cutoff should be split across the worker processes."""
+    return GRAPH_PATH_WORKERS > 1 and cutoff >= GRAPH_PARALLEL_MIN_CUTOFF
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            # Forking a threaded server is unsafe, so workers start fresh and only import this module
+            _pool = ProcessPoolExecutor(GRAPH_PATH_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _publish(csr, version):
+    """Returns the directory holding indptr.npy and indices.npy of a CSR graph, writing them on first use.
+
+    The directory is kept until the caller passes it to _release, even if evicted meanwhile.
+    """
+    global _dir
+    with _lock:
+        path = _published.get(version)
+        if path is not None:
+            _published.move_to_end(version)
+            _users[path] = _users.get(path, 0) + 1
+            return path
+        if _dir is None:
+            _dir = tempfile.mkdtemp(prefix='sqldisp-graphs-')
+            atexit.register(shutil.rmtree, _dir, ignore_errors=True)
+
+    path = tempfile.mkdtemp(dir=_dir)
+    np.save(os.path.join(path, 'indptr.npy'), csr.indptr)
+    np.save(os.path.join(path, 'indices.npy'), csr.indices)
+    evicted = []
+    with _lock:
+        if version in _published:
+            # Another request wrote the same arrays meanwhile; use those
+            evicted.append(path)
+            path = _published[version]
+        _published[version] = path
+        _users[path] = _users.get(path, 0) + 1
+        while len(_published) > GRAPH_CACHE_MAX_ENTRIES:
+            old = _published.popitem(last=False)[1]
+            if not _users.get(old):
+                evicted.append(old)
+    for old in evicted:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def _release(path):
+    """Ends a search's use of a directory from _publish, deleting it if it was evicted and this was the last use."""
+    with _lock:
+        _users[path] -= 1
+        if _users[path]:
+            return
+        del _users[path]
+        if path in _published.values():
+            return
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _prefixes(csr, s, t, cutoff, remaining, mask, count):
+    """Splits the depth-first search from s into the paths it starts with, in the order it visits them.
+
+    Returns a list with, for each prefix, either ('path', ids) for a path that already reaches t
+    or ('prefix', ids) for one the search continues from. Goes one hop deeper when the first
+    hops give fewer than `count` prefixes.
+    """
+    def children(i, path):
+        row = csr.indices[csr.indptr[i]:csr.indptr[i + 1]].tolist()
+        return [c for c in row if (mask is None or mask[c]) and c not in path]
+
+    items = [('prefix', [s])]
+    for depth in (1, 2):
+        if depth > 1 and len(items) >= count:
+            break
+        expanded = []
+        for kind, path in items:
+            if kind == 'path':
+                expanded.append((kind, path))
+                continue
+            for child in children(path[-1], path):
+                if child == t:
+                    expanded.append(('path', path + [child]))
+                elif 0 <= remaining[child] <= cutoff - len(path):
+                    expanded.append(('prefix', path + [child]))
+        items = expanded
+    return items
+
+
+_worker_graphs = OrderedDict()  # in a worker: directory -> (indptr, indices) memory maps
+
+
+def _simple_paths_from(graph_path, query_path, prefix, t, cutoff, limit, deadline):
+    """Runs in a worker: finds the simple paths to t that start with prefix, like CSRGraph.all_simple_paths.
+
+    Returns (paths as lists of ids, stopped), where stopped is True if it found `limit` paths,
+    passed the deadline (time.time()) or was told to stop before finishing.
+    """
+    arrays = _worker_graphs.get(graph_path)
+    if arrays is None:
+        arrays = _worker_graphs[graph_path] = (
+            np.load(os.path.join(graph_path, 'indptr.npy'), mmap_mode='r'),
+            np.load(os.path.join(graph_path, 'indices.npy'), mmap_mode='r')
+        )
+        while len(_worker_graphs) > 4:
+            _worker_graphs.popitem(last=False)
+    indptr, indices = arrays
+    remaining = np.load(os.path.join(query_path, 'remaining.npy'))
+    stop = np.load(os.path.join(query_path, 'stop.npy'), mmap_mode='r')
+
+    def row(i):
+        return iter(indices[indptr[i]:indptr[i + 1]].tolist())
+
+    paths = []
+    path = list(prefix)
+    on_path = set(path)
+    stack = [row(path[-1])]
+    steps = 0
+    while stack:
+        steps += 1
+        if steps % 1024 == 0 and (stop[0] or time.time() > deadline):
+            return paths, True
+        child = next((c for c in stack[-1] if c not in on_path), None)
+        if child is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        if child == t:
+            paths.append(path + [t])
+            if len(paths) >= limit:
+                return paths, True
+        elif 0 <= remaining[child] <= cutoff - len(path):
+            path.append(child)
+            on_path.add(child)
+            stack.append(row(child))
+    return paths, False
+
+
+def take_simple_paths(csr, version, source, target, cutoff, mask, limit, time_budget, job=None):
+    """Finds what take_paths(csr.all_simple_paths(...), limit, time_budget, job) would, across the worker processes.
+
+    The search is split by the first hop out of source (or the first two, for sources with few
+    neighbours) and each part runs in a worker on memory-mapped adjacency arrays. Parts are
+    merged back in search order, so untruncated results come out the same and in the same order.
+    Returns (paths, truncated).
+    """
+    s = csr.node_id(source, mask)
+    t = csr.index.get(target)
+    if cutoff < 0 or t is None or (mask is not None and not mask[t]):
+        return [], False
+    if s == t:
+        return [[source]], False
+    if cutoff == 0:
+        return [], False
+
+    remaining = csr.hop_distances(t, cutoff, mask).astype(np.int8)
+    items = _prefixes(csr, s, t, cutoff, remaining, mask, 2 * GRAPH_PATH_WORKERS)
+    graph_path = _publish(csr, version)
+    query_path = stop = None
+    futures = []
+    taken = []
+    truncated = False
+    try:
+        query_path = tempfile.mkdtemp(dir=graph_path)
+        np.save(os.path.join(query_path, 'remaining.npy'), remaining)
+        np.save(os.path.join(query_path, 'stop.npy'), np.zeros(1, dtype=np.uint8))
+        # Set in place to stop the workers, as rewriting the file would pull it from under their memory maps
+        stop = np.load(os.path.join(query_path, 'stop.npy'), mmap_mode='r+')
+
+        start = time.monotonic()
+        deadline = time.time() + time_budget
+        pool = _get_pool()
+        futures = [
+            pool.submit(_simple_paths_from, graph_path, query_path, ids, t, cutoff, limit, deadline) if kind == 'prefix' else None
+            for kind, ids in items
+        ]
+        for (kind, ids), future in zip(items, futures):
+            if future is None:
+                found, stopped = [ids], False
+            else:
+                # Workers stop themselves at the deadline, but can't see the job, so wait in steps
+                while not wait([future], timeout=0.1).done:
+                    if (job is not None and job.cancelled) or time.monotonic() - start > time_budget + 1:
+                        return taken, True
+                found, stopped = future.result()
+
+            for path in found:
+                if len(taken) >= limit:
+                    return taken, True
+                taken.append(csr.node_names(path))
+                if job is not None:
+                    job.add_path(taken[-1])
+            if stopped:
+                truncated = True
+                if len(taken) >= limit or time.time() > deadline:
+                    return taken, True
+            if job is not None and job.cancelled:
+                return taken, True
+        return taken, truncated
+    finally:
+        # Tell the workers still searching to give up, and drop the parts not started
+        if stop is not None:
+            stop[0] = 1
+            stop.flush()
+            del stop
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        if query_path is not None:
+            shutil.rmtree(query_path, ignore_errors=True)
+        _release(graph_path)
@@ -1,5 +1,7 @@
 from flask import Flask
+from contributors import backfill_contributors_command
 from dbmod import dbmod
+from fk_fulltext import fulltext_indexes_command
 from base_routes import base_routes
 from dbview import dbview
 from graph import graph
@@ -12,5 +14,8 @@ app.register_blueprint(dbmod)
 app.register_blueprint(graph)
 app.register_blueprint(dbview)
 
+app.cli.add_command(backfill_contributors_command)
+app.cli.add_command(fulltext_indexes_command)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0')
\ No newline at end of file